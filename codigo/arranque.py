@@ -0,0 +1,103 @@
+# arranque.py — orquestador de arranque rápido
+# - Fases medidas (mark): ACL, cámara, modelo... desde el reset (ticks_ms)
+# - ready(): el bucle ya acepta tarjetas (con la ACL de la SD); escribe la línea del
+#   arranque en /data/boot_log.csv con las fases (aunque nunca llegue una tarjeta)
+# - Tareas diferidas (defer/tick): trabajo de red (NTP tras conectar...) que avanza un
+#   paso por vuelta del bucle en ratos libres, sin bloquear las pasadas
+# - first_accept(): en la primera entrada permitida se completa esa línea con el tiempo
+#   hasta ella (campo de ancho fijo reescrito en su sitio: sigue una línea por arranque)
+
+import utime
+
+BOOT_LOG = "/data/boot_log.csv"
+_HEADER = "timestamp,ready_ms,first_accept_ms,phases"
+_FA_WIDTH = 10         # first_accept_ms: en blanco hasta la primera entrada
+
+_ticks_ms   = utime.ticks_ms
+_ticks_diff = utime.ticks_diff
+
+_t_prev = _ticks_ms()
+phases = []            # [(fase, ms)]
+_ready_ms = None
+_first_ms = None
+_fa_pos = None         # offset del campo first_accept_ms en BOOT_LOG
+_tasks = []            # [[nombre, step_fn, t_inicio]]
+done = {}              # nombre -> ms desde el reset en que terminó
+
+def mark(name):
+    """Cierra una fase: guarda lo que ha durado desde la marca anterior."""
+    global _t_prev
+    now = _ticks_ms()
+    phases.append((name, _ticks_diff(now, _t_prev)))
+    _t_prev = now
+
+def ready(now_iso=""):
+    global _ready_ms, _fa_pos
+    _ready_ms = _ticks_ms()         # ticks_ms cuenta desde el reset
+    print("[boot] Listo para aceptar tarjetas en %d ms %s" % (_ready_ms, phases))
+    try:
+        try:
+            import uos
+            size = uos.stat(BOOT_LOG)[6]
+        except OSError:
+            size = 0
+        head = "%s,%d," % (now_iso, _ready_ms)
+        with open(BOOT_LOG, "a") as f:
+            if size == 0:
+                f.write(_HEADER + "\n")
+                size = len(_HEADER) + 1
+            f.write(head + " " * _FA_WIDTH + "," + " ".join("%s=%d" % p for p in phases) + "\n")
+        _fa_pos = size + len(head)
+    except Exception as e:
+        print("[boot] No se pudo escribir", BOOT_LOG, e)
+
+def defer(name, step_fn):
+    """step_fn() se llama una vez por vuelta hasta que devuelve True."""
+    _tasks.append([name, step_fn, None])
+
+def pending(name=None):
+    if name is None:
+        return len(_tasks) > 0
+    for t in _tasks:
+        if t[0] == name:
+            return True
+    return False
+
+def tick():
+    """Avanza un paso la primera tarea diferida (por orden de alta)."""
+    if not _tasks:
+        return False
+    t = _tasks[0]
+    if t[2] is None:
+        t[2] = _ticks_ms()
+    try:
+        fin = t[1]()
+    except Exception as e:
+        print("[boot] Tarea %s fallida: %s" % (t[0], e))
+        fin = True
+    if fin:
+        _tasks.pop(0)
+        done[t[0]] = _ticks_ms()
+        print("[boot] %s en segundo plano: %d ms" % (t[0], _ticks_diff(done[t[0]], t[2])))
+    return True
+
+def first_accept():
+    """Primera entrada permitida: tiempo desde el reset, una vez por arranque."""
+    global _first_ms
+    if _first_ms is not None:
+        return
+    _first_ms = _ticks_ms()
+    print("[boot] Primera entrada aceptada a los %d ms del arranque" % _first_ms)
+    if _fa_pos is None:
+        return
+    try:
+        with open(BOOT_LOG, "r+b") as f:
+            f.seek(_fa_pos)
+            v = "%d" % _first_ms
+            f.write((v + " " * (_FA_WIDTH - len(v))).encode())
+    except Exception as e:
+        print("[boot] No se pudo escribir", BOOT_LOG, e)
+
+def report():
+    return {"ready_ms": _ready_ms, "first_accept_ms": _first_ms,
+            "phases": dict(phases), "deferred_done_ms": dict(done)}
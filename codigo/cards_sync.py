@@ -7,9 +7,9 @@
 
 import urequests as requests
 import ujson as json
-import uhashlib
-import ubinascii
 import uos
+import hashcache
+import config_service
 
 CFG_PATH   = "/config/server.json"
 CARDS_PATH = "/config/cards.csv"
@@ -18,21 +18,9 @@ STATE_PATH = "/config/cards_state.json"
 
 # ---------- utilidades ----------
 
-def _cfg():
-    with open(CFG_PATH) as f:
-        return json.loads(f.read())
-
 def _sha256_hex_file(path):
-    """Devuelve el SHA-256 en hex de un archivo (compatible MicroPython)."""
-    h = uhashlib.sha256()
-    with open(path, "rb") as f:
-        while True:
-            b = f.read(4096)
-            if not b:
-                break
-            h.update(b)
-    # En MicroPython no hay hexdigest(); usamos hexlify sobre digest()
-    return ubinascii.hexlify(h.digest()).decode()
+    """Devuelve el SHA-256 en hex de un archivo (con caché por tamaño/mtime)."""
+    return hashcache.sha256_hex(path)
 
 def _load_state():
     try:
@@ -46,6 +34,10 @@ def _save_state(s):
     except Exception as e:
         print("[ACL] No se pudo guardar STATE:", e)
 
+def current_sha():
+    """sha256 del manifest con el que se instaló el cards.csv actual ("" si no consta)."""
+    return _load_state().get("sha256") or ""
+
 def _dechunk(s):
     # Intenta decodificar Transfer-Encoding: chunked si aparece
     try:
@@ -76,11 +68,7 @@ def _dechunk(s):
 
 def fetch_manifest():
     """Obtiene manifest {version, sha256, url, size?, updated_at?}."""
-    cfg = _cfg()
-    url = cfg.get("cards_url")
-    key = cfg.get("edge_api_key")
-    if not url or not key:
-        raise Exception("Faltan 'cards_url' o 'edge_api_key' en /config/server.json")
+    url, key = config_service.require(CFG_PATH, "cards_url", "edge_api_key")
 
     r = requests.get(url, headers={"x-edge-key": key})
     try:
@@ -199,6 +187,9 @@ def ensure_cards_updated(db_reload_fn=None, verbose=True):
         except:
             pass
         raise e
+    # Mismo tamaño y mtime (resolución de 2 s en FAT) no garantizan el mismo contenido
+    hashcache.invalidate(CARDS_TMP)
+    hashcache.invalidate(CARDS_PATH)
 
     # Guardar nuevo estado
     _save_state({"version": new_version, "sha256": new_sha})
@@ -0,0 +1,174 @@
+# carriles.py — varios lectores Wiegand (carriles) en un solo controlador
+# - Cada carril: pines D0/D1 con su ISR, una cola de tramas y sus cooldowns
+# - La ISR solo desplaza bits; si llega un bit tras un silencio > TIMEOUT_MS, la
+#   trama anterior se encola desde la propia ISR; poll() cierra la última trama
+# - Tramas de hasta MAX_BITS (26/34/35/37...) en dos enteros pequeños (hi + 24 bits
+#   bajos): la ISR nunca crea enteros grandes; pop() los junta fuera de la ISR
+# - Un solo modelo (y una sola cámara) para todos: next_busy() reparte los frames
+#   de inferencia por turnos entre los carriles con una pasada en curso
+#
+# Config opcional /config/lanes.json:
+#   {"lanes": [{"id": "L1", "d0": "D14", "d1": "D13"},
+#              {"id": "L2", "d0": "D12", "d1": "D11"}]}
+# Sin fichero: un carril en D14/D13 y el checkpoint de siempre (sin sufijo).
+
+import ujson, utime
+from machine import Pin, disable_irq, enable_irq
+
+LANES_JSON = "/config/lanes.json"
+DEFAULT_LANES = [{"id": "L1", "d0": "D14", "d1": "D13"}]
+
+TIMEOUT_MS = 50      # silencio que cierra una trama
+QUEUE_LEN  = 4       # tramas pendientes por carril (preasignadas: la ISR no asigna)
+MAX_BITS   = 50      # más bits se cuentan pero no se guardan (trama inválida)
+
+_ticks_ms   = utime.ticks_ms
+_ticks_diff = utime.ticks_diff
+
+lanes = []
+_rr = 0
+
+class Carril:
+    def __init__(self, lane_id, d0, d1):
+        self.id = lane_id
+        self.tag = None              # sufijo del checkpoint (None con un solo carril)
+        self.hi = 0
+        self.lo = 0                  # 24 bits bajos
+        self.bits = 0
+        self.last_ms = 0
+        self._qb = [0] * QUEUE_LEN
+        self._qh = [0] * QUEUE_LEN
+        self._ql = [0] * QUEUE_LEN
+        self._head = 0
+        self._tail = 0
+        self.dropped = 0
+        # Cooldowns por carril
+        self.recent_raw = {}         # raw -> ticks
+        self.recent_logic = {}       # clave de tarjeta (wiegand.card_key) -> ticks
+        # Pasada de detección en curso (deteccion.Pasada) y su contexto
+        self.pasada = None
+        self.ctx = None
+        self.pin_d0 = Pin(d0, Pin.IN, Pin.PULL_UP)
+        self.pin_d1 = Pin(d1, Pin.IN, Pin.PULL_UP)
+        self.pin_d0.irq(trigger=Pin.IRQ_FALLING, handler=self._irq_d0)
+        self.pin_d1.irq(trigger=Pin.IRQ_FALLING, handler=self._irq_d1)
+
+    # ----- ISR (sin asignaciones) -----
+    def _push(self):
+        n = (self._head + 1) % QUEUE_LEN
+        if n == self._tail:
+            self.dropped += 1
+        else:
+            self._qb[self._head] = self.bits
+            self._qh[self._head] = self.hi
+            self._ql[self._head] = self.lo
+            self._head = n
+        self.hi = 0
+        self.lo = 0
+        self.bits = 0
+
+    def _bit(self, b):
+        now = _ticks_ms()
+        if self.bits and _ticks_diff(now, self.last_ms) > TIMEOUT_MS:
+            self._push()
+        if self.bits < MAX_BITS:
+            self.hi = (self.hi << 1) | (self.lo >> 23)
+            self.lo = ((self.lo << 1) & 0xFFFFFF) | b
+        self.bits += 1
+        self.last_ms = now
+
+    def _irq_d0(self, pin):
+        self._bit(0)
+
+    def _irq_d1(self, pin):
+        self._bit(1)
+
+    # ----- bucle principal -----
+    def poll(self, now):
+        """Cierra la trama en curso si ya pasó TIMEOUT_MS sin bits."""
+        if self.bits and _ticks_diff(now, self.last_ms) > TIMEOUT_MS:
+            st = disable_irq()
+            if self.bits and _ticks_diff(_ticks_ms(), self.last_ms) > TIMEOUT_MS:
+                self._push()
+            enable_irq(st)
+
+    def pop(self):
+        """(bits, valor) de la trama más antigua, o None."""
+        if self._tail == self._head:
+            return None
+        i = self._tail
+        fr = (self._qb[i], (self._qh[i] << 24) | self._ql[i])
+        self._tail = (i + 1) % QUEUE_LEN
+        return fr
+
+    def pending(self):
+        return (self._head - self._tail) % QUEUE_LEN
+
+    def in_cooldown(self, raw, key, now, cooldown_ms):
+        """True si raw o la clave de tarjeta se vieron hace < cooldown_ms; si no, los marca."""
+        t = self.recent_raw.get(raw)
+        if t is not None and _ticks_diff(now, t) < cooldown_ms:
+            return True
+        self.recent_raw[raw] = now
+        t = self.recent_logic.get(key)
+        if t is not None and _ticks_diff(now, t) < cooldown_ms:
+            return True
+        self.recent_logic[key] = now
+        return False
+
+    def clear_cooldown(self, raw, key):
+        self.recent_raw.pop(raw, None)
+        self.recent_logic.pop(key, None)
+
+    def prune(self, now, cooldown_ms):
+        # Los dicts de cooldown crecen con cada tarjeta distinta: purga las caducadas
+        for d in (self.recent_raw, self.recent_logic):
+            for k in [k for k, t in d.items() if _ticks_diff(now, t) >= cooldown_ms]:
+                del d[k]
+
+def setup(path=LANES_JSON):
+    """Crea los carriles a partir de lanes.json (o el carril por defecto)."""
+    global _rr
+    try:
+        with open(path, "r") as f:
+            cfg = ujson.loads(f.read()).get("lanes") or DEFAULT_LANES
+    except:
+        cfg = DEFAULT_LANES
+    del lanes[:]
+    for c in cfg:
+        lanes.append(Carril(str(c["id"]), c["d0"], c["d1"]))
+    if len(lanes) > 1:
+        for c in lanes:
+            c.tag = c.id
+    _rr = 0
+    print("[carriles]", ", ".join("%s(%s/%s)" % (c["id"], c["d0"], c["d1"]) for c in cfg))
+    return lanes
+
+def next_busy():
+    """Siguiente carril con pasada en curso, por turnos (un frame cada vez)."""
+    global _rr
+    n = len(lanes)
+    for k in range(n):
+        c = lanes[(_rr + k) % n]
+        if c.pasada is not None:
+            _rr = (_rr + k + 1) % n
+            return c
+    return None
+
+def busy():
+    """True si algún carril tiene bits, tramas o una pasada pendientes."""
+    for c in lanes:
+        if c.bits or c.pasada is not None or c._tail != c._head:
+            return True
+    return False
+
+def last_activity_ms():
+    """Tick del último bit recibido en cualquier carril (0 si ninguno)."""
+    t = 0
+    for c in lanes:
+        if c.last_ms and (not t or _ticks_diff(c.last_ms, t) > 0):
+            t = c.last_ms
+    return t
+
+def stats():
+    return {c.id: {"dropped": c.dropped, "queued": c.pending()} for c in lanes}
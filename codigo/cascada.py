@@ -0,0 +1,131 @@
+# cascada.py — filtro barato antes del detector FOMO
+# Cada frame pasa primero por comprobaciones de estadística de imagen (y, si existe,
+# un clasificador diminuto /model/gate.tflite). Si el frame no sirve, no se llama a
+# net.predict; si los primeros MAX_REJECTS frames de una pasada no sirven, la pasada
+# termina con "reintentar / no hay nadie" sin gastar inferencias.
+#
+#   Etapa 1: brillo (lente tapada / contraluz), contraste, nitidez
+#   Etapa 2: presencia (diferencia con el fondo vacío aprendido en ratos libres)
+#   Etapa 3: clasificador opcional (probabilidad de "persona")
+#
+# Los contadores (report()) dicen cuántas inferencias se han ahorrado.
+#
+# Desactivada por defecto: los umbrales de abajo son de partida y dependen de la luz y
+# la cámara de cada puerta. Para calibrarlos antes de activarla:
+#   1. ENABLED = False, SHADOW = True: cada frame se evalúa y se cuenta, pero va al
+#      modelo igualmente (no se ahorra nada ni se pierde ninguna detección)
+#   2. Tras unos días de uso normal, mirar "cascada" en las métricas:
+#      - miss_<motivo>: frames que esa etapa habría descartado y en los que FOMO sí vio
+#        una cabeza. Tiene que ser 0 (o casi): si no, aflojar ese umbral (BRIGHT_MIN/MAX,
+#        CONTRAST_MIN, SHARP_MIN, PRESENCE_MIN o GATE_MIN_PROB) y repetir
+#      - rej_<motivo>: lo que ahorraría cada etapa; si una no descarta nada, se puede
+#        apagar (SHARP_MIN = 0, PRESENCE_MIN = 0) y ahorrarse su coste (metrics "gate")
+#      - pass_rate / inferences_saved: el ahorro total esperado
+#   3. Con los miss_* a cero: ENABLED = True (SHADOW ya no se mira) y vigilar
+#      swipes_retry frente a swipes: las pasadas que acaban en "reintentar"
+
+import utime
+
+ENABLED = False
+SHADOW  = False          # con ENABLED = False: evaluar y contar sin descartar nada
+
+BRIGHT_MIN     = 20      # media de gris por debajo: lente tapada / oscuridad
+BRIGHT_MAX     = 235     # por encima: saturado
+CONTRAST_MIN   = 8       # desviación típica mínima (escena plana = tapada)
+SHARP_MIN      = 4       # desviación típica del laplaciano (0 = sin comprobación)
+PRESENCE_MIN   = 10      # diferencia media con el fondo vacío (0 = sin comprobación)
+MAX_REJECTS    = 3       # frames descartados seguidos al empezar -> reintentar
+SMALL_SCALE    = 0.25    # las comprobaciones se hacen sobre una copia reducida
+BG_REFRESH_MS  = 10 * 60 * 1000
+
+GATE_MODEL     = "/model/gate.tflite"   # opcional
+GATE_LABEL     = "persona"
+GATE_MIN_PROB  = 0.5
+
+_bg = None
+_bg_ms = None
+_gate_net = None
+_gate_idx = 0
+
+stats = {"frames": 0, "to_model": 0, "rej_oscuro": 0, "rej_saturado": 0, "rej_tapado": 0,
+         "rej_borroso": 0, "rej_vacio": 0, "rej_modelo": 0, "swipes": 0, "swipes_retry": 0,
+         "miss_oscuro": 0, "miss_saturado": 0, "miss_tapado": 0, "miss_borroso": 0,
+         "miss_vacio": 0, "miss_modelo": 0}
+
+def load_gate_model():
+    """Carga el clasificador opcional si está en la SD (si no, solo estadísticas)."""
+    global _gate_net, _gate_idx
+    try:
+        import ml
+        _gate_net = ml.Model(GATE_MODEL)
+        labels = [l.rstrip("\n") for l in open(GATE_MODEL.rsplit(".", 1)[0] + "_labels.txt")]
+        _gate_idx = labels.index(GATE_LABEL)
+        print("[gate] Clasificador previo cargado:", GATE_MODEL)
+    except Exception as e:
+        _gate_net = None
+        print("[gate] Sin clasificador previo (%s): solo estadísticas" % e)
+
+def _small(img):
+    return img.copy(x_scale=SMALL_SCALE, y_scale=SMALL_SCALE)
+
+def learn_background(img, force=False):
+    """Guarda el fondo vacío (llamar en ratos libres, sin nadie delante)."""
+    global _bg, _bg_ms
+    now = utime.ticks_ms()
+    if not force and _bg_ms is not None and utime.ticks_diff(now, _bg_ms) < BG_REFRESH_MS:
+        return False
+    _bg = _small(img)
+    _bg_ms = now
+    return True
+
+def background_due():
+    return PRESENCE_MIN > 0 and (_bg_ms is None or utime.ticks_diff(utime.ticks_ms(), _bg_ms) >= BG_REFRESH_MS)
+
+def _reject(reason):
+    stats["rej_" + reason] += 1
+    return (False, reason)
+
+def check(img):
+    """(True, "ok") si el frame merece inferencia; si no, (False, motivo)."""
+    stats["frames"] += 1
+    small = _small(img)
+    st = small.get_statistics()
+    mean = st.mean()
+    if mean < BRIGHT_MIN:
+        return _reject("oscuro")
+    if mean > BRIGHT_MAX:
+        return _reject("saturado")
+    if st.stdev() < CONTRAST_MIN:
+        return _reject("tapado")
+    if SHARP_MIN > 0:
+        # laplacian() y difference() son in-place: cada uno sobre su copia reducida
+        if _small(img).laplacian(1).get_statistics().stdev() < SHARP_MIN:
+            return _reject("borroso")
+    if PRESENCE_MIN > 0 and _bg is not None:
+        if small.difference(_bg).get_statistics().mean() < PRESENCE_MIN:
+            return _reject("vacio")
+    if _gate_net is not None:
+        out = _gate_net.predict([img])[0].flatten().tolist()
+        if out[_gate_idx] < GATE_MIN_PROB:
+            return _reject("modelo")
+    stats["to_model"] += 1
+    return (True, "ok")
+
+def note_miss(reason):
+    """SHADOW: el frame se habría descartado por reason y el modelo sí detectó algo."""
+    stats["miss_" + reason] += 1
+
+def note_swipe(retry):
+    stats["swipes"] += 1
+    if retry:
+        stats["swipes_retry"] += 1
+
+def report():
+    """Contadores desde el arranque + tasas de paso por etapa."""
+    r = dict(stats)
+    n = stats["frames"] or 1
+    r["pass_rate"] = stats["to_model"] / n
+    r["inferences_saved"] = stats["frames"] - stats["to_model"]
+    r["enabled"] = ENABLED
+    r["shadow"] = SHADOW and not ENABLED
+    return r
@@ -1,13 +1,24 @@
 # cloud_sync.py — Portenta/OpenMV: subida mensual de CSV + manifest a Supabase
 # Robusto frente a respuestas chunked o texto plano (intenta dechunk + parse JSON).
+# Compresión opcional del CSV (gzip, módulo deflate del firmware): solo si el servidor
+# la anuncia con la cabecera X-Upload-Encodings en una respuesta anterior. El CSV se
+# comprime por trozos a un temporal de la SD y el cuerpo se envía por trozos; el sha
+# del manifest sigue siendo el del CSV sin comprimir (el servidor descomprime y verifica).
 
 import os, ujson, utime
+import config_service
 try:
     import urequests as requests
 except:
     raise OSError("HTTPS no disponible: falta urequests/TLS en el firmware")
 
 CONFIG_PATH = "/config/server.json"
+DATA_DIR    = "/data"
+CHUNK       = 1024
+GZIP_WBITS  = 10        # ventana de 1 KB: RAM acotada y buena tasa con líneas de ~120 B
+
+_gzip_ok = None         # None = sin negociar; True/False según lo anunciado por el servidor
+stats = {"uploads": 0, "gzip": 0, "csv_bytes": 0, "sent_bytes": 0, "fallbacks": 0}
 
 def _exists(p):
     try:
@@ -15,10 +26,6 @@ def _exists(p):
     except:
         return False
 
-def _load_cfg():
-    with open(CONFIG_PATH, "r") as f:
-        return ujson.loads(f.read())
-
 def _multipart(fields, files):
     boundary = "----PPE%u" % utime.ticks_ms()
     CRLF = "\r\n"
@@ -38,6 +45,78 @@ def _multipart(fields, files):
     body += ("--%s--%s" % (boundary, CRLF)).encode()
     return body, "multipart/form-data; boundary=%s" % boundary
 
+def _multipart_stream(fields, files):
+    """
+    Como _multipart() pero sin juntar el cuerpo en RAM. content puede ser bytes o la
+    ruta (str) de un fichero que se lee por trozos al enviar.
+    Devuelve (longitud, generador de trozos, content_type).
+    """
+    boundary = "----PPE%u" % utime.ticks_ms()
+    CRLF = b"\r\n"
+    parts = []
+    for k, v in fields.items():
+        parts.append(('--%s\r\nContent-Disposition: form-data; name="%s"\r\n\r\n%s\r\n'
+                      % (boundary, k, v)).encode())
+    for name, (filename, content, ctype) in files.items():
+        parts.append(('--%s\r\nContent-Disposition: form-data; name="%s"; filename="%s"\r\n'
+                      'Content-Type: %s\r\n\r\n' % (boundary, name, filename, ctype)).encode())
+        parts.append(content)
+        parts.append(CRLF)
+    parts.append(("--%s--\r\n" % boundary).encode())
+
+    total = 0
+    for p in parts:
+        total += os.stat(p)[6] if isinstance(p, str) else len(p)
+
+    def gen():
+        buf = bytearray(CHUNK)
+        mv = memoryview(buf)
+        for p in parts:
+            if not isinstance(p, str):
+                yield p
+                continue
+            with open(p, "rb") as f:
+                while True:
+                    n = f.readinto(buf)
+                    if not n:
+                        break
+                    yield mv[:n]
+    return total, gen(), "multipart/form-data; boundary=%s" % boundary
+
+def _gzip_file(src, dst):
+    """Comprime src en dst por trozos. False si el firmware no trae compresor."""
+    try:
+        import deflate
+    except ImportError:
+        return False
+    buf = bytearray(CHUNK)
+    mv = memoryview(buf)
+    try:
+        with open(src, "rb") as fi, open(dst, "wb") as fo:
+            z = deflate.DeflateIO(fo, deflate.GZIP, GZIP_WBITS)
+            while True:
+                n = fi.readinto(buf)
+                if not n:
+                    break
+                z.write(mv[:n])
+            z.close()
+        return True
+    except Exception as e:
+        print("[cloud] Sin compresión (%s)" % e)
+        try: os.remove(dst)
+        except: pass
+        return False
+
+def _note_encodings(r):
+    # El servidor anuncia qué codificaciones del CSV acepta (p.ej. "gzip")
+    global _gzip_ok
+    try:
+        v = r.headers.get(b"x-upload-encodings")
+        if v is not None:
+            _gzip_ok = b"gzip" in v
+    except:
+        pass
+
 def _dechunk(s):
     # Convierte Transfer-Encoding: chunked en cuerpo plano (si detecta formato chunked).
     # s: str
@@ -94,30 +173,58 @@ def upload_month(yyyymm):
     al endpoint Edge Function. Devuelve el JSON de respuesta del servidor
     (dict) o {ok: False, ...} si hay fallo local/red.
     """
-    cfg = _load_cfg()
-    url = cfg["function_url"].rstrip("/")
-    edge_key = cfg["edge_api_key"]
+    url, edge_key = config_service.require(CONFIG_PATH, "function_url", "edge_api_key")
+    url = url.rstrip("/")
+    send_metrics = config_service.get_bool(CONFIG_PATH, "upload_metrics", False)
 
-    csv_path = "/data/events_%s.csv" % yyyymm
-    man_path = "/data/events_%s.manifest.json" % yyyymm
+    csv_path = "%s/events_%s.csv" % (DATA_DIR, yyyymm)
+    man_path = "%s/events_%s.manifest.json" % (DATA_DIR, yyyymm)
 
     if not (_exists(csv_path) and _exists(man_path)):
         return {"ok": False, "error": "faltan_ficheros", "csv": _exists(csv_path), "manifest": _exists(man_path)}
 
-    # Cargar bytes
-    with open(csv_path, "rb") as f:
-        csv_bytes = f.read()
+    # gzip solo si el servidor lo ha anunciado y no se ha desactivado en server.json
+    gz_path = None
+    if _gzip_ok and config_service.get_bool(CONFIG_PATH, "compress_csv", True):
+        gz_path = csv_path + ".gz.tmp"
+        if not _gzip_file(csv_path, gz_path):
+            gz_path = None
+    try:
+        resp, status = _post_month(url, edge_key, send_metrics, yyyymm, csv_path, man_path, gz_path)
+    finally:
+        if gz_path:
+            try: os.remove(gz_path)
+            except: pass
+    if gz_path and status == 415:
+        # El servidor ya no acepta gzip: se desactiva y se reenvía sin comprimir
+        stats["fallbacks"] += 1
+        resp, status = _post_month(url, edge_key, send_metrics, yyyymm, csv_path, man_path, None)
+    return resp
+
+def _post_month(url, edge_key, send_metrics, yyyymm, csv_path, man_path, gz_path):
+    global _gzip_ok
     with open(man_path, "rb") as f:
         man_bytes = f.read()
 
     fields = {"yyyymm": yyyymm}
+    if gz_path:
+        fields["csv_encoding"] = "gzip"
+        csv_part = ("events_%s.csv.gz" % yyyymm, gz_path, "application/gzip")
+    else:
+        csv_part = ("events_%s.csv" % yyyymm, csv_path, "text/csv")
     files = {
-        "csv": ("events_%s.csv" % yyyymm, csv_bytes, "text/csv"),
+        "csv": csv_part,
         "manifest": ("events_%s.manifest.json" % yyyymm, man_bytes, "application/json"),
     }
-    body, content_type = _multipart(fields, files)
+    # Opcional: métricas de latencia del mes (metrics.py), si "upload_metrics": true
+    met_path = "%s/metrics_%s.json" % (DATA_DIR, yyyymm)
+    if send_metrics and _exists(met_path):
+        with open(met_path, "rb") as f:
+            files["metrics"] = ("metrics_%s.json" % yyyymm, f.read(), "application/json")
+    length, body, content_type = _multipart_stream(fields, files)
     headers = {
         "Content-Type": content_type,
+        "Content-Length": str(length),
         "x-edge-key": edge_key,
         # Si activas Verify JWT en la función: añade Authorization con anon key.
         # "Authorization": "Bearer <TU_ANON_KEY>"
@@ -126,12 +233,26 @@ def upload_month(yyyymm):
     try:
         r = requests.post(url, data=body, headers=headers)
         try:
+            status = r.status_code
+            _note_encodings(r)
+            if gz_path and status == 415:
+                _gzip_ok = False
             resp = _parse_json_response(r)
         finally:
             try:
                 r.close()
             except:
                 pass
-        return resp
     except Exception as e:
-        return {"ok": False, "error": "http_err:%s" % e}
+        return {"ok": False, "error": "http_err:%s" % e}, None
+    stats["uploads"] += 1
+    stats["csv_bytes"] += os.stat(csv_path)[6]
+    stats["sent_bytes"] += length
+    if gz_path:
+        stats["gzip"] += 1
+    return resp, status
+
+def report():
+    r = dict(stats)
+    r["gzip_negotiated"] = _gzip_ok
+    return r
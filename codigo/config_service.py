@@ -0,0 +1,155 @@
+# config_service.py — configuración de /config en RAM (server.json, wifi.json...)
+# - Cada fichero se lee, se valida y se guarda una vez; solo se relee si cambian su
+#   tamaño o su mtime (un uos.stat, como mucho cada CHECK_MS por fichero)
+# - register(ruta, esquema, post): tipos esperados por clave y un post-proceso opcional
+#   (wifi_setup descifra ahí la contraseña: queda en claro en RAM, no en cada reintento)
+# - Una clave con tipo incorrecto se descarta con aviso (el accesor da su valor por
+#   defecto); un fichero roto no tumba al que llama: se sigue con la última versión válida
+# - get_str/get_int/get_bool comprueban el tipo también en claves sin esquema: "10" vale
+#   como entero y "true"/"false" como bool; cualquier otra cosa da el valor por defecto
+#
+# Uso:
+#   url, key = config_service.require(SERVER, "function_url", "edge_api_key")
+#   rate = config_service.get_int(SERVER, "images_bytes_per_min", 65536)
+
+import uos, ujson, utime
+
+SERVER = "/config/server.json"
+WIFI   = "/config/wifi.json"
+
+CHECK_MS = 2000
+
+_ticks_ms   = utime.ticks_ms
+_ticks_diff = utime.ticks_diff
+
+_schemas = {
+    SERVER: {"function_url": str, "cards_url": str, "images_url": str, "images_key": str,
+             "edge_api_key": str,
+             "images_bytes_per_min": int, "upload_metrics": bool, "compress_csv": bool},
+}
+_post = {}
+_cache = {}            # ruta -> [tamaño, mtime, dict, t_última_comprobación]
+
+stats = {"loads": 0, "hits": 0, "checks": 0, "errors": 0}
+
+def register(path, schema=None, post=None):
+    """schema: {clave: tipo}; post(dict) -> dict se aplica tras cada carga válida."""
+    if schema is not None:
+        _schemas[path] = schema
+    if post is not None:
+        _post[path] = post
+    _cache.pop(path, None)
+
+def _validate(path, cfg):
+    if not isinstance(cfg, dict):
+        raise ValueError("%s no es un objeto JSON" % path)
+    for k, t in _schemas.get(path, {}).items():
+        v = cfg.get(k)
+        if v is None:
+            continue
+        # en JSON un bool no vale como número ni al revés
+        if (t is bool) != isinstance(v, bool) or not isinstance(v, t):
+            print("[config] %s: '%s' debería ser %s; se ignora" % (path, k, t.__name__))
+            del cfg[k]
+    return cfg
+
+def _load(path, size, mtime, now):
+    with open(path) as f:
+        cfg = _validate(path, ujson.loads(f.read()))
+    fn = _post.get(path)
+    if fn is not None:
+        cfg = fn(cfg)
+    _cache[path] = [size, mtime, cfg, now]
+    stats["loads"] += 1
+    return cfg
+
+def get(path):
+    """dict validado de path; OSError/ValueError si no hay ninguna versión válida."""
+    now = _ticks_ms()
+    e = _cache.get(path)
+    if e is not None and _ticks_diff(now, e[3]) < CHECK_MS:
+        stats["hits"] += 1
+        return e[2]
+    stats["checks"] += 1
+    try:
+        st = uos.stat(path)
+    except OSError:
+        if e is None:
+            raise
+        e[3] = now          # borrado: se sigue con lo último cargado
+        return e[2]
+    if e is not None and e[0] == st[6] and e[1] == st[8]:
+        e[3] = now
+        stats["hits"] += 1
+        return e[2]
+    try:
+        return _load(path, st[6], st[8], now)
+    except Exception as ex:
+        stats["errors"] += 1
+        if e is None:
+            raise
+        print("[config] %s no válido (%s); se mantiene el anterior" % (path, ex))
+        e[0], e[1], e[3] = st[6], st[8], now
+        return e[2]
+
+def _get(path, key, default):
+    try:
+        v = get(path).get(key)
+    except Exception:
+        return default
+    return default if v is None else v
+
+def get_str(path, key, default=None):
+    v = _get(path, key, default)
+    return v if isinstance(v, str) else default
+
+def get_int(path, key, default=0):
+    v = _get(path, key, default)
+    if isinstance(v, bool):
+        return default
+    if isinstance(v, int):
+        return v
+    if isinstance(v, str):
+        try:
+            return int(v.strip())
+        except ValueError:
+            pass
+    return default
+
+_TRUE  = ("true", "1", "yes", "si", "sí", "on")
+_FALSE = ("false", "0", "no", "off", "")
+
+def get_bool(path, key, default=False):
+    # "false" en el JSON es un str no vacío: no puede contar como verdadero
+    v = _get(path, key, default)
+    if isinstance(v, bool):
+        return v
+    if isinstance(v, str):
+        t = v.strip().lower()
+        if t in _TRUE:
+            return True
+        if t in _FALSE:
+            return False
+    return default
+
+def require(path, *keys):
+    """Valores de las claves obligatorias (en orden); ValueError si falta alguna."""
+    cfg = get(path)
+    out = []
+    for k in keys:
+        v = cfg.get(k)
+        if v is None or v == "":
+            raise ValueError("Falta '%s' en %s" % (k, path))
+        out.append(v)
+    return out
+
+def invalidate(path=None):
+    if path is None:
+        _cache.clear()
+    else:
+        _cache.pop(path, None)
+
+def report():
+    r = dict(stats)
+    r["files"] = len(_cache)
+    return r
@@ -0,0 +1,93 @@
+# dedup.py — supresión de eventos repetidos con ventanas de tiempo deslizantes
+# - Claves (site, user, autorizado, casco) de los eventos recientes en un dict
+#   (pertenencia O(1)) + un anillo en orden de llegada para caducarlas sin recorrer
+# - Ventana configurable por tipo de resultado (denegado / casco / nocasco)
+# - Contadores de eventos suprimidos (= escrituras SD, fotos y subidas ahorradas)
+#
+# Uso:
+#   if dedup.is_dup(key, now): ...      # no registrar (cuenta como suprimido)
+#   dedup.add(key, now)                 # tras escribir el evento
+
+import utime
+
+WINDOW_MS = {"denegado": 6000, "casco": 6000, "nocasco": 6000}
+MAX_KEYS  = 64       # tamaño del anillo (claves vivas a la vez)
+
+_ticks_ms   = utime.ticks_ms
+_ticks_diff = utime.ticks_diff
+
+_exp = {}                       # key -> ticks de caducidad
+_ring_k = [None] * MAX_KEYS     # claves en orden de llegada
+_ring_t = [0] * MAX_KEYS        # caducidad con la que entró cada una
+_head = 0                       # posición de la más antigua
+_n = 0
+
+stats = {"checked": 0, "suppressed": 0, "sup_denegado": 0, "sup_casco": 0,
+         "sup_nocasco": 0, "evicted": 0}
+
+def outcome(key):
+    """Tipo de resultado de una clave (site, user, autorizado, casco)."""
+    if not key[2]:
+        return "denegado"
+    return "casco" if key[3] else "nocasco"
+
+def _pop_oldest():
+    global _head, _n
+    k = _ring_k[_head]
+    if _exp.get(k) == _ring_t[_head]:
+        del _exp[k]                 # si se volvió a añadir, la entrada nueva manda
+    _ring_k[_head] = None
+    _head = (_head + 1) % MAX_KEYS
+    _n -= 1
+
+def _expire(now):
+    # Las ventanas difieren por tipo: se para en la primera no caducada (las que
+    # queden detrás ya caducadas se descartan igual en is_dup por su tiempo)
+    while _n and _ticks_diff(_ring_t[_head], now) <= 0:
+        _pop_oldest()
+
+def is_dup(key, now=None):
+    """True si la clave se registró dentro de su ventana (y lo cuenta como suprimido)."""
+    if now is None:
+        now = _ticks_ms()
+    stats["checked"] += 1
+    _expire(now)
+    t = _exp.get(key)
+    if t is None or _ticks_diff(t, now) <= 0:
+        return False
+    stats["suppressed"] += 1
+    stats["sup_" + outcome(key)] += 1
+    return True
+
+def add(key, now=None):
+    """Registra un evento escrito; la ventana empieza ahora (no se alarga con los repetidos)."""
+    global _n
+    if now is None:
+        now = _ticks_ms()
+    _expire(now)
+    if _n == MAX_KEYS:
+        stats["evicted"] += 1
+        _pop_oldest()
+    t = utime.ticks_add(now, WINDOW_MS.get(outcome(key), 6000))
+    i = (_head + _n) % MAX_KEYS
+    _ring_k[i] = key
+    _ring_t[i] = t
+    _n += 1
+    _exp[key] = t
+
+def clear():
+    global _head, _n
+    _exp.clear()
+    for i in range(MAX_KEYS):
+        _ring_k[i] = None
+    _head = 0
+    _n = 0
+
+def report():
+    r = dict(stats)
+    r["live"] = _n
+    # Cada evento suprimido ahorra la línea CSV + manifest (y la subida del mes);
+    # los de casco/nocasco además la foto
+    r["sd_writes_saved"] = stats["suppressed"] * 2
+    r["images_saved"] = stats["sup_casco"] + stats["sup_nocasco"]
+    return r
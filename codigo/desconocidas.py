@@ -0,0 +1,87 @@
+# desconocidas.py — contador agregado de tarjetas ajenas (no están en cards.csv)
+# En vez de un evento CSV + manifest + subida por cada pasada de una tarjeta que el
+# filtro bloom de la ACL descarta, se acumula un registro por mes y se escribe a la
+# SD como mucho cada FLUSH_MS:
+#   /data/unknown_YYYYMM.json -> {"month", "count", "distinct", "first", "last", "top": {"site:user": n}}
+# El resumen también viaja en metrics_YYYYMM.json (register_extra).
+
+import utime, ujson
+import timesvc
+from storage_local import _atomic_write_json
+
+DATA_DIR  = "/data"
+FLUSH_MS  = 5 * 60 * 1000
+TOP_MAX   = 32          # tarjetas distintas que se detallan (el resto solo cuenta)
+
+_ticks_ms   = utime.ticks_ms
+_ticks_diff = utime.ticks_diff
+
+_rec = None
+_dirty = False
+_last_flush_ms = None
+
+def _path(month):
+    return "%s/unknown_%s.json" % (DATA_DIR, month)
+
+def _load(month):
+    try:
+        with open(_path(month), "r") as f:
+            r = ujson.loads(f.read())
+        if r.get("month") == month:
+            return r
+    except:
+        pass
+    return {"month": month, "count": 0, "distinct": 0, "first": "", "last": "", "top": {}}
+
+def _current():
+    global _rec
+    m = timesvc.yyyymm()
+    if _rec is None or _rec["month"] != m:
+        if _rec is not None and _dirty:
+            flush(force=True)             # cierra el mes anterior
+        _rec = _load(m)
+    return _rec
+
+def note(site_code, user_code):
+    """Cuenta una pasada de tarjeta ajena (solo RAM; flush_if_due la persiste)."""
+    global _dirty
+    r = _current()
+    ts = timesvc.now_iso()
+    r["count"] += 1
+    if not r["first"]:
+        r["first"] = ts
+    r["last"] = ts
+    k = "%d:%d" % (site_code, user_code)
+    top = r["top"]
+    if k in top:
+        top[k] += 1
+    else:
+        r["distinct"] += 1            # aproximado si top ya está lleno
+        if len(top) < TOP_MAX:
+            top[k] = 1
+    _dirty = True
+
+def flush(force=False):
+    global _dirty, _last_flush_ms
+    if _rec is None or not (_dirty or force):
+        return False
+    path = _path(_rec["month"])
+    try:
+        _atomic_write_json(path, _rec)
+        _dirty = False
+    except Exception as e:
+        print("[unknown] Error guardando:", e)
+    _last_flush_ms = _ticks_ms()
+    return True
+
+def flush_if_due():
+    """Persistencia limitada: como mucho una escritura cada FLUSH_MS."""
+    if not _dirty:
+        return False
+    if _last_flush_ms is not None and _ticks_diff(_ticks_ms(), _last_flush_ms) < FLUSH_MS:
+        return False
+    return flush()
+
+def report():
+    r = _current()
+    return {"count": r["count"], "distinct": r["distinct"], "last": r["last"]}
@@ -0,0 +1,108 @@
+# deteccion.py — lógica de decisión casco/nocasco, sin dependencias de OpenMV
+# La usan main.py (en la placa) y herramientas/evaluar_modelo.py (en el PC), para
+# que la evaluación offline reproduzca exactamente la decisión del dispositivo.
+#
+# Resultado de un frame (count_frame):
+#   (casco_count, casco_best, nocasco_count, nocasco_best, casco_rect, nocasco_rect)
+
+def count_frame(results, idx_casco, idx_nocasco, min_conf):
+    """Cuenta detecciones >= min_conf por clase a partir de la salida de fomo_post_process."""
+    casco_count = nocasco_count = 0
+    casco_best = nocasco_best = 0.0
+    casco_rect = nocasco_rect = None
+    for i, det_list in enumerate(results):
+        if i == 0: continue
+        if i == idx_casco:
+            for (_x,_y,_w,_h,score) in det_list:
+                if score < min_conf: continue
+                casco_count += 1
+                if score > casco_best: casco_best = score; casco_rect = (_x,_y,_w,_h)
+        elif i == idx_nocasco:
+            for (_x,_y,_w,_h,score) in det_list:
+                if score < min_conf: continue
+                nocasco_count += 1
+                if score > nocasco_best: nocasco_best = score; nocasco_rect = (_x,_y,_w,_h)
+    return (casco_count, casco_best, nocasco_count, nocasco_best, casco_rect, nocasco_rect)
+
+class Decision:
+    """Acumula frames de una pasada; add() devuelve True si procede parar antes (early stop)."""
+    def __init__(self, min_conf, early_stop=True):
+        self.min_conf = min_conf
+        self.early_stop = early_stop
+        self.frames = 0
+        self.tot_casco = self.tot_nocasco = 0
+        self.best_casco = self.best_nocasco = 0.0
+        self.rect_casco = self.rect_nocasco = None
+
+    def add(self, counts):
+        c_cnt, c_best, n_cnt, n_best, c_rect, n_rect = counts
+        self.frames += 1
+        self.tot_casco += c_cnt; self.tot_nocasco += n_cnt
+        if c_best > self.best_casco: self.best_casco = c_best; self.rect_casco = c_rect
+        if n_best > self.best_nocasco: self.best_nocasco = n_best; self.rect_nocasco = n_rect
+        if not self.early_stop:
+            return False
+        if (self.tot_casco >= 2 and self.tot_casco > self.tot_nocasco) and self.best_casco >= self.min_conf:
+            return True
+        if (self.tot_nocasco >= 2 and self.tot_nocasco > self.tot_casco) and self.best_nocasco >= self.min_conf:
+            return True
+        return False
+
+    def result(self):
+        """(casco?, score, rect) — rect: mejor detección de la clase ganadora (o None)."""
+        if (self.tot_casco == 0 and self.tot_nocasco == 0):
+            return (False, 0.0, None)  # fallback seguro: NO CASCO
+        if self.tot_casco != self.tot_nocasco:
+            if self.tot_casco > self.tot_nocasco:
+                return (True, self.best_casco, self.rect_casco)
+            return (False, self.best_nocasco, self.rect_nocasco)
+        if self.best_casco > self.best_nocasco:  # empates -> NO CASCO
+            return (True, self.best_casco, self.rect_casco)
+        return (False, max(self.best_casco, self.best_nocasco), self.rect_nocasco)
+
+class Pasada:
+    """
+    Pasada de detección frame a frame (para intercalar varios carriles con un solo
+    modelo). step(counts) con counts=None si la cascada descartó el frame; devuelve
+    True cuando la pasada ha terminado. result(): None (no hay nadie) o
+    (casco?, score, rect, frames_usados), igual que decide().
+    """
+    def __init__(self, max_frames=8, early_stop=True, min_conf=0.40, max_rejects=0):
+        self.d = Decision(min_conf, early_stop)
+        self.max_frames = max_frames
+        self.max_rejects = max_rejects
+        self.rejects = 0
+        self.steps = 0
+        self.empty = False
+        self.done = (max_frames + max_rejects) <= 0
+
+    def step(self, counts):
+        self.steps += 1
+        if counts is None:
+            self.rejects += 1
+            if self.d.frames == 0 and self.rejects >= self.max_rejects:
+                self.empty = True
+                self.done = True
+        elif self.d.add(counts) or self.d.frames >= self.max_frames:
+            self.done = True
+        if self.steps >= self.max_frames + self.max_rejects:
+            self.done = True
+        return self.done
+
+    def result(self):
+        if self.empty:
+            return None
+        r = self.d.result()
+        return (r[0], r[1], r[2], self.d.frames)
+
+def decide(next_counts, max_frames=8, early_stop=True, min_conf=0.40, max_rejects=0):
+    """
+    Ejecuta hasta max_frames frames válidos llamando a next_counts().
+    next_counts() puede devolver None (frame descartado por la cascada previa): no
+    cuenta como frame del modelo. Si los max_rejects primeros se descartan, devuelve
+    None (no hay nadie delante: reintentar). Si no, (casco?, score, rect, frames_usados).
+    """
+    p = Pasada(max_frames, early_stop, min_conf, max_rejects)
+    while not p.done:
+        p.step(next_counts())
+    return p.result()
@@ -0,0 +1,175 @@
+# feedback.py — señalización LED/zumbador sin bloquear el bucle principal
+# - Patrones = secuencias (máscara, ticks) precalculadas; al terminar todo se apaga
+# - Un timer hardware (pyb.Timer, cada TICK_MS) avanza el patrón en curso desde la
+#   IRQ (sin asignaciones: solo índices y referencias a tuplas ya creadas)
+# - Sin timer disponible: poll() desde el bucle hace lo mismo con ticks_ms
+# - Cola corta de patrones: play() encola; preempt=True corta lo que suene
+#   (la respuesta a una pasada no espera a un parpadeo de sync)
+#
+# Uso:
+#   feedback.init()
+#   feedback.play(feedback.CASCO, preempt=True)
+
+import utime
+try:
+    import pyb
+    from machine import Pin, disable_irq, enable_irq
+except:
+    pyb = None
+
+TICK_MS    = 20
+TIMER_ID   = 7          # timer básico (sin pines) del STM32H7
+BUZZER_PIN = None       # p.ej. "D5" si hay zumbador (activo a nivel alto)
+QUEUE_LEN  = 4
+
+RED, GREEN, BLUE, BUZZ = 1, 2, 4, 8
+
+def _pat(*steps):
+    # (máscara, ms) -> (máscara, ticks, máscara, ticks, ...)
+    out = []
+    for mask, ms in steps:
+        out.append(mask)
+        out.append(max(1, (ms + TICK_MS - 1) // TICK_MS))
+    return tuple(out)
+
+# Códigos de señalización
+CASCO       = _pat((GREEN, 800))
+NOCASCO     = _pat((RED | BUZZ, 300), (RED, 500))
+NO_AUTH     = _pat((BLUE, 600))
+DESCONOCIDA = _pat((BLUE, 150), (0, 100), (BLUE, 150))
+REPETIDO_OK = _pat((GREEN, 500))
+REPETIDO_KO = _pat((RED, 500))
+REINTENTAR  = _pat((BLUE, 300))
+SYNC_OK     = _pat((BLUE, 200))
+ERROR       = _pat((RED, 100), (0, 100), (RED, 100), (0, 100), (RED, 100))
+ARRANQUE    = _pat((GREEN, 200), (0, 200), (GREEN, 200), (0, 200))
+
+_leds = None            # [rojo, verde, azul]
+_buzz = None
+_timer = None
+
+_cur = None             # patrón en curso
+_i = 0                  # índice de la máscara actual dentro de _cur
+_left = 0               # ticks que le quedan al paso actual
+_q = [None] * QUEUE_LEN
+_qh = 0
+_qn = 0
+_last_ms = 0
+dropped = 0
+
+_ticks_ms   = utime.ticks_ms
+_ticks_diff = utime.ticks_diff
+
+def _set(mask):
+    if _leds is None:
+        return
+    r, g, b = _leds
+    if mask & RED: r.on()
+    else: r.off()
+    if mask & GREEN: g.on()
+    else: g.off()
+    if mask & BLUE: b.on()
+    else: b.off()
+    if _buzz is not None:
+        _buzz.value(1 if mask & BUZZ else 0)
+
+def _next():
+    global _cur, _i, _left, _qh, _qn
+    if not _qn:
+        return False
+    _cur = _q[_qh]
+    _q[_qh] = None
+    _qh = (_qh + 1) % QUEUE_LEN
+    _qn -= 1
+    _i = 0
+    _left = _cur[1]
+    _set(_cur[0])
+    return True
+
+def _advance(n):
+    global _cur, _i, _left
+    while n > 0:
+        if _cur is None and not _next():
+            return
+        if n < _left:
+            _left -= n
+            return
+        n -= _left
+        _i += 2
+        if _i >= len(_cur):
+            _cur = None
+            _set(0)
+        else:
+            _set(_cur[_i])
+            _left = _cur[_i + 1]
+
+def _irq(t):
+    _advance(1)
+
+def init(timer_id=TIMER_ID):
+    """LEDs de la placa + zumbador opcional; timer hardware si se puede, si no poll()."""
+    global _leds, _buzz, _timer
+    if pyb is None:
+        return False
+    _leds = [pyb.LED(1), pyb.LED(2), pyb.LED(3)]
+    if BUZZER_PIN:
+        try:
+            _buzz = Pin(BUZZER_PIN, Pin.OUT)
+            _buzz.value(0)
+        except Exception as e:
+            print("[feedback] Sin zumbador:", e)
+    _set(0)
+    try:
+        _timer = pyb.Timer(timer_id, freq=1000 // TICK_MS, callback=_irq)
+    except Exception as e:
+        _timer = None
+        print("[feedback] Sin timer (%s): avance desde el bucle" % e)
+    return _timer is not None
+
+def play(pattern, preempt=False):
+    """Encola un patrón (no bloquea). preempt=True vacía la cola y corta el actual."""
+    global _cur, _qn, _last_ms, dropped
+    st = disable_irq() if pyb is not None else None
+    try:
+        if preempt:
+            _cur = None
+            for k in range(QUEUE_LEN):
+                _q[k] = None
+            _qn = 0
+        if _qn == QUEUE_LEN:
+            dropped += 1
+        else:
+            _q[(_qh + _qn) % QUEUE_LEN] = pattern
+            _qn += 1
+        if _cur is None:
+            _last_ms = _ticks_ms()
+            _next()
+    finally:
+        if st is not None:
+            enable_irq(st)
+
+def poll():
+    """Solo sin timer: avanza los ticks transcurridos desde la última llamada."""
+    global _last_ms
+    if _timer is not None or (_cur is None and not _qn):
+        return
+    d = _ticks_diff(_ticks_ms(), _last_ms)
+    if d >= TICK_MS:
+        n = d // TICK_MS
+        _last_ms = utime.ticks_add(_last_ms, n * TICK_MS)
+        _advance(n)
+
+def busy():
+    return _cur is not None or _qn > 0
+
+def stop():
+    """Corta el patrón en curso, vacía la cola y apaga todo."""
+    global _cur, _qn
+    st = disable_irq() if pyb is not None else None
+    _cur = None
+    for k in range(QUEUE_LEN):
+        _q[k] = None
+    _qn = 0
+    _set(0)
+    if st is not None:
+        enable_irq(st)
@@ -0,0 +1,129 @@
+# hashcache.py — SHA-256 de ficheros con memoria (manifest, ACL y subidas)
+# - Caché por ruta con (tamaño, mtime): si el fichero no ha cambiado no se vuelve a leer
+# - Ficheros que solo crecen (events_YYYYMM.csv): con append_only=True se guarda el
+#   hash a medias y se continúa desde el último offset. Necesita sha256().copy(), que el
+#   uhashlib de MicroPython no tiene: en la placa (_CAN_COPY False) se rehace entero
+#   como antes y "resumable" sale False en report(); solo acelera en el host (CPython)
+# - Lectura con readinto sobre un único búfer de BUF_SIZE (sin un bytes nuevo por trozo).
+#   Búfer y caché van bajo un cerrojo: en el host (carga_flota) varios hilos comparten
+#   este módulo; en la placa hay un solo hilo y el cerrojo no cuesta nada
+# - put(): quien ya ha calculado el sha leyendo el fichero (recarga de ACL) lo deja aquí
+#
+# Uso:
+#   hashcache.sha256_hex("/data/events_202510.csv", append_only=True)
+
+import uos, uhashlib
+
+BUF_SIZE    = 4096
+MAX_ENTRIES = 8
+
+_buf = bytearray(BUF_SIZE)
+_mv  = memoryview(_buf)
+_cache = {}            # ruta -> [tamaño, mtime, hex, hash_abierto | None]
+_order = []            # rutas por antigüedad (para descartar al pasar de MAX_ENTRIES)
+
+stats = {"hits": 0, "misses": 0, "resumed": 0, "bytes": 0}
+
+try:
+    _CAN_COPY = hasattr(uhashlib.sha256(), "copy")
+except:
+    _CAN_COPY = False
+
+class _NoLock:
+    def __enter__(self):
+        return self
+    def __exit__(self, *a):
+        return False
+
+try:
+    import _thread
+    _lock = _thread.allocate_lock()
+except:
+    _lock = _NoLock()
+
+def _hex(d):
+    try:
+        import ubinascii
+        return ubinascii.hexlify(d).decode()
+    except:
+        _h = "0123456789abcdef"
+        return "".join(_h[(x>>4)&0xF] + _h[x&0xF] for x in d)
+
+def _stat(path):
+    st = uos.stat(path)
+    return st[6], st[8]
+
+def _feed(h, f):
+    n_tot = 0
+    while True:
+        n = f.readinto(_buf)
+        if not n:
+            break
+        h.update(_mv[:n] if n < BUF_SIZE else _buf)
+        n_tot += n
+    stats["bytes"] += n_tot
+    return n_tot
+
+def _store(path, size, mtime, hx, h):
+    if path not in _cache:
+        _order.append(path)
+        if len(_order) > MAX_ENTRIES:
+            _cache.pop(_order.pop(0), None)
+    _cache[path] = [size, mtime, hx, h]
+
+def sha256_hex(path, append_only=False):
+    """SHA-256 en hex del fichero; OSError si no existe."""
+    with _lock:
+        return _sha256_hex(path, append_only)
+
+def _sha256_hex(path, append_only):
+    size, mtime = _stat(path)
+    e = _cache.get(path)
+    if e is not None and e[0] == size and e[1] == mtime:
+        stats["hits"] += 1
+        return e[2]
+    stats["misses"] += 1
+    resumed = False
+    with open(path, "rb") as f:
+        if append_only and e is not None and e[3] is not None and size > e[0]:
+            # Solo se ha añadido por el final: seguir desde donde se quedó, sobre una
+            # copia (si la lectura falla, la entrada guardada sigue valiendo)
+            h = e[3].copy()
+            f.seek(e[0])
+            resumed = True
+        else:
+            h = uhashlib.sha256()
+        _feed(h, f)
+    if resumed:
+        stats["resumed"] += 1
+    if append_only and _CAN_COPY:
+        hx = _hex(h.copy().digest())     # digest() cierra el hash: se hace sobre la copia
+    else:
+        hx = _hex(h.digest())
+        h = None
+    _store(path, size, mtime, hx, h)
+    return hx
+
+def put(path, hx):
+    """Registra un sha ya calculado para el contenido actual de path."""
+    with _lock:
+        try:
+            size, mtime = _stat(path)
+        except OSError:
+            return
+        _store(path, size, mtime, hx, None)
+
+def invalidate(path=None):
+    with _lock:
+        if path is None:
+            _cache.clear()
+            del _order[:]
+        elif path in _cache:
+            del _cache[path]
+            _order.remove(path)
+
+def report():
+    r = dict(stats)
+    r["entries"] = len(_cache)
+    r["resumable"] = _CAN_COPY
+    return r
@@ -0,0 +1,235 @@
+# image_uploader.py — subida en segundo plano de fotos de prueba a un bucket
+# - Cola persistente en SD (/data/img_queue.json): sobrevive a reinicios y se reanuda.
+#   Se guarda por lotes desde tick() (no en cada pasada) y tiene tope: sin red varios
+#   días se descartan primero las fotos casco=1 más antiguas
+# - Prioridad: primero las fotos casco=0 (incumplimientos), después casco=1
+# - Solo envía en ratos libres entre pasadas (MIN_IDLE_MS sin actividad)
+# - Límite de ancho de banda configurable (bytes/minuto, cubo de tokens)
+# - El JPEG se envía por trozos desde la SD (no entero en RAM: con la política "full"
+#   las fotos pueden ser grandes)
+#
+# Va directo a la API de Supabase Storage, que no mira x-edge-key: se autentica con
+# "Authorization: Bearer <images_key>" y "apikey: <images_key>". images_key es una clave
+# del proyecto con permiso de escritura en el bucket (política de insert/update), no la
+# edge_api_key de las Edge Functions.
+#
+# server.json (claves opcionales; sin images_url o images_key no se sube nada):
+# {
+#   "images_url": "https://<project>.supabase.co/storage/v1/object/<bucket>",
+#   "images_key": "<supabase-key>",
+#   "images_bytes_per_min": 65536
+# }
+
+import os, ujson, utime
+import config_service
+import timesvc
+from storage_local import _atomic_write_json
+try:
+    import urequests as requests
+except:
+    requests = None
+
+CFG_PATH   = "/config/server.json"
+QUEUE_PATH = "/data/img_queue.json"
+
+BYTES_PER_MIN_DEFAULT = 64 * 1024
+MIN_IDLE_MS           = 3000       # sin pasadas de tarjeta durante este tiempo
+BACKOFF_MIN_MS        = 15000
+BACKOFF_MAX_MS        = 5 * 60 * 1000
+CHUNK                 = 2048       # trozo de lectura del JPEG al enviar
+MAX_TRIES             = 20         # tras esto se descarta la foto de la cola
+MAX_QUEUE             = 400        # fotos en cola como máximo (RAM y tamaño del JSON)
+SAVE_EVERY_MS         = 30000      # cola modificada: se escribe como mucho con este intervalo
+
+_ticks_ms   = utime.ticks_ms
+_ticks_diff = utime.ticks_diff
+
+# Estado en RAM (la cola se persiste en QUEUE_PATH)
+_queue = None                # {"hi": [[path, tries, yyyymm], ...], "lo": [...]}
+_tokens = 0.0
+_tokens_ts = None
+_last_activity_ms = -600000
+_next_try_ms = 0
+_backoff_ms = BACKOFF_MIN_MS
+_dirty = False
+_saved_ms = None
+
+stats = {"sent": 0, "bytes": 0, "failed": 0, "dropped": 0}
+
+# ---------- utilidades ----------
+
+def _rate():
+    return max(1, config_service.get_int(CFG_PATH, "images_bytes_per_min", BYTES_PER_MIN_DEFAULT))
+
+def _file_size(path):
+    try:
+        return os.stat(path)[6]
+    except OSError:
+        return -1
+
+def _load_queue():
+    global _queue
+    if _queue is not None:
+        return _queue
+    try:
+        with open(QUEUE_PATH) as f:
+            q = ujson.loads(f.read())
+        _queue = {"hi": q.get("hi", []), "lo": q.get("lo", [])}
+    except:
+        _queue = {"hi": [], "lo": []}
+    return _queue
+
+def _mark_dirty():
+    global _dirty
+    _dirty = True
+
+def _save_if_dirty(now):
+    global _dirty, _saved_ms
+    if _dirty and (_saved_ms is None or _ticks_diff(now, _saved_ms) >= SAVE_EVERY_MS):
+        _dirty = False
+        _saved_ms = now
+        _save_queue()
+
+def _save_queue():
+    try:
+        _atomic_write_json(QUEUE_PATH, _queue)
+    except Exception as e:
+        print("[img] No se pudo guardar la cola:", e)
+
+def _object_name(path, month=None):
+    # /media/15082025T173142_52992745.jpg -> <checkpoint>/202508/15082025T173142_52992745.jpg
+    # (nombre a partir de timesvc.now_iso(): ddmmyyyy; el mes se guarda al encolar)
+    fname = path.rsplit("/", 1)[-1]
+    if not month:
+        month = (fname[4:8] + fname[2:4]) if len(fname) >= 8 else "000000"
+    try:
+        import storage_local
+        chk = storage_local.SITE_ID_NAME
+    except:
+        chk = "device"
+    return "%s/%s/%s" % (chk, month, fname)
+
+def _refill(now):
+    global _tokens, _tokens_ts
+    rate = _rate()
+    if _tokens_ts is None:
+        _tokens, _tokens_ts = float(rate), now
+        return
+    el = _ticks_diff(now, _tokens_ts)
+    if el > 0:
+        _tokens = min(float(rate), _tokens + el * rate / 60000.0)
+        _tokens_ts = now
+
+# ---------- API ----------
+
+def enqueue(img_path, casco):
+    """Añade una foto a la cola (casco=False -> prioridad alta); se persiste en tick()."""
+    if not img_path:
+        return
+    q = _load_queue()
+    q["lo" if casco else "hi"].append([img_path, 0, timesvc.yyyymm()])
+    # Tope: fuera las más antiguas, primero las de casco=1
+    while len(q["hi"]) + len(q["lo"]) > MAX_QUEUE:
+        (q["lo"] if q["lo"] else q["hi"]).pop(0)
+        stats["dropped"] += 1
+    _mark_dirty()
+
+def note_activity():
+    """Llamar en cada pasada de tarjeta: aplaza las subidas hasta el siguiente rato libre."""
+    global _last_activity_ms
+    _last_activity_ms = _ticks_ms()
+
+def pending():
+    q = _load_queue()
+    return len(q["hi"]) + len(q["lo"])
+
+def _upload(path, size, month=None):
+    url = config_service.get_str(CFG_PATH, "images_url")
+    key = config_service.get_str(CFG_PATH, "images_key")
+    if not url or not key or requests is None:
+        return False
+    headers = {
+        "Content-Type": "image/jpeg",
+        "Content-Length": str(size),
+        "Authorization": "Bearer " + key,
+        "apikey": key,
+        "x-upsert": "true",
+    }
+    r = requests.post(url.rstrip("/") + "/" + _object_name(path, month),
+                      data=_chunks(path), headers=headers)
+    try:
+        return 200 <= r.status_code < 300
+    finally:
+        r.close()
+
+def _chunks(path):
+    # Generador para urequests: un solo búfer de CHUNK bytes durante toda la subida
+    buf = bytearray(CHUNK)
+    mv = memoryview(buf)
+    with open(path, "rb") as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            yield mv[:n]
+
+def on_link(ev):
+    """Suscriptor de wifisup: al volver el enlace se anula el backoff de la caída."""
+    global _next_try_ms, _backoff_ms
+    if ev == "up":
+        _backoff_ms = BACKOFF_MIN_MS
+        _next_try_ms = _ticks_ms()
+
+def tick(online=True):
+    """
+    Sube como mucho UNA foto si: hay conexión, llevamos MIN_IDLE_MS sin pasadas,
+    no estamos en backoff y el cubo de tokens cubre su tamaño.
+    Devuelve True si ha subido algo.
+    """
+    global _tokens, _next_try_ms, _backoff_ms
+    now = _ticks_ms()
+    if _ticks_diff(now, _last_activity_ms) < MIN_IDLE_MS:
+        return False
+    _save_if_dirty(now)
+    if not online:
+        return False
+    if _ticks_diff(now, _next_try_ms) < 0:
+        return False
+    q = _load_queue()
+    lst = q["hi"] if q["hi"] else q["lo"]
+    if not lst:
+        return False
+    item = lst[0]
+    size = _file_size(item[0])
+    if size < 0:
+        # La foto ya no existe en SD: no hay nada que subir
+        lst.pop(0); stats["dropped"] += 1
+        _mark_dirty()
+        return False
+
+    _refill(now)
+    # Fotos mayores que el cubo: se permiten con el cubo lleno (queda en deuda)
+    if _tokens < min(size, _rate()):
+        return False
+
+    try:
+        ok = _upload(item[0], size, item[2] if len(item) > 2 else None)
+    except Exception as e:
+        print("[img] Error subiendo", item[0], e)
+        ok = False
+
+    if ok:
+        lst.pop(0)
+        _tokens -= size
+        stats["sent"] += 1; stats["bytes"] += size
+        _backoff_ms = BACKOFF_MIN_MS
+        _next_try_ms = now
+    else:
+        item[1] += 1
+        stats["failed"] += 1
+        if item[1] >= MAX_TRIES:
+            lst.pop(0); stats["dropped"] += 1
+        _next_try_ms = utime.ticks_add(now, _backoff_ms)
+        _backoff_ms = min(BACKOFF_MAX_MS, _backoff_ms * 2)
+    _mark_dirty()
+    return ok
@@ -1,5 +1,5 @@
 # main.py — Portenta H7 + Vision Shield
-# - Wiegand-26 (RFID)
+# - Wiegand 26/34/35/37 bits (RFID)
 # - FOMO (casco / nocasco)
 # - CSV + fotos en SD
 # - Subida a Supabase (upload-month)
@@ -9,20 +9,43 @@
 #   /config/server.json   -> { function_url, cards_url, edge_api_key }
 #   /config/cards.csv
 #   /data/, /media/, /model/
-#   storage_local.py, cloud_sync.py, cards_sync.py, wifi_setup.py (opcional)
-
-from machine import Pin
-import time, math, uos, gc
-import sensor, image
-import ml
+#   storage_local.py, cloud_sync.py, cards_sync.py, image_uploader.py, upload_sched.py,
+#   outbox.py, metrics.py, memprof.py, deteccion.py, cascada.py,
+#   model_runner.py, carriles.py, wiegand.py, dedup.py,
+#   desconocidas.py, timesvc.py, feedback.py, arranque.py,
+#   wifisup.py, wifi_setup.py (opcional)
+#   /config/lanes.json    -> varios lectores en un controlador (opcional)
+
+import arranque      # primero: mide las fases desde el reset
+import time
+import sensor
 import pyb
 
 # ===== Módulos propios =====
 import storage_local as db
 import cloud_sync as cloud
+import urequests
 import cards_sync
-
-# ===== Wi-Fi + NTP =====
+import image_uploader
+import upload_sched
+import outbox
+import metrics
+import memprof
+import deteccion
+import cascada
+import model_runner
+import carriles
+import wiegand
+import dedup
+import desconocidas
+import timesvc
+import feedback
+import wifisup
+import hashcache
+import config_service
+import reposo
+
+# ===== Wi-Fi + NTP (diferidos: ver "Red en segundo plano") =====
 _have_network = False
 try:
     import network
@@ -31,15 +54,18 @@ except:
     _have_network = False
 
 try:
-    from wifi_setup import wifi_connect_and_ntp_local
-    if _have_network:
-        wifi_connect_and_ntp_local()   # Ajusta RTC (CET/CEST)
-    else:
-        raise Exception("Módulo 'network' no disponible")
+    from wifi_setup import wifi_begin, ntp_sync
 except Exception as e:
-    pyb.RTC().datetime((2025, 8, 15, 5, 17, 30, 0, 0))
-    print("Wi-Fi/NTP no disponible:", e)
-    print("Fecha por defecto aplicada: 15/08/2025 17:30:00")
+    _have_network = False
+    print("wifi_setup no disponible:", e)
+
+# RTC sin fecha válida (primer arranque / sin batería): fecha por defecto hasta el NTP
+if time.localtime()[0] < 2024:
+    pyb.RTC().datetime((2025, 8, 15, 5, 15, 30, 0, 0))   # UTC
+    print("Fecha por defecto aplicada: 15/08/2025 17:30:00 (CEST)")
+
+# Transiciones CET/CEST precalculadas (años del RTC en adelante)
+timesvc.setup()
 
 # ===== Rutas de trabajo (SD como raíz) =====
 db.BASE_SD    = "/"
@@ -49,20 +75,11 @@ db.DATA_DIR   = "/data"
 db.CARDS_CSV  = "/config/cards.csv"
 
 # =========================
-# LEDs
+# LEDs (+ zumbador opcional)
 # =========================
-redLED   = pyb.LED(1)
-greenLED = pyb.LED(2)
-blueLED  = pyb.LED(3)
-
-def _led_all_off():
-    redLED.off(); greenLED.off(); blueLED.off()
-
-def led_show(color="blue", duration_ms=800):
-    _led_all_off()
-    (redLED if color=="red" else greenLED if color=="green" else blueLED).on()
-    pyb.delay(duration_ms)
-    _led_all_off()
+# Patrones no bloqueantes movidos por timer (feedback.py): el bucle sigue atendiendo
+# tarjetas y red mientras suena la señal
+feedback.init()
 
 # =========================
 # FOMO / inferencia
@@ -72,96 +89,57 @@ MAX_FRAMES_CHECK   = 8
 EARLY_STOP_ON_HIT  = True
 
 # =========================
-# Pines Wiegand
+# Lectores Wiegand (carriles)
 # =========================
-D0_PIN = "D14"
-D1_PIN = "D13"
-TIMEOUT_MS = 50
-ANTIREBOTE_MS = 800
-
-CARD_COOLDOWN_MS      = 6000
-EVENT_DEDUP_WINDOW_MS = 6000
+# Pines por carril en /config/lanes.json (por defecto un carril en D14/D13)
+TIMEOUT_MS = carriles.TIMEOUT_MS
 
-pin_d0 = Pin(D0_PIN, Pin.IN, Pin.PULL_UP)
-pin_d1 = Pin(D1_PIN, Pin.IN, Pin.PULL_UP)
-
-last_wiegand_ms = 0
-card_value = 0
-bit_count = 0
+CARD_COOLDOWN_MS = 6000
+# Ventanas de dedup de eventos por resultado (denegado / casco / nocasco): dedup.WINDOW_MS
 
 _ticks_ms   = time.ticks_ms
 _ticks_diff = time.ticks_diff
 
-recent_raw26      = {}  # raw26 -> ticks
-recent_card_logic = {}  # (site,user) -> ticks
-
-_last_event_key = None
-_last_event_ts  = 0
-
-def _count_ones(val: int) -> int:
-    c = 0
-    while val:
-        c += (val & 1)
-        val >>= 1
-    return c
-
-def _paridad_ok(raw26: int) -> bool:
-    parity_msb = bool((raw26 >> 25) & 1)
-    parity_lsb = bool(raw26 & 1)
-    hi12 = (raw26 >> 13) & 0xFFF
-    lo12 = (raw26 >> 1) & 0xFFF
-    p1_ok = ((_count_ones(hi12) % 2) == 0) == parity_msb
-    p2_ok = ((_count_ones(lo12) % 2) == 1) == parity_lsb
-    return p1_ok and p2_ok
-
-def _irq_d0(pin):
-    global card_value, bit_count, last_wiegand_ms
-    card_value = (card_value << 1)
-    bit_count += 1
-    last_wiegand_ms = _ticks_ms()
-
-def _irq_d1(pin):
-    global card_value, bit_count, last_wiegand_ms
-    card_value = (card_value << 1) | 1
-    bit_count += 1
-    last_wiegand_ms = _ticks_ms()
-
-pin_d0.irq(trigger=Pin.IRQ_FALLING, handler=_irq_d0)
-pin_d1.irq(trigger=Pin.IRQ_FALLING, handler=_irq_d1)
-
-def _reset_wiegand():
-    global card_value, bit_count
-    card_value = 0
-    bit_count = 0
-
-def _extract_fields(raw26: int):
-    # [P1][8b site][16b user][P2]
-    site_code = (raw26 >> 17) & 0xFF
-    user_code = (raw26 >> 1)  & 0xFFFF
-    return site_code, user_code
+# Formatos aceptados (wiegand.FORMATS): H10301 (26), H10306 (34), C1000 (35), H10304 (37)
+wiegand.enable(("H10301", "H10306", "C1000", "H10304"))
+
+LANES = carriles.setup()
+
+def _prune_cooldowns(now):
+    for c in LANES:
+        c.prune(now, CARD_COOLDOWN_MS)
 
 # =========================
 # Inicialización storage + ACL
 # =========================
+# Arranque: ACL de la SD, cámara y modelo primero; la red después, en segundo plano
 n_cards = db.init_storage()
 print("ACL cargada con", n_cards, "tarjetas")
+arranque.mark("acl")
 
 # =========================
 # Cámara
 # =========================
+CAMERA_SETTLE_MS     = 2000   # tiempo total para que converja la exposición automática
+CAMERA_MIN_SETTLE_MS = 300    # frames descartados como mínimo tras cargar el modelo
+
+_cam_t0 = _ticks_ms()
 sensor.reset()
 sensor.set_pixformat(sensor.GRAYSCALE)
 sensor.set_framesize(sensor.QVGA)      # 320x240
 sensor.set_windowing((240, 240))       # recorte cuadrado para FOMO
-sensor.skip_frames(time=2000)
+# Exposición/ganancia guardadas (reposo.py): el AEC/AGC parte de ellas y basta con
+# descartar CAMERA_MIN_SETTLE_MS en vez de esperar a que converja desde cero
+reposo.setup(sensor)
+_ae_cached = reposo.boot_ae()
+arranque.mark("camara")
 
 # =========================
 # Modelo TFLite + labels
 # =========================
 try:
-    load_to_fb = uos.stat("/model/trained.tflite")[6] > (gc.mem_free() - (64*1024))
-    net = ml.Model("/model/trained.tflite", load_to_fb=load_to_fb)
-    print("Modelo TFLite cargado.")
+    net = model_runner.load("/model/trained.tflite")
+    print("Modelo TFLite cargado:", model_runner.info)
 except Exception as e:
     raise Exception('No se pudo cargar "/model/trained.tflite": ' + str(e))
 
@@ -176,112 +154,166 @@ try:
     IDX_NOCASCO = labels.index('nocasco')
 except ValueError:
     raise RuntimeError("labels.txt debe contener 'casco' y 'nocasco' (además de 'background').")
-
-threshold_list = [(int(MIN_CONFIDENCE * 255 + 0.5), 255)]
+arranque.mark("modelo")
+
+# La cámara lleva configurada desde antes de cargar el modelo: solo se espera lo que
+# falte de CAMERA_SETTLE_MS
+if _ae_cached:
+    sensor.skip_frames(time=CAMERA_MIN_SETTLE_MS)
+else:
+    sensor.skip_frames(time=max(CAMERA_MIN_SETTLE_MS, CAMERA_SETTLE_MS - _ticks_diff(_ticks_ms(), _cam_t0)))
+arranque.mark("exposicion")
+
+# Cascada previa (estadísticas de imagen + clasificador opcional) antes de FOMO
+# (SHADOW: solo cuenta, para calibrar los umbrales; ver cascada.py)
+if cascada.ENABLED or cascada.SHADOW:
+    cascada.load_gate_model()
+    metrics.register_extra("cascada", cascada.report)
+metrics.register_extra("dedup", dedup.report)
+metrics.register_extra("unknown_cards", desconocidas.report)
+metrics.register_extra("boot", arranque.report)
+metrics.register_extra("acl", db.acl_stats)
+metrics.register_extra("img", db.image_stats)
+metrics.register_extra("hash", hashcache.report)
+metrics.register_extra("upload", cloud.report)
+metrics.register_extra("tls", urequests.tls_report)
+metrics.register_extra("config", config_service.report)
+metrics.register_extra("reposo", reposo.report)
+metrics.register_extra("mem", memprof.report)
+
+model_runner.set_threshold(MIN_CONFIDENCE)
+_post_us = 0  # duración del último post-proceso (para descontarla de predict)
 
 def fomo_post_process(model, inputs, outputs):
-    ob, oh, ow, oc = model.output_shape[0]
-    x_scale = inputs[0].roi[2] / ow
-    y_scale = inputs[0].roi[3] / oh
-    scale = min(x_scale, y_scale)
-    x_offset = ((inputs[0].roi[2] - (ow * scale)) / 2) + inputs[0].roi[0]
-    y_offset = ((inputs[0].roi[3] - (oh * scale)) / 2) + inputs[0].roi[1]
-    l = [[] for _ in range(oc)]
-    for i in range(oc):
-        img = image.Image(outputs[0][0, :, :, i] * 255)
-        blobs = img.find_blobs(threshold_list, x_stride=1, y_stride=1, area_threshold=1, pixels_threshold=1)
-        for b in blobs:
-            x,y,w,h = b.rect()
-            score = img.get_statistics(thresholds=threshold_list, roi=(x,y,w,h)).l_mean()/255.0
-            x = int((x * scale) + x_offset); y = int((y * scale) + y_offset)
-            w = int(w * scale); h = int(h * scale)
-            l[i].append((x,y,w,h,score))
+    # Buffers preasignados y geometría cacheada en model_runner
+    global _post_us
+    t0 = metrics.start(); memprof.begin(metrics.POSTPROC)
+    l = model_runner.post_process(model, inputs, outputs)
+    _post_us = metrics.stop(metrics.POSTPROC, t0); memprof.end(metrics.POSTPROC)
     return l
 
 def detect_once_counts():
-    img = sensor.snapshot()
-    results = net.predict([img], callback=fomo_post_process)
-    casco_count = nocasco_count = 0
-    casco_best = nocasco_best = 0.0
-    for i, det_list in enumerate(results):
-        if i == 0: continue
-        if i == IDX_CASCO:
-            for (_x,_y,_w,_h,score) in det_list:
-                if score < MIN_CONFIDENCE: continue
-                casco_count += 1; casco_best = max(casco_best, score)
-        elif i == IDX_NOCASCO:
-            for (_x,_y,_w,_h,score) in det_list:
-                if score < MIN_CONFIDENCE: continue
-                nocasco_count += 1; nocasco_best = max(nocasco_best, score)
-    return (casco_count, casco_best, nocasco_count, nocasco_best)
-
-def decide_helmet(MAX_FRAMES=8, EARLY_STOP=True):
-    tot_casco = tot_nocasco = 0
-    best_casco = best_nocasco = 0.0
-    for _ in range(MAX_FRAMES):
-        c_cnt, c_best, n_cnt, n_best = detect_once_counts()
-        tot_casco += c_cnt; tot_nocasco += n_cnt
-        best_casco = max(best_casco, c_best); best_nocasco = max(best_nocasco, n_best)
-        if EARLY_STOP and (tot_casco >= 2 and tot_casco > tot_nocasco) and best_casco >= MIN_CONFIDENCE: break
-        if EARLY_STOP and (tot_nocasco >= 2 and tot_nocasco > tot_casco) and best_nocasco >= MIN_CONFIDENCE: break
-    if (tot_casco == 0 and tot_nocasco == 0):
-        return (False, 0.0)  # fallback seguro: NO CASCO
-    if tot_casco != tot_nocasco:
-        return (tot_casco > tot_nocasco), (best_casco if tot_casco > tot_nocasco else best_nocasco)
-    return (best_casco > best_nocasco), max(best_casco, best_nocasco)  # empates -> NO CASCO
+    t0 = metrics.start(); memprof.begin(metrics.SNAPSHOT)
+    img = reposo.snapshot()
+    metrics.stop(metrics.SNAPSHOT, t0); memprof.end(metrics.SNAPSHOT)
+    ok = True
+    if cascada.ENABLED or cascada.SHADOW:
+        t0 = metrics.start()
+        ok, why = cascada.check(img)
+        metrics.stop(metrics.GATE, t0)
+        if not ok and cascada.ENABLED:
+            return None  # frame descartado: sin inferencia
+    t0 = metrics.start(); memprof.begin(metrics.PREDICT)
+    results = model_runner.predict(img, callback=fomo_post_process)
+    metrics.record(metrics.PREDICT, _ticks_diff(metrics.start(), t0) - _post_us)
+    memprof.end(metrics.PREDICT)
+    counts = deteccion.count_frame(results, IDX_CASCO, IDX_NOCASCO, MIN_CONFIDENCE)
+    if not ok and (counts[0] or counts[2]):
+        cascada.note_miss(why)  # SHADOW: se habría perdido una detección
+    return counts
+
+def start_detection(lane, ctx):
+    # Abre una pasada en el carril; los frames se reparten por turnos entre carriles
+    lane.pasada = deteccion.Pasada(MAX_FRAMES_CHECK, EARLY_STOP_ON_HIT, MIN_CONFIDENCE,
+                                   max_rejects=(cascada.MAX_REJECTS if cascada.ENABLED else 0))
+    lane.ctx = ctx
+
+def detection_step(lane):
+    # Un frame para este carril. Devuelve None mientras la pasada sigue; al terminar,
+    # (casco?, score, rect) o "retry" si la cascada descartó los primeros frames.
+    if not lane.pasada.step(detect_once_counts()):
+        return None
+    res = lane.pasada.result()
+    lane.pasada = None
+    cascada.note_swipe(res is None)
+    if res is None:
+        return "retry"
+    return res[:3]
 
 
 # =========================
 # Sync a la nube (CSV mensual)
 # =========================
-SYNC_COOLDOWN_MS = 8000
-_last_sync_ms    = -600000
+# Qué subir lo guarda outbox (persistente, meses anteriores incluidos) y cuándo
+# lo decide upload_sched (lotes, ráfagas, backoff); aquí solo se registran los
+# eventos y se vacía la cola en los ratos libres del bucle.
+upload_sched.load(backlog=outbox.pending())
 
 def _yyyymm_now():
-    y, m = time.localtime()[0], time.localtime()[1]
-    return "%04d%02d" % (y, m)
+    return timesvc.yyyymm()
 
 def _sync_current_month(tag=""):
-    global _last_sync_ms
-    now = _ticks_ms()
-    if _ticks_diff(now, _last_sync_ms) < SYNC_COOLDOWN_MS:
-        return
-    yyyymm = _yyyymm_now()
+    outbox.add_month(_yyyymm_now())
+    upload_sched.note_event()
+
+def _upload_month_timed(yyyymm):
+    t0 = metrics.start(); memprof.begin(metrics.UPLOAD)
     try:
-        db.update_manifest()
-    except Exception as e:
-        print("update_manifest error:", e)
-    print("[cloud] Subiendo", yyyymm, ("(%s)" % tag) if tag else "")
-    resp = cloud.upload_month(yyyymm)
-    print("[cloud] Respuesta:", resp)
-    if resp and resp.get("ok") and resp.get("verified", False):
-        led_show("blue", 200)
-    _last_sync_ms = now
+        return cloud.upload_month(yyyymm)
+    finally:
+        metrics.stop(metrics.UPLOAD, t0); memprof.end(metrics.UPLOAD)
+
+def _update_manifest_timed(yyyymm=None):
+    t0 = metrics.start(); memprof.begin(metrics.MANIFEST)
+    try:
+        return db.update_manifest(yyyymm)
+    finally:
+        metrics.stop(metrics.MANIFEST, t0); memprof.end(metrics.MANIFEST)
+
+def _append_event_timed(*args):
+    t0 = metrics.start(); memprof.begin(metrics.APPEND)
+    try:
+        db.append_event(*args)
+    finally:
+        metrics.stop(metrics.APPEND, t0); memprof.end(metrics.APPEND)
+
+def _sync_if_due():
+    if not upload_sched.due(online=wifisup.is_up()):
+        return False
+    print("[cloud] Vaciando cola:", outbox.pending(), "unidades")
+    ok, sent = outbox.drain(_upload_month_timed, _update_manifest_timed,
+                            budget=outbox.budget_ms(busy=upload_sched.in_burst()),
+                            images_fn=lambda: image_uploader.tick(online=True))
+    upload_sched.on_result(ok, remaining=outbox.pending())
+    if not ok:
+        feedback.play(feedback.ERROR)      # queda pendiente: se reintenta con espera
+    elif sent:
+        feedback.play(feedback.SYNC_OK)
+    return True
 
 # =========================
 # Auto-update de ACL (cards.csv) desde Supabase
 # =========================
+# La ACL nueva se construye por trozos en ratos libres (índice en sombra) mientras se
+# siguen atendiendo tarjetas con la anterior; solo se cambia si el sha del fichero
+# coincide con el del manifest.
 def _reload_acl():
     try:
-        db.init_storage()
-        print("ACL recargada desde cards.csv")
+        db.acl_rebuild_start(expected_sha=cards_sync.current_sha())
     except Exception as e:
         print("Error recargando ACL:", e)
 
-# Chequeo inicial (si hay Wi-Fi)
-try:
-    cards_sync.ensure_cards_updated(db_reload_fn=_reload_acl)
-except Exception as e:
-    print("[ACL] Chequeo inicial fallido:", e)
+def _acl_rebuild_step():
+    r = db.acl_rebuild_step()
+    if r is True:
+        st = db.acl_stats()
+        print("[ACL] Recargada: %d tarjetas en %d trozos / %d ms, cambio en %d us (bloom: %s)" % (
+            st["cards"], st["chunks"], st["build_ms"], st["swap_us"], db.bloom_info()))
+    return True
 
-_POLL_ACL_MS  = 10 * 60 * 1000  # 10 min
-_last_poll_ms = -600000
+_POLL_ACL_MS   = 10 * 60 * 1000  # 10 min
+_last_poll_ms  = _ticks_ms()
+_acl_check_now = False          # lo marca el aviso "up" de wifisup (arranque / reconexión)
 
 def _poll_cards_if_due():
-    global _last_poll_ms
+    # En ratos libres y con enlace: cada _POLL_ACL_MS o nada más recuperar la conexión
+    global _last_poll_ms, _acl_check_now
+    if not wifisup.is_up() or db.acl_rebuild_active():
+        return False
     now = _ticks_ms()
-    if _ticks_diff(now, _last_poll_ms) < _POLL_ACL_MS:
-        return
+    if not _acl_check_now and _ticks_diff(now, _last_poll_ms) < _POLL_ACL_MS:
+        return False
+    _acl_check_now = False
     _last_poll_ms = now
     try:
         res = cards_sync.ensure_cards_updated(db_reload_fn=_reload_acl)
@@ -289,133 +321,173 @@ def _poll_cards_if_due():
             print("[ACL] Actualizada a versión", res.get("version"))
     except Exception as e:
         print("[ACL] Poll error:", e)
+    return True
 
 # =========================
-# Reintentos Wi-Fi/NTP (background)
+# Conectividad (wifisup)
+# =========================
+# Conexión sin bloquear con backoff + jitter. Al subir el enlace solo se marca el
+# trabajo (NTP, chequeo de ACL, fin de backoffs de subida); se hace en ratos libres.
+# Mientras tanto se aceptan tarjetas con la ACL de la SD.
+def _ntp_step():
+    try:
+        ntp_sync()
+    except Exception as e:
+        print("NTP fallido:", e)
+    return True
+
+def _on_link(ev):
+    global _acl_check_now
+    if ev == "up":
+        _acl_check_now = True
+        if not arranque.pending("ntp"):
+            arranque.defer("ntp", _ntp_step)
+
+wifisup.subscribe(_on_link)
+wifisup.subscribe(upload_sched.on_link)
+wifisup.subscribe(image_uploader.on_link)
+if _have_network:
+    wifisup.start(wifi_begin)
+else:
+    print("Wi-Fi/NTP no disponible: funcionamiento local")
+metrics.register_extra("wifi", wifisup.report)
+
+# =========================
+# Arranque visual
 # =========================
-_WIFI_RETRY_COOLDOWN_MS = 60000
-_last_wifi_try_ms       = -60000
-_wifi_was_connected     = False
+print("Wiegand listo ({} carril/es). Esperando tarjetas...".format(len(LANES)))
+feedback.play(feedback.ARRANQUE)
 
-def _wifi_retry_tick():
-    global _last_wifi_try_ms, _wifi_was_connected
-    if not _have_network:
+# GC: umbral automático alto y recolección explícita en ratos libres (memprof)
+memprof.setup()
+arranque.mark("resto")
+arranque.ready(timesvc.now_iso())
+
+# =========================
+# Pasadas por carril
+# =========================
+def _on_frame(lane, bc, raw26, t_swipe):
+    # Trama completa de un carril: paridad, cooldown, ACL. Las autorizadas abren una
+    # pasada de detección (detection_step la avanza frame a frame desde el bucle).
+    card = wiegand.decode(bc, raw26)
+    if card is None:
+        print("[{}] Trama Wiegand inválida: bits={} raw={:b}".format(lane.id, bc, raw26))
         return
-    try:
-        sta = network.WLAN(network.STA_IF)
-        sta.active(True)
-    except:
+    fmt, site_code, user_code, key = card
+    now = _ticks_ms()
+    if lane.in_cooldown(raw26, key, now, CARD_COOLDOWN_MS):
         return
+    metrics.stop(metrics.WIEGAND, t_swipe)
+
+    print("[{}] Tarjeta -> {} ({} bits), RAW={}, Site={}, User={}".format(lane.id, fmt, bc, raw26, site_code, user_code))
 
-    if sta.isconnected():
-        if not _wifi_was_connected:
-            print("Wi-Fi conectado:", sta.ifconfig())
-            _wifi_was_connected = True
-            # Tras reconectar: ajustar NTP y chequear ACL
-            try:
-                wifi_connect_and_ntp_local()
-            except Exception as e:
-                print("NTP tras reconexión fallido:", e)
-            try:
-                cards_sync.ensure_cards_updated(db_reload_fn=_reload_acl)
-            except Exception as e:
-                print("[ACL] Chequeo tras reconexión fallido:", e)
+    t0 = metrics.start()
+    if not db.maybe_known_key(key):
+        # Tarjeta ajena (filtro bloom de la ACL): solo contador agregado, sin evento ni subida
+        metrics.stop(metrics.ACL, t0)
+        print("[{}] Tarjeta desconocida: rechazada.\n".format(lane.id))
+        desconocidas.note(site_code, user_code)
+        feedback.play(feedback.DESCONOCIDA, preempt=True)
+        return
+    autorizado, nombre = db.is_key_authorized(key)
+    metrics.stop(metrics.ACL, t0)
+    if not autorizado:
+        print("ACCESO DENEGADO: tarjeta no autorizada.\n")
+        ev_key = (site_code, user_code, False, False)
+        feedback.play(feedback.NO_AUTH, preempt=True)
+        if dedup.is_dup(ev_key, now):
+            return
+        _append_event_timed(raw26, site_code, user_code, "", False, False, 0.0, "", lane.tag)
+        _update_manifest_timed()
+        dedup.add(ev_key, now)
+        _sync_current_month(tag="no_autorizado")
+        metrics.stop(metrics.SWIPE, t_swipe)
         return
 
-    _wifi_was_connected = False
-    now = _ticks_ms()
-    if _ticks_diff(now, _last_wifi_try_ms) < _WIFI_RETRY_COOLDOWN_MS:
+    print("[{}] Tarjeta autorizada ({}). Detección...".format(lane.id, nombre))
+    start_detection(lane, (raw26, site_code, user_code, key, nombre, now, t_swipe))
+
+def _on_decision(lane, res):
+    raw26, site_code, user_code, key, nombre, now, t_swipe = lane.ctx
+    lane.ctx = None
+    if res == "retry":
+        # Nadie delante de la cámara: sin evento, se puede volver a pasar la tarjeta
+        print("[{}] Sin persona delante de la cámara: vuelva a pasar la tarjeta.\n".format(lane.id))
+        lane.clear_cooldown(raw26, key)
+        feedback.play(feedback.REINTENTAR, preempt=True)
         return
-    try:
-        wifi_connect_and_ntp_local()
-        print("Reconexión OK + NTP ajustado.")
-        _wifi_was_connected = True
-        try:
-            cards_sync.ensure_cards_updated(db_reload_fn=_reload_acl)
-        except Exception as e:
-            print("[ACL] Chequeo tras reconexión fallido:", e)
-    except Exception as e:
-        print("Reintento Wi-Fi fallido:", e)
-    finally:
-        _last_wifi_try_ms = now
+    is_helmet, score, det_rect = res
 
-# =========================
-# Arranque visual
-# =========================
-print("Wiegand-26 listo. Esperando tarjetas...")
-_led_all_off()
-for _ in range(2):
-    greenLED.on(); pyb.delay(200); greenLED.off(); pyb.delay(200)
+    ev_key = (site_code, user_code, True, bool(is_helmet))
+    if dedup.is_dup(ev_key, now):
+        # Repetido dentro de su ventana: sin foto, sin línea CSV y sin subida
+        feedback.play(feedback.REPETIDO_OK if is_helmet else feedback.REPETIDO_KO, preempt=True)
+        return
+    # La señal sale ya (no bloquea): foto, CSV y manifest siguen mientras suena
+    feedback.play(feedback.CASCO if is_helmet else feedback.NOCASCO, preempt=True)
+
+    proof_img = reposo.snapshot()
+    t0 = metrics.start(); memprof.begin(metrics.IMG_SAVE)
+    img_path = db.save_proof_image_if_needed(proof_img, raw26, is_helmet, det_rect=det_rect)
+    metrics.stop(metrics.IMG_SAVE, t0); memprof.end(metrics.IMG_SAVE)
+    image_uploader.enqueue(img_path, is_helmet)
+    _append_event_timed(raw26, site_code, user_code, nombre, True, is_helmet, score, img_path, lane.tag)
+
+    if is_helmet:
+        print("[{}] ACCESO PERMITIDO (casco). Score: {:.2f}\n".format(lane.id, score))
+        arranque.first_accept()
+    else:
+        print("[{}] ACCESO DENEGADO (nocasco). Score: {:.2f}\n".format(lane.id, score))
+
+    _update_manifest_timed()
+    dedup.add(ev_key, now)
+    _sync_current_month(tag="autorizado")
+    metrics.stop(metrics.SWIPE, t_swipe)
 
 # =========================
 # Bucle principal
 # =========================
 while True:
-    _wifi_retry_tick()
-    _poll_cards_if_due()
-
-    if bit_count > 0:
-        if _ticks_diff(_ticks_ms(), last_wiegand_ms) > TIMEOUT_MS:
-            bc = bit_count; raw26 = card_value; _reset_wiegand()
-
-            if bc == 26 and _paridad_ok(raw26):
-                now = _ticks_ms()
-
-                last_raw = recent_raw26.get(raw26)
-                if (last_raw is not None) and (_ticks_diff(now, last_raw) < CARD_COOLDOWN_MS):
-                    continue
-                recent_raw26[raw26] = now
-
-                site_code, user_code = _extract_fields(raw26)
-
-                last_logic = recent_card_logic.get((site_code, user_code))
-                if (last_logic is not None) and (_ticks_diff(now, last_logic) < CARD_COOLDOWN_MS):
-                    continue
-                recent_card_logic[(site_code, user_code)] = now
-
-                print("Tarjeta -> Bits=26, RAW26={}, Site={}, User={}".format(raw26, site_code, user_code))
-
-                autorizado, nombre = db.is_card_authorized(site_code, user_code)
-                if not autorizado:
-                    print("ACCESO DENEGADO: tarjeta no autorizada.\n")
-                    ev_key = (site_code, user_code, False, False)
-                    if (_last_event_key == ev_key) and (_ticks_diff(now, _last_event_ts) < EVENT_DEDUP_WINDOW_MS):
-                        led_show("blue", 600)
-                        continue
-                    led_show("blue", 600)
-                    db.append_event(raw26, site_code, user_code, "", False, False, 0.0, "")
-                    db.update_manifest()
-                    _last_event_key, _last_event_ts = ev_key, now
-                    _sync_current_month(tag="no_autorizado")
-                    time.sleep_ms(250)
-                    continue
-
-                print("Tarjeta autorizada ({}). Detección...".format(nombre))
-
-                is_helmet, score = decide_helmet(MAX_FRAMES=MAX_FRAMES_CHECK, EARLY_STOP=EARLY_STOP_ON_HIT)
-
-                ev_key = (site_code, user_code, True, bool(is_helmet))
-                if (_last_event_key == ev_key) and (_ticks_diff(now, _last_event_ts) < EVENT_DEDUP_WINDOW_MS):
-                    led_show("green" if is_helmet else "red", 500)
-                    _sync_current_month(tag="dedup")
-                    continue
-
-                proof_img = sensor.snapshot()
-                img_path = db.save_proof_image_if_needed(proof_img, raw26, is_helmet)
-                db.append_event(raw26, site_code, user_code, nombre, True, is_helmet, score, img_path)
-
-                if is_helmet:
-                    led_show("green", 800)
-                    print("ACCESO PERMITIDO (casco). Score: {:.2f}\n".format(score))
-                else:
-                    led_show("red", 800)
-                    print("ACCESO DENEGADO (nocasco). Score: {:.2f}\n".format(score))
+    wifisup.tick()      # una resta de ticks salvo cuando toca comprobar el enlace
+    feedback.poll()     # solo hace algo si no hay timer hardware
 
-                db.update_manifest()
-                _last_event_key, _last_event_ts = ev_key, now
-                _sync_current_month(tag="autorizado")
-                time.sleep_ms(250)
-            else:
-                print("Trama W26 inválida: bits={} raw={:b}".format(bc, raw26))
+    now = _ticks_ms()
+    for lane in LANES:
+        lane.poll(now)
+        # Una trama por carril y vuelta; si el carril está detectando, espera en su cola
+        if lane.pasada is None:
+            fr = lane.pop()
+            if fr is not None:
+                image_uploader.note_activity()
+                upload_sched.note_swipe()
+                _on_frame(lane, fr[0], fr[1], metrics.start())
+
+    # Un frame de inferencia por vuelta, por turnos entre los carriles con pasada
+    lane = carriles.next_busy()
+    quiet = False
+    if lane is not None:
+        res = detection_step(lane)
+        if res is not None:
+            _on_decision(lane, res)
+    elif not carriles.busy():
+        # Rato libre entre pasadas: recarga de ACL en curso, tareas diferidas (NTP),
+        # ACL, eventos, luego fotos
+        if (db.acl_rebuild_active() and _acl_rebuild_step()) or arranque.tick() or \
+                _poll_cards_if_due():
+            pass
+        elif not _sync_if_due():
+            if not image_uploader.tick(online=wifisup.is_up()):
+                desconocidas.flush_if_due()
+                metrics.flush_if_due(_yyyymm_now())
+                if memprof.idle_collect():
+                    _prune_cooldowns(_ticks_ms())
+                # Fondo vacío para la cascada: solo tras un rato largo sin tarjetas
+                if (cascada.ENABLED or cascada.SHADOW) and cascada.background_due() and \
+                        _ticks_diff(_ticks_ms(), carriles.last_activity_ms()) > 30000:
+                    cascada.learn_background(reposo.snapshot())
+                else:
+                    quiet = True
 
-    time.sleep_ms(2)
+    # Espera de la vuelta; sin tarjetas un buen rato, sensor en standby y siestas en
+    # WFI hasta el primer flanco Wiegand (reposo.py)
+    reposo.tick(lane is None and not carriles.busy(), quiet)
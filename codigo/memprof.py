@@ -0,0 +1,118 @@
+# memprof.py — perfil de heap/GC del bucle y recolección en ratos libres
+# - PROFILE_MEM=True: registra gc.mem_free()/mem_alloc() antes/después de cada etapa
+#   (mismos índices que metrics.STAGES) y el bloque libre más grande (fragmentación)
+# - Siempre: sube el umbral de GC automático y llama a gc.collect() en ratos libres,
+#   para que la recolección no caiga en mitad de una inferencia.
+#
+# Uso:
+#   memprof.begin(metrics.PREDICT); ...; memprof.end(metrics.PREDICT)
+#   memprof.idle_collect()            # en el bucle, sin pasadas pendientes
+#   metrics.register_extra("mem", memprof.report)   # perfil en las métricas mensuales
+
+import gc, utime
+from array import array
+import metrics
+
+PROFILE_MEM = False
+
+IDLE_GC_ALLOC_BYTES = 16 * 1024      # recolectar si se ha asignado esto desde la última vez
+IDLE_GC_MAX_MS      = 30000          # o si hace más de esto
+AUTO_GC_FRACTION    = 4              # umbral automático = heap libre / AUTO_GC_FRACTION
+FRAG_PROBE_MS       = 60000          # sondeo del bloque libre máximo (solo en perfil)
+
+_ticks_ms   = utime.ticks_ms
+_ticks_us   = utime.ticks_us
+_ticks_diff = utime.ticks_diff
+
+_NS = len(metrics.STAGES)
+_before = array("i", [0] * _NS)       # mem_alloc al empezar cada etapa
+_n      = array("I", [0] * _NS)
+_grow   = array("i", [0] * _NS)       # suma de bytes asignados netos
+_grow_max = array("i", [0] * _NS)
+_free_min = array("i", [0x7FFFFFFF] * _NS)
+
+_alloc_at_gc = 0
+_last_gc_ms = None
+_last_probe_ms = None
+
+stats = {"gc_idle": 0, "gc_us_max": 0, "gc_us_sum": 0, "largest_free": 0, "frag": 0.0,
+         "free_min": 0x7FFFFFFF}
+
+def setup():
+    """Ajusta el GC automático: solo como red de seguridad (umbral alto)."""
+    global _alloc_at_gc, _last_gc_ms
+    gc.collect()
+    try:
+        gc.threshold(max(8192, gc.mem_free() // AUTO_GC_FRACTION))
+    except:
+        pass
+    _alloc_at_gc = gc.mem_alloc()
+    _last_gc_ms = _ticks_ms()
+
+def begin(stage):
+    if PROFILE_MEM:
+        _before[stage] = gc.mem_alloc()
+
+def end(stage):
+    if not PROFILE_MEM:
+        return
+    d = gc.mem_alloc() - _before[stage]    # < 0 si hubo un GC automático en medio
+    free = gc.mem_free()
+    _n[stage] += 1
+    _grow[stage] += d
+    if d > _grow_max[stage]: _grow_max[stage] = d
+    if free < _free_min[stage]: _free_min[stage] = free
+    if free < stats["free_min"]: stats["free_min"] = free
+
+def largest_free_block(limit=None):
+    """Búsqueda binaria del mayor bytearray asignable (caro: solo en ratos libres)."""
+    lo, hi = 0, limit or gc.mem_free()
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        try:
+            b = bytearray(mid)
+            del b
+            lo = mid
+        except MemoryError:
+            hi = mid - 1
+    return lo
+
+def idle_collect(force=False):
+    """
+    Recolecta en un rato libre si toca (bytes asignados o tiempo). Devuelve True si recolectó.
+    En modo perfil, sondea además la fragmentación después de recolectar.
+    """
+    global _alloc_at_gc, _last_gc_ms, _last_probe_ms
+    now = _ticks_ms()
+    grown = gc.mem_alloc() - _alloc_at_gc
+    if not force and grown < IDLE_GC_ALLOC_BYTES and _ticks_diff(now, _last_gc_ms or now) < IDLE_GC_MAX_MS:
+        return False
+    t0 = _ticks_us()
+    gc.collect()
+    us = _ticks_diff(_ticks_us(), t0)
+    stats["gc_idle"] += 1; stats["gc_us_sum"] += us
+    if us > stats["gc_us_max"]: stats["gc_us_max"] = us
+    _alloc_at_gc = gc.mem_alloc()
+    _last_gc_ms = now
+    if PROFILE_MEM and (_last_probe_ms is None or _ticks_diff(now, _last_probe_ms) >= FRAG_PROBE_MS):
+        _last_probe_ms = now
+        free = gc.mem_free()
+        big = largest_free_block(free)
+        stats["largest_free"] = big
+        stats["frag"] = (1.0 - big / free) if free else 0.0
+        gc.collect()
+    return True
+
+def report():
+    """{etapa: {n, alloc_avg, alloc_max, free_min}} + stats globales."""
+    out = {}
+    for s in range(_NS):
+        if _n[s]:
+            out[metrics.STAGES[s]] = {"n": _n[s], "alloc_avg": _grow[s] // _n[s],
+                                      "alloc_max": _grow_max[s], "free_min": _free_min[s]}
+    out["_gc"] = dict(stats)
+    try:
+        out["_gc"]["mem_free"] = gc.mem_free(); out["_gc"]["mem_alloc"] = gc.mem_alloc()
+    except:
+        pass
+    return out
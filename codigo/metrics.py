@@ -0,0 +1,138 @@
+# metrics.py — instrumentación ligera por etapas (ticks_us) con memoria preasignada
+# - Histogramas log2 fijos por etapa (N_BINS cubos: <128us, <256us, ... >=~33s)
+# - Anillo con las últimas RING_N muestras (etapa, us) para depurar picos
+# - Volcado periódico acumulado a /data/metrics_YYYYMM.json (se suma a lo ya guardado)
+#
+# Uso:
+#   t0 = metrics.start()
+#   ...trabajo...
+#   metrics.stop(metrics.ACL, t0)
+
+import ujson, utime
+from array import array
+from storage_local import _atomic_write_json
+
+DATA_DIR = "/data"
+
+# Etapas (índices fijos: no reordenar, el JSON usa los nombres)
+STAGES = ("wiegand", "acl", "snapshot", "predict", "postproc", "img_save",
+          "append_event", "update_manifest", "upload_month", "swipe", "gate", "wake")
+WIEGAND, ACL, SNAPSHOT, PREDICT, POSTPROC, IMG_SAVE, APPEND, MANIFEST, UPLOAD, SWIPE, GATE, WAKE = range(12)
+
+N_BINS   = 20          # cubo i: us < 2^(i+7) (el último recoge el resto)
+RING_N   = 64
+FLUSH_MS = 5 * 60 * 1000
+
+ENABLED = True
+
+_ticks_us   = utime.ticks_us
+_ticks_ms   = utime.ticks_ms
+_ticks_diff = utime.ticks_diff
+
+_NS = len(STAGES)
+_hist = array("I", [0] * (_NS * N_BINS))
+_cnt  = array("I", [0] * _NS)
+_sum  = array("I", [0] * _NS)      # en ms para no desbordar (32 bits)
+_max  = array("I", [0] * _NS)      # en us
+_ring_st = bytearray(RING_N)
+_ring_us = array("I", [0] * RING_N)
+_ring_i = 0
+_last_flush_ms = None
+_extras = {}      # nombre -> fn() con contadores propios (se guardan tal cual al volcar)
+
+def register_extra(name, fn):
+    """Otros módulos añaden sus contadores (desde el arranque) al volcado mensual."""
+    _extras[name] = fn
+
+def start():
+    return _ticks_us()
+
+def stop(stage, t0):
+    """Cierra el span iniciado en t0 y lo acumula. Devuelve la duración en us."""
+    return record(stage, _ticks_diff(_ticks_us(), t0))
+
+def record(stage, us):
+    """Acumula una duración ya medida (us) en la etapa indicada."""
+    global _ring_i
+    if not ENABLED or us < 0:
+        return us
+    b = 0; v = us >> 7
+    while v and b < N_BINS - 1:
+        v >>= 1; b += 1
+    _hist[stage * N_BINS + b] += 1
+    _cnt[stage] += 1
+    _sum[stage] += (us + 500) // 1000
+    if us > _max[stage]:
+        _max[stage] = us
+    _ring_st[_ring_i] = stage
+    _ring_us[_ring_i] = us
+    _ring_i = (_ring_i + 1) % RING_N
+    return us
+
+def recent():
+    """Últimas muestras [(etapa, us)] de la más antigua a la más reciente."""
+    out = []
+    for k in range(RING_N):
+        i = (_ring_i + k) % RING_N
+        if _ring_us[i]:
+            out.append((STAGES[_ring_st[i]], _ring_us[i]))
+    return out
+
+def snapshot():
+    """Acumulado en RAM desde el último volcado: {etapa: {n, sum_ms, max_us, hist}}."""
+    out = {}
+    for s in range(_NS):
+        if _cnt[s]:
+            out[STAGES[s]] = {
+                "n": _cnt[s], "sum_ms": _sum[s], "max_us": _max[s],
+                "hist": list(_hist[s * N_BINS:(s + 1) * N_BINS]),
+            }
+    return out
+
+def _reset():
+    for i in range(len(_hist)): _hist[i] = 0
+    for i in range(_NS):
+        _cnt[i] = 0; _sum[i] = 0; _max[i] = 0
+
+def metrics_path(yyyymm):
+    return "%s/metrics_%s.json" % (DATA_DIR, yyyymm)
+
+def flush(yyyymm):
+    """Suma lo acumulado en RAM al fichero del mes (escritura atómica) y reinicia."""
+    global _last_flush_ms
+    _last_flush_ms = _ticks_ms()
+    snap = snapshot()
+    if not snap and not _extras:
+        return False
+    path = metrics_path(yyyymm)
+    try:
+        with open(path) as f:
+            doc = ujson.loads(f.read())
+    except:
+        doc = {"month": yyyymm, "bins_us": [1 << (i + 7) for i in range(N_BINS - 1)], "stages": {}}
+    st = doc.setdefault("stages", {})
+    for name, v in snap.items():
+        cur = st.get(name)
+        if cur is None or len(cur.get("hist", ())) != N_BINS:
+            st[name] = v
+            continue
+        cur["n"] += v["n"]; cur["sum_ms"] += v["sum_ms"]
+        cur["max_us"] = max(cur["max_us"], v["max_us"])
+        cur["hist"] = [a + b for a, b in zip(cur["hist"], v["hist"])]
+    for name, fn in _extras.items():
+        try:
+            doc.setdefault("extra", {})[name] = fn()
+        except Exception as e:
+            print("[metrics] extra", name, "error:", e)
+    try:
+        _atomic_write_json(path, doc)
+    except Exception as e:
+        print("[metrics] No se pudo volcar:", e)
+        return False
+    _reset()
+    return True
+
+def flush_if_due(yyyymm):
+    if _last_flush_ms is not None and _ticks_diff(_ticks_ms(), _last_flush_ms) < FLUSH_MS:
+        return False
+    return flush(yyyymm)
@@ -0,0 +1,88 @@
+# model_runner.py — carga única del modelo FOMO y post-proceso sin reasignaciones
+# - Decide load_to_fb una vez y mide la memoria que ocupa el modelo (arena incluida)
+# - Geometría de salida (escala/offset) calculada una sola vez por ROI
+# - Listas de detecciones por clase reutilizadas entre frames
+# El mapa de cada canal se sigue construyendo con image.Image(out*255): el producto lo
+# hace ulab en C. Un bucle Python por píxel (con tabla int8) no se usa: no hay medida
+# en placa que muestre que gane al producto nativo.
+
+import gc, uos
+import image
+import ml
+
+net = None
+info = {}
+
+_geom_key = None
+_geom = None           # (scale, x_offset, y_offset)
+_res = None            # listas de detecciones reutilizadas
+_threshold = [(102, 255)]
+
+def load(path="/model/trained.tflite", reserve=64 * 1024):
+    """Carga el modelo una vez (en framebuffer si no cabe en heap) y rellena info."""
+    global net
+    gc.collect()
+    free0 = gc.mem_free()
+    size = uos.stat(path)[6]
+    load_to_fb = size > (free0 - reserve)
+    net = ml.Model(path, load_to_fb=load_to_fb)
+    gc.collect()
+    info.clear()
+    info.update({
+        "model_bytes": size,
+        "load_to_fb": load_to_fb,
+        "heap_used": free0 - gc.mem_free(),          # modelo + arena si están en heap
+        "arena_bytes": getattr(net, "ram", None),     # tensor arena de TFLM (si el port lo expone)
+        "input_shape": getattr(net, "input_shape", None),
+        "output_shape": getattr(net, "output_shape", None),
+        "output_dtype": _first(getattr(net, "output_dtype", None)),
+        "output_scale": _first(getattr(net, "output_scale", None)),
+        "output_zero_point": _first(getattr(net, "output_zero_point", None)),
+    })
+    _prepare()
+    return net
+
+def set_threshold(min_conf):
+    global _threshold
+    _threshold = [(int(min_conf * 255 + 0.5), 255)]
+
+def _first(v):
+    # dtype/scale/zero_point son listas por tensor de salida (como output_shape)
+    if isinstance(v, (list, tuple)):
+        return v[0] if v else None
+    return v
+
+def _prepare():
+    """Preasigna las listas de detecciones por clase."""
+    global _res
+    _ob, oh, ow, oc = net.output_shape[0]
+    _res = [[] for _ in range(oc)]
+
+def _geometry(roi, ow, oh):
+    global _geom_key, _geom
+    if _geom_key != roi:
+        scale = min(roi[2] / ow, roi[3] / oh)
+        _geom = (scale, ((roi[2] - (ow * scale)) / 2) + roi[0], ((roi[3] - (oh * scale)) / 2) + roi[1])
+        _geom_key = roi
+    return _geom
+
+def post_process(model, inputs, outputs):
+    """Equivalente a la antigua fomo_post_process: [[(x,y,w,h,score)] por clase]."""
+    _ob, oh, ow, oc = model.output_shape[0]
+    scale, x_offset, y_offset = _geometry(tuple(inputs[0].roi), ow, oh)
+    thr = _threshold
+    l = _res
+    for i in range(oc):
+        l[i].clear()
+        img = image.Image(outputs[0][0, :, :, i] * 255)
+        blobs = img.find_blobs(thr, x_stride=1, y_stride=1, area_threshold=1, pixels_threshold=1)
+        for b in blobs:
+            x,y,w,h = b.rect()
+            score = img.get_statistics(thresholds=thr, roi=(x,y,w,h)).l_mean()/255.0
+            x = int((x * scale) + x_offset); y = int((y * scale) + y_offset)
+            w = int(w * scale); h = int(h * scale)
+            l[i].append((x,y,w,h,score))
+    return l
+
+def predict(img, callback=post_process):
+    return net.predict([img], callback=callback)
@@ -0,0 +1,191 @@
+# outbox.py — cola de salida persistente para funcionar sin conexión
+# Unidades pendientes, en orden de llegada:
+#   {"k": "month", "m": "YYYYMM"}  -> manifest + CSV del mes (upload-month)
+# Las fotos tienen su propia cola (image_uploader) y van al final del vaciado.
+#
+# - Se guarda en SD (/data/outbox.json): un corte de luz o un cambio de mes sin
+#   Wi-Fi no pierden lo pendiente (los meses anteriores se reenvían).
+# - drain(budget_ms) vacía en orden midiendo el caudal real (bytes/ms); no empieza
+#   una unidad que no quepa en el presupuesto de tiempo, salvo la primera.
+# - Sin red se para y se reintenta después. Una unidad que el servidor rechaza
+#   (ok/verified false) cuenta intentos; tras MAX_TRIES, o con un error que no se
+#   arregla reintentando (faltan los ficheros), pasa a "dead" (con el motivo). Hasta
+#   entonces cada rechazo la manda al final de la cola y el vaciado sigue con las
+#   demás: un mes roto no bloquea a los siguientes.
+
+import os, ujson, utime
+from storage_local import _atomic_write_json
+
+OUTBOX_PATH = "/data/outbox.json"
+DATA_DIR    = "/data"
+
+DRAIN_BUDGET_MS         = 3000     # presupuesto normal por vaciado
+DRAIN_BUDGET_BACKLOG_MS = 12000    # con atraso (varias unidades) y sin ráfagas
+THROUGHPUT_INIT_BPMS    = 2.0      # bytes/ms supuestos hasta medir (~2 KB/s)
+MAX_TRIES               = 5        # rechazos del servidor antes de apartar la unidad
+MAX_DEAD                = 20       # unidades apartadas que se conservan (las últimas)
+FATAL_ERRORS            = ("faltan_ficheros",)
+
+_ticks_ms   = utime.ticks_ms
+_ticks_diff = utime.ticks_diff
+
+_units = None
+_dead = []                     # [{"k", "m", "n", "why"}]
+_bpms = THROUGHPUT_INIT_BPMS   # caudal medido (media móvil)
+
+stats = {"sent": 0, "failed": 0, "bytes": 0, "dead": 0}
+
+# ---------- persistencia ----------
+
+def _load():
+    global _units, _dead
+    if _units is not None:
+        return _units
+    try:
+        with open(OUTBOX_PATH) as f:
+            doc = ujson.loads(f.read())
+        _units = doc.get("units", [])
+        _dead = doc.get("dead", [])
+    except:
+        _units = []
+    return _units
+
+def _save():
+    try:
+        _atomic_write_json(OUTBOX_PATH, {"units": _units, "dead": _dead})
+    except Exception as e:
+        print("[outbox] No se pudo guardar:", e)
+
+def _size(path):
+    try:
+        return os.stat(path)[6]
+    except OSError:
+        return 0
+
+def _unit_bytes(u):
+    if u.get("k") == "month":
+        m = u.get("m", "")
+        return (_size("%s/events_%s.csv" % (DATA_DIR, m)) +
+                _size("%s/events_%s.manifest.json" % (DATA_DIR, m)))
+    return 0
+
+# ---------- API ----------
+
+def add_month(yyyymm):
+    """Marca el mes como pendiente (una sola unidad por mes)."""
+    units = _load()
+    for u in units:
+        if u.get("k") == "month" and u.get("m") == yyyymm:
+            return
+    units.append({"k": "month", "m": yyyymm})
+    _save()
+
+def pending():
+    return len(_load())
+
+def throughput_bpms():
+    return _bpms
+
+def budget_ms(busy=False):
+    """Presupuesto de vaciado: amplio con atraso y tráfico tranquilo, normal si no."""
+    if not busy and pending() > 1:
+        return DRAIN_BUDGET_BACKLOG_MS
+    return DRAIN_BUDGET_MS
+
+def dead():
+    _load()
+    return _dead
+
+def _send(u, update_manifest_fn, upload_month_fn):
+    """(resultado, motivo): "ok", "net" (sin red: reintentar), "rejected" o "fatal"."""
+    if u.get("k") == "month":
+        m = u.get("m")
+        if update_manifest_fn:
+            try:
+                update_manifest_fn(m)
+            except Exception as e:
+                print("[outbox] update_manifest error:", e)
+        resp = upload_month_fn(m)
+        print("[outbox] %s -> %s" % (m, resp))
+        if not resp:
+            return ("net", "sin_respuesta")
+        if resp.get("ok") and resp.get("verified", False):
+            return ("ok", None)
+        err = str(resp.get("error") or ("no_verificado" if resp.get("ok") else "rechazado"))
+        if err.startswith("http_err"):
+            return ("net", err)
+        if err in FATAL_ERRORS:
+            return ("fatal", err)
+        return ("rejected", err)
+    # Tipo desconocido (versión futura/antigua): se descarta
+    return ("ok", None)
+
+def _bury(u, why):
+    u["why"] = why
+    _dead.append(u)
+    if len(_dead) > MAX_DEAD:
+        _dead.pop(0)
+    stats["dead"] += 1
+    print("[outbox] Unidad apartada (%s): %s" % (why, u))
+
+def drain(upload_month_fn, update_manifest_fn=None, budget=DRAIN_BUDGET_MS, images_fn=None):
+    """
+    Envía unidades en orden hasta agotar el presupuesto o quedarse sin red.
+    Devuelve (ok, enviadas): ok=False si alguna falló (se reintenta más tarde);
+    las apartadas (dead) no cuentan como fallo y el vaciado sigue.
+    images_fn(): sube una foto y devuelve True (se llama si sobra presupuesto).
+    """
+    global _bpms
+    units = _load()
+    t0 = _ticks_ms()
+    sent = 0
+    failed = False
+    while units:
+        u = units[0]
+        if u.get("_try"):
+            break  # ya intentada en este vaciado (rechazada y movida al final)
+        nbytes = _unit_bytes(u)
+        left = budget - _ticks_diff(_ticks_ms(), t0)
+        if sent and nbytes / _bpms > left:
+            break  # no cabe: siguiente rato libre
+        t1 = _ticks_ms()
+        try:
+            res, why = _send(u, update_manifest_fn, upload_month_fn)
+        except Exception as e:
+            print("[outbox] Error enviando", u, e)
+            res, why = "net", str(e)
+        if res != "ok":
+            stats["failed"] += 1
+            if res == "rejected":
+                u["n"] = u.get("n", 0) + 1
+            if res == "fatal" or u.get("n", 0) >= MAX_TRIES:
+                units.pop(0)
+                _bury(u, why)
+                _save()
+                continue
+            if res == "net":
+                _save()
+                return (False, sent)
+            # Rechazada: al final de la cola, para que no retenga a las siguientes
+            failed = True
+            u["_try"] = 1
+            units.append(units.pop(0))
+            continue
+        dt = max(1, _ticks_diff(_ticks_ms(), t1))
+        if nbytes:
+            _bpms = 0.7 * _bpms + 0.3 * (nbytes / dt)
+        units.pop(0)
+        _save()
+        sent += 1
+        stats["sent"] += 1; stats["bytes"] += nbytes
+
+    for u in units:
+        u.pop("_try", None)
+    if failed:
+        _save()
+        return (False, sent)
+    if images_fn is not None:
+        while _ticks_diff(_ticks_ms(), t0) < budget:
+            if not images_fn():
+                break
+    return (True, sent)
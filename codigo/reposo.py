@@ -0,0 +1,218 @@
+# reposo.py — modo de bajo consumo entre pasadas
+# - Tras IDLE_AFTER_MS sin bits Wiegand ni señales en curso: sensor en standby
+#   (sensor.sleep) con la exposición y la ganancia automáticas guardadas antes
+# - nap(): en reposo el bucle no da vueltas cada 2 ms: la CPU espera en WFI
+#   (machine.idle) hasta el primer flanco Wiegand (la ISR de carriles) o NAP_MS.
+#   Con LIGHTSLEEP=True usa machine.lightsleep (modo stop del STM32: despierta por
+#   EXTI de los pines Wiegand o por el RTC); solo si el módulo Wi-Fi lo aguanta
+# - wake(): al primer bit de una tarjeta (no al cerrar la trama) se despierta el
+#   sensor con exposición/ganancia fijadas a las guardadas: sirve el primer frame,
+#   sin los 2 s de ajuste, y luego se devuelve el control al AEC/AGC
+# - snapshot(): sustituye a sensor.snapshot(); el primer frame tras despertar mide
+#   despertar->frame (metrics "wake") y lo que esperó la pasada por él
+# - save_ae()/boot_ae(): exposición/ganancia en SD para acortar el ajuste tras un reset
+#
+# Uso (main.py):
+#   reposo.setup(sensor)
+#   img = reposo.snapshot()
+#   reposo.tick(idle, quiet)    # al final de cada vuelta, en vez de time.sleep_ms(2)
+
+import ujson, utime
+import carriles, feedback, metrics
+try:
+    import machine
+except:
+    machine = None
+
+ENABLED       = True
+IDLE_AFTER_MS = 10000        # sin actividad de tarjetas durante este tiempo -> reposo
+NAP_MS        = 200          # siesta máxima por vuelta (tareas de red como mucho así de tarde)
+LOOP_MS       = 2            # espera normal del bucle fuera de reposo
+LIGHTSLEEP    = False
+AE_PATH       = "/data/camara_ae.json"
+AE_SAVE_MS    = 60 * 60 * 1000   # como mucho una escritura por hora en la SD
+
+_ticks_ms   = utime.ticks_ms
+_ticks_us   = utime.ticks_us
+_ticks_diff = utime.ticks_diff
+_ticks_add  = utime.ticks_add
+
+_sensor = None
+asleep = False
+_exp_us = None               # exposición/ganancia guardadas al entrar en reposo
+_gain_db = None
+_t_wake = None               # ticks_us al despertar (hasta el primer frame)
+_auto_pending = False        # devolver AEC/AGC al automático tras el primer frame
+_t_sleep = 0
+_t_ae_saved = None
+
+stats = {"sleeps": 0, "wakes": 0, "asleep_ms": 0, "naps": 0, "wake_to_frame_ms_max": 0,
+         "first_frame_wait_ms_max": 0, "reasons": {}}
+
+def setup(sensor_mod):
+    global _sensor
+    _sensor = sensor_mod
+
+def _read_ae():
+    global _exp_us, _gain_db
+    try:
+        _exp_us = _sensor.get_exposure_us()
+        _gain_db = _sensor.get_gain_db()
+    except Exception as e:
+        _exp_us = _gain_db = None
+        print("[reposo] Sin exposición/ganancia del sensor:", e)
+
+def _fix_ae(exp_us, gain_db):
+    # Valores fijos: el primer frame ya sale expuesto como el último antes del reposo
+    try:
+        if exp_us is not None:
+            _sensor.set_auto_exposure(False, exposure_us=int(exp_us))
+        if gain_db is not None:
+            _sensor.set_auto_gain(False, gain_db=gain_db)
+        return exp_us is not None or gain_db is not None
+    except Exception as e:
+        print("[reposo] No se pudo fijar exposición/ganancia:", e)
+        return False
+
+def _auto_ae():
+    try:
+        _sensor.set_auto_exposure(True)
+        _sensor.set_auto_gain(True)
+    except:
+        pass
+
+def enter():
+    """Sensor en standby (guardando antes exposición y ganancia)."""
+    global asleep, _t_sleep, _t_ae_saved
+    if asleep or _sensor is None:
+        return
+    now = _ticks_ms()
+    if _t_ae_saved is None or _ticks_diff(now, _t_ae_saved) > AE_SAVE_MS:
+        _t_ae_saved = now
+        save_ae()
+    else:
+        _read_ae()
+    try:
+        _sensor.sleep(True)
+    except Exception as e:
+        print("[reposo] El sensor no admite standby:", e)
+        return
+    asleep = True
+    _t_sleep = _ticks_ms()
+    stats["sleeps"] += 1
+
+def wake(reason="tarjeta"):
+    """Sale del reposo: sensor activo con la exposición/ganancia guardadas."""
+    global asleep, _t_wake, _auto_pending
+    if not asleep:
+        return
+    asleep = False
+    _t_wake = _ticks_us()
+    try:
+        _sensor.sleep(False)
+    except Exception as e:
+        print("[reposo] Error al despertar el sensor:", e)
+    _auto_pending = _fix_ae(_exp_us, _gain_db)
+    stats["wakes"] += 1
+    stats["asleep_ms"] += _ticks_diff(_ticks_ms(), _t_sleep)
+    stats["reasons"][reason] = stats["reasons"].get(reason, 0) + 1
+
+def snapshot():
+    """sensor.snapshot() que despierta si hace falta y mide el primer frame."""
+    global _t_wake, _auto_pending
+    if asleep:
+        wake("frame")
+    if _t_wake is None:
+        return _sensor.snapshot()
+    t0 = _ticks_us()
+    img = _sensor.snapshot()
+    t1 = _ticks_us()
+    # despertar -> primer frame, y cuánto de eso esperó quien pidió el frame
+    total = _ticks_diff(t1, _t_wake)
+    metrics.record(metrics.WAKE, total)
+    wait = _ticks_diff(t1, t0) // 1000
+    if total // 1000 > stats["wake_to_frame_ms_max"]: stats["wake_to_frame_ms_max"] = total // 1000
+    if wait > stats["first_frame_wait_ms_max"]: stats["first_frame_wait_ms_max"] = wait
+    _t_wake = None
+    if _auto_pending:
+        _auto_pending = False
+        _auto_ae()
+    return img
+
+def _activity():
+    for c in carriles.lanes:
+        if c.bits or c._tail != c._head:
+            return True
+    return False
+
+def nap(ms):
+    """Espera hasta ms o hasta el primer flanco Wiegand."""
+    stats["naps"] += 1
+    if LIGHTSLEEP and machine is not None and not feedback.busy():   # el timer se para en stop
+        try:
+            machine.lightsleep(ms)       # EXTI de los pines Wiegand o RTC
+            return
+        except:
+            pass
+    deadline = _ticks_add(_ticks_ms(), ms)
+    while not _activity() and _ticks_diff(deadline, _ticks_ms()) > 0:
+        if machine is not None:
+            machine.idle()               # WFI: vuelve con la siguiente IRQ (SysTick, EXTI)
+        else:
+            utime.sleep_ms(1)
+
+def tick(idle, quiet=True):
+    """
+    Fin de cada vuelta del bucle. idle: sin pasadas ni tramas pendientes; quiet: las
+    tareas de fondo (red, SD) no tienen nada que hacer. Decide reposo / despertar y
+    hace la espera de la vuelta (siesta solo si ambas).
+    """
+    if not ENABLED or _sensor is None:
+        utime.sleep_ms(LOOP_MS)
+        return
+    if asleep:
+        if not idle or _activity():
+            wake("tarjeta")
+            return
+        if not quiet or feedback.busy():
+            utime.sleep_ms(LOOP_MS)
+            return
+        nap(NAP_MS)
+        if _activity():
+            wake("tarjeta")        # el primer bit ya está en la ISR: sensor listo antes que la trama
+        return
+    if idle and not feedback.busy() and \
+            _ticks_diff(_ticks_ms(), carriles.last_activity_ms()) > IDLE_AFTER_MS:
+        enter()
+    utime.sleep_ms(LOOP_MS)
+
+def save_ae():
+    """Guarda la exposición/ganancia actuales en SD (para el próximo arranque)."""
+    _read_ae()
+    if _exp_us is None:
+        return False
+    try:
+        with open(AE_PATH, "w") as f:
+            ujson.dump({"exposure_us": _exp_us, "gain_db": _gain_db}, f)
+        return True
+    except Exception as e:
+        print("[reposo] No se pudo guardar", AE_PATH, e)
+        return False
+
+def boot_ae():
+    """Tras sensor.reset(): aplica la exposición/ganancia guardadas. True si había."""
+    try:
+        with open(AE_PATH) as f:
+            d = ujson.loads(f.read())
+    except:
+        return False
+    if not _fix_ae(d.get("exposure_us"), d.get("gain_db")):
+        return False
+    _auto_ae()       # el AEC/AGC sigue desde ahí: converge en pocos frames
+    return True
+
+def report():
+    r = dict(stats)
+    r["asleep"] = asleep
+    r["lightsleep"] = LIGHTSLEEP
+    return r
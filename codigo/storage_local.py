@@ -1,5 +1,8 @@
 # storage_local.py  — Mini-DB robusta en SD (OpenMV/MicroPython)
 import os, time, ujson, uhashlib
+import timesvc     # RTC en UTC -> hora local Europe/Madrid al formatear
+import hashcache   # sha256 de ficheros con caché (manifest / ACL)
+from wiegand import card_key, fold_key, popcount
 
 # ====== CONFIG GLOBAL (ajústala si quieres) ======
 SITE_ID_NAME = "SALA_MAQUINAS_A"
@@ -10,6 +13,16 @@ ROTACION_MENSUAL   = True     # events_YYYYMM.csv
 SAVE_PROOF_IMAGE   = True     # guardar siempre foto
 SAVE_ONLY_NO_CASCO = False    # ignorado si arriba es True
 
+# Políticas de foto de prueba: "full" (240x240), "thumb" (miniatura recortada a la
+# detección) o "none". Reducen el tiempo de codificación+escritura tras cada decisión.
+IMG_POLICY_CASCO   = "thumb"  # casco=1: basta una miniatura como evidencia
+IMG_POLICY_NOCASCO = "full"   # casco=0: evidencia completa del incumplimiento
+IMG_FULL_QUALITY   = 85
+IMG_THUMB_QUALITY  = 70
+IMG_THUMB_SCALE    = 0.5      # escala de la miniatura
+IMG_THUMB_MARGIN   = 24       # px alrededor de la detección al recortar
+IMG_TARGET_BYTES   = {"full": 0, "thumb": 4096}  # >0: ajusta la calidad a ese tamaño
+
 # En tu Portenta, la SD es la raíz "/"
 BASE_SD   = "/"
 MEDIA_DIR = BASE_SD + "media"
@@ -26,14 +39,12 @@ def _ensure_dirs():
 
 def _now_iso():
     try:
-        y,m,d,hh,mm,ss,_,_ = time.localtime()
-        return "%02d-%02d-%04dT%02d:%02d:%02d"%(d,m,y,hh,mm,ss)
+        return timesvc.now_iso()     # prefijo de fecha cacheado por día
     except:
         return "1970-01-01T00:00:00"
 
 def _current_month_tag():
-    y,m,_,_,_,_,_,_ = time.localtime()
-    return "%04d%02d"%(y,m)
+    return timesvc.yyyymm()
 
 def _events_csv_path(month_tag=None):
     if not month_tag:
@@ -57,27 +68,22 @@ def _csv_write_header_if_needed(path, header_line):
         f.flush()
     _sync_sd()
 
-def _sha256_file(path):
+def _hexdigest(h):
     # Soporta puertos sin .hexdigest()
     try:
-        import ubinascii
+        return h.hexdigest()     # si existe
     except:
-        ubinascii = None
-    h = uhashlib.sha256()
-    try:
-        with open(path, "rb") as f:
-            while True:
-                b = f.read(1024)
-                if not b: break
-                h.update(b)
+        d = h.digest()           # fallback universal
         try:
-            return h.hexdigest()     # si existe
+            import ubinascii
+            return ubinascii.hexlify(d).decode()
         except:
-            d = h.digest()           # fallback universal
-            if ubinascii:
-                return ubinascii.hexlify(d).decode()
             _hex = "0123456789abcdef"
             return "".join(_hex[(x>>4)&0xF] + _hex[x&0xF] for x in d)
+
+def _sha256_file(path, append_only=False):
+    try:
+        return hashcache.sha256_hex(path, append_only)
     except:
         return ""
 
@@ -112,8 +118,60 @@ def _sync_sd():
     except:
         pass
 
-# ====== ACL (tarjetas) por (site_code, user_code) ======
-_AUTH_BY_TUPLE = {}  # {(site,user): nombre}
+# ====== ACL (tarjetas) por clave facility/card (wiegand.card_key) ======
+# cards.csv guarda site_code (facility) y user_code (card) de cualquier formato
+# Wiegand (26/34/35/37 bits); en RAM la clave es un solo entero.
+_AUTH_BY_KEY = {}  # {card_key: nombre}
+
+# Filtro bloom de TODAS las tarjetas del CSV (también las deshabilitadas): si dice
+# "no está", la tarjeta es ajena y se rechaza sin dict ni evento completo.
+# Hashes con aritmética de enteros pequeños (sin bigints en MicroPython).
+BLOOM_BITS_PER_CARD = 10      # ~1.7 % de falsos positivos con 3 hashes
+BLOOM_HASHES        = 3
+_BLOOM = bytearray(128)
+_BLOOM_MASK = 128 * 8 - 1
+
+def _bloom_h(key, mask):
+    key = fold_key(key)                           # a partir de aquí, solo enteros pequeños
+    lo = key & 0xFFF
+    hi = ((key >> 12) ^ (key >> 24)) & 0xFFF
+    return (hi * 40503 + lo * 31153 + 7) & mask, ((lo * 40499 + hi * 19937 + 11) & mask) | 1
+
+def _bloom_add(bloom, mask, key):
+    h1, h2 = _bloom_h(key, mask)
+    for i in range(BLOOM_HASHES):
+        b = (h1 + i * h2) & mask
+        bloom[b >> 3] |= 1 << (b & 7)
+
+def maybe_known_key(key):
+    """False = seguro que la tarjeta no está en cards.csv (tiempo constante)."""
+    mask = _BLOOM_MASK
+    h1, h2 = _bloom_h(key, mask)
+    bloom = _BLOOM
+    for i in range(BLOOM_HASHES):
+        b = (h1 + i * h2) & mask
+        if not (bloom[b >> 3] & (1 << (b & 7))):
+            return False
+    return True
+
+def maybe_known(site_code, user_code):
+    return maybe_known_key(card_key(site_code, user_code))
+
+def _build_bloom(keys):
+    global _BLOOM, _BLOOM_MASK
+    bits = 1024
+    while bits < len(keys) * BLOOM_BITS_PER_CARD:
+        bits <<= 1
+    bloom = bytearray(bits // 8)
+    for k in keys:
+        _bloom_add(bloom, bits - 1, k)
+    _BLOOM, _BLOOM_MASK = bloom, bits - 1     # cambio de golpe (el bucle no ve uno a medias)
+
+def bloom_info():
+    ones = 0
+    for x in _BLOOM:
+        ones += popcount(x)
+    return {"bits": _BLOOM_MASK + 1, "fill": ones / (_BLOOM_MASK + 1)}
 
 def _to_int_or_none(s):
     s = (s or "").strip()
@@ -122,7 +180,7 @@ def _to_int_or_none(s):
     except: return None
 
 def load_cards():
-    global _AUTH_BY_TUPLE
+    global _AUTH_BY_KEY
     try: os.stat(CARDS_CSV)
     except OSError:
         # Plantilla inicial
@@ -130,34 +188,153 @@ def load_cards():
         _atomic_rewrite_text(CARDS_CSV, header)
     # (Re)carga
     local = {}
+    known = []
     with open(CARDS_CSV, "r") as f:
         first = True
         for line in f:
             line = line.strip()
             if not line: continue
             if first: first=False; continue
-            parts = [p.strip() for p in line.split(",")]
-            sc = _to_int_or_none(parts[0] if len(parts)>0 else "")
-            uc = _to_int_or_none(parts[1] if len(parts)>1 else "")
-            nm = parts[2] if len(parts)>2 else ""
-            en = (parts[3].strip() != "0") if len(parts)>3 else True
-            if en and sc is not None and uc is not None:
-                local[(sc,uc)] = nm or "Operario"
-    _AUTH_BY_TUPLE = local
-    return len(_AUTH_BY_TUPLE)
+            row = _parse_card_line(line)
+            if row:
+                known.append(row[0])
+                if row[2]:
+                    local[row[0]] = row[1]
+    _AUTH_BY_KEY = local
+    _build_bloom(known)
+    return len(_AUTH_BY_KEY)
+
+def _parse_card_line(line):
+    # "site_code,user_code,nombre,enabled" -> (key, nombre, enabled) o None
+    parts = [p.strip() for p in line.split(",")]
+    sc = _to_int_or_none(parts[0] if len(parts)>0 else "")
+    uc = _to_int_or_none(parts[1] if len(parts)>1 else "")
+    if sc is None or uc is None:
+        return None
+    nm = parts[2] if len(parts)>2 else ""
+    en = (parts[3].strip() != "0") if len(parts)>3 else True
+    return (card_key(sc, uc), nm or "Operario", en)
+
+# ====== Recarga de la ACL en segundo plano (índice en sombra + cambio atómico) ======
+# acl_rebuild_start() abre cards.csv; cada acl_rebuild_step() procesa como mucho
+# ACL_CHUNK_LINES líneas hacia un dict + bloom en sombra (y va calculando el sha256
+# de los mismos bytes). Al terminar, si el sha coincide con el del manifest, la ACL
+# en uso se sustituye con dos asignaciones; si no, se descarta y sigue la anterior.
+ACL_CHUNK_LINES = 64
+ACL_STATS = {"rebuilds": 0, "aborted": 0, "rows": 0, "chunks": 0, "chunk_us_max": 0,
+             "build_ms": 0, "swap_us": 0, "swap_us_max": 0}
+_rb = None      # estado de la recarga en curso
+
+def acl_rebuild_active():
+    return _rb is not None
+
+def acl_rebuild_start(expected_sha=None):
+    """Empieza (o reinicia) la recarga en sombra de cards.csv."""
+    global _rb
+    acl_rebuild_abort()
+    try:
+        size = os.stat(CARDS_CSV)[6]
+    except OSError:
+        return False
+    # Bloom dimensionado por tamaño de fichero (>= nº real de filas: menos falsos positivos)
+    bits = 1024
+    while bits < (size // 16 + 1) * BLOOM_BITS_PER_CARD:
+        bits <<= 1
+    _rb = {"f": open(CARDS_CSV, "rb"), "h": uhashlib.sha256(), "sha": expected_sha,
+           "local": {}, "bloom": bytearray(bits // 8), "mask": bits - 1,
+           "first": True, "rows": 0, "chunks": 0, "t0": _ticks_us()}
+    return True
+
+def acl_rebuild_abort():
+    global _rb
+    if _rb is not None:
+        try: _rb["f"].close()
+        except: pass
+        _rb = None
+
+def acl_rebuild_step(max_lines=None):
+    """
+    Procesa un trozo. None = sigue en curso; True = ACL nueva en uso;
+    False = descartada (sha distinto del manifest / error de lectura).
+    """
+    global _AUTH_BY_KEY, _BLOOM, _BLOOM_MASK
+    rb = _rb
+    if rb is None:
+        return None
+    t0 = _ticks_us()
+    f = rb["f"]; h = rb["h"]; local = rb["local"]; bloom = rb["bloom"]; mask = rb["mask"]
+    try:
+        for _ in range(max_lines or ACL_CHUNK_LINES):
+            raw = f.readline()
+            if not raw:
+                break
+            h.update(raw)
+            if rb["first"]:
+                rb["first"] = False
+                continue
+            line = raw.decode().strip()
+            if not line:
+                continue
+            row = _parse_card_line(line)
+            if row:
+                _bloom_add(bloom, mask, row[0])
+                if row[2]:
+                    local[row[0]] = row[1]
+                rb["rows"] += 1
+        else:
+            raw = True      # trozo completo: puede quedar fichero
+    except Exception as e:
+        print("[ACL] Recarga abortada:", e)
+        ACL_STATS["aborted"] += 1
+        acl_rebuild_abort()
+        return False
+    rb["chunks"] += 1
+    us = _ticks_diff(_ticks_us(), t0)
+    if us > ACL_STATS["chunk_us_max"]: ACL_STATS["chunk_us_max"] = us
+    if raw:
+        return None
+
+    acl_rebuild_abort()
+    sha = _hexdigest(h)
+    if rb["sha"] and sha != rb["sha"]:
+        print("[ACL] sha de cards.csv (%s) != manifest (%s): se mantiene la ACL anterior" % (sha, rb["sha"]))
+        ACL_STATS["aborted"] += 1
+        return False
+    hashcache.put(CARDS_CSV, sha)      # el siguiente poll de cards_sync no relee el fichero
+    t1 = _ticks_us()
+    _AUTH_BY_KEY = local
+    _BLOOM, _BLOOM_MASK = bloom, mask
+    swap = _ticks_diff(_ticks_us(), t1)
+    ACL_STATS["rebuilds"] += 1
+    ACL_STATS["rows"] = rb["rows"]
+    ACL_STATS["chunks"] = rb["chunks"]
+    ACL_STATS["build_ms"] = _ticks_diff(_ticks_us(), rb["t0"]) // 1000
+    ACL_STATS["swap_us"] = swap
+    if swap > ACL_STATS["swap_us_max"]: ACL_STATS["swap_us_max"] = swap
+    return True
+
+def acl_stats():
+    r = dict(ACL_STATS)
+    r["cards"] = len(_AUTH_BY_KEY)
+    r["active"] = _rb is not None
+    return r
 
 def add_card_tuple(site_code, user_code, nombre, enabled=True):
-    global _AUTH_BY_TUPLE
-    _AUTH_BY_TUPLE[(site_code,user_code)] = nombre
+    k = card_key(site_code, user_code)
+    _AUTH_BY_KEY[k] = nombre
+    _bloom_add(_BLOOM, _BLOOM_MASK, k)
     with open(CARDS_CSV, "a") as f:
         f.write("{},{},{},{}\n".format(site_code, user_code, nombre, 1 if enabled else 0))
         f.flush()
     _sync_sd()
 
-def is_card_authorized(site_code, user_code):
-    nm = _AUTH_BY_TUPLE.get((site_code,user_code), "")
+def is_key_authorized(key):
+    nm = _AUTH_BY_KEY.get(key, "")
     return (nm != ""), nm
 
+def is_card_authorized(site_code, user_code):
+    return is_key_authorized(card_key(site_code, user_code))
+
 # ====== EVENTOS ======
 _HEADER = "timestamp,tz,checkpoint,version,raw26,site_code,user_code,nombre,autorizado,casco,score,img_path"
 
@@ -166,14 +343,15 @@ def _ensure_events_file():
     _csv_write_header_if_needed(path, _HEADER)
     return path
 
-def append_event(raw26, site_code, user_code, nombre, autorizado, casco, score, img_path=""):
+def append_event(raw26, site_code, user_code, nombre, autorizado, casco, score, img_path="", lane=None):
     """
     Escribe 1 línea y fuerza a disco (append + flush + sync).
+    lane: carril (multi-lector); va como sufijo del checkpoint, p.ej. SALA_MAQUINAS_A:L2.
     """
     path = _ensure_events_file()
     ts = _now_iso()
     line = "{ts},{tz},{chk},{ver},{raw},{sc},{uc},{nm},{auth},{cas},{scr:.2f},{img}\n".format(
-        ts=ts, tz=TZ_NAME, chk=SITE_ID_NAME, ver=FW_VERSION,
+        ts=ts, tz=TZ_NAME, chk=(SITE_ID_NAME + ":" + lane if lane else SITE_ID_NAME), ver=FW_VERSION,
         raw=(raw26 if raw26 is not None else ""),
         sc=(site_code if site_code is not None else ""),
         uc=(user_code if user_code is not None else ""),
@@ -188,28 +366,113 @@ def append_event(raw26, site_code, user_code, nombre, autorizado, casco, score,
         f.flush()
     _sync_sd()
 
-def save_proof_image_if_needed(img, raw26, casco, force=False):
+# Calidad en curso por política (se ajusta hacia IMG_TARGET_BYTES evento a evento,
+# con una sola codificación por foto) y medidas {policy: [n, enc_us, wr_us, bytes, max_us]}
+_img_quality = {"full": IMG_FULL_QUALITY, "thumb": IMG_THUMB_QUALITY}
+IMG_STATS = {}
+
+def _ticks_us():
+    try: return time.ticks_us()
+    except: return int(time.time() * 1000000)
+
+def _ticks_diff(a, b):
+    try: return time.ticks_diff(a, b)
+    except: return a - b
+
+def _img_policy(casco, force):
+    if force:
+        return "full"
+    return IMG_POLICY_CASCO if casco else IMG_POLICY_NOCASCO
+
+def _thumb_roi(img, det_rect):
+    w, h = img.width(), img.height()
+    if not det_rect:
+        return (0, 0, w, h)
+    x, y, rw, rh = det_rect
+    x0 = max(0, x - IMG_THUMB_MARGIN); y0 = max(0, y - IMG_THUMB_MARGIN)
+    x1 = min(w, x + rw + IMG_THUMB_MARGIN); y1 = min(h, y + rh + IMG_THUMB_MARGIN)
+    if x1 - x0 < 8 or y1 - y0 < 8:
+        return (0, 0, w, h)
+    return (x0, y0, x1 - x0, y1 - y0)
+
+def _to_jpeg(img, quality):
+    # to_jpeg() en firmwares recientes; compress() en los antiguos (ambos in-place)
+    try:
+        return img.to_jpeg(quality=quality)
+    except AttributeError:
+        return img.compress(quality=quality)
+
+def _adapt_quality(policy, nbytes):
+    target = IMG_TARGET_BYTES.get(policy, 0)
+    if target <= 0 or nbytes <= 0:
+        return
+    q = _img_quality[policy]
+    # Corrección proporcional amortiguada: el tamaño JPEG crece ~lineal con la calidad
+    q = int(q + (q * target / nbytes - q) / 2)
+    _img_quality[policy] = max(10, min(95, q))
+
+def _note_img_stats(policy, enc_us, wr_us, nbytes):
+    st = IMG_STATS.get(policy)
+    if st is None:
+        st = IMG_STATS[policy] = [0, 0, 0, 0, 0]
+    st[0] += 1; st[1] += enc_us; st[2] += wr_us; st[3] += nbytes
+    if enc_us + wr_us > st[4]: st[4] = enc_us + wr_us
+
+def image_stats():
+    """Medias por política: {policy: {n, enc_ms, write_ms, bytes, max_ms, quality}}."""
+    out = {}
+    for p, st in IMG_STATS.items():
+        n = st[0] or 1
+        out[p] = {"n": st[0], "enc_ms": st[1] / n / 1000, "write_ms": st[2] / n / 1000,
+                  "bytes": st[3] // n, "max_ms": st[4] / 1000, "quality": _img_quality.get(p)}
+    return out
+
+def save_proof_image_if_needed(img, raw26, casco, force=False, det_rect=None):
+    """
+    Guarda la foto de prueba según la política del resultado (IMG_POLICY_*).
+    det_rect: (x,y,w,h) de la mejor detección, para recortar la miniatura.
+    Modifica img in-place (recorte + JPEG): pásale un snapshot desechable.
+    """
     if not SAVE_PROOF_IMAGE:
         return ""
     if SAVE_ONLY_NO_CASCO and casco and not force:
         return ""
+    policy = _img_policy(casco, force)
+    if policy == "none":
+        return ""
     ts = _now_iso().replace(":", "").replace("-", "")
     fname = "{}/{}_{}.jpg".format(MEDIA_DIR, ts, raw26 if raw26 is not None else "no_raw")
     try:
-        img.save(fname, quality=85)
+        t0 = _ticks_us()
+        if policy == "thumb":
+            try:
+                img.crop(roi=_thumb_roi(img, det_rect), x_scale=IMG_THUMB_SCALE, y_scale=IMG_THUMB_SCALE)
+            except Exception as e:
+                print("Recorte de miniatura no disponible:", e)
+        jpg = _to_jpeg(img, _img_quality[policy]) or img
+        t1 = _ticks_us()
+        jpg.save(fname)
         _sync_sd()
+        t2 = _ticks_us()
+        try: nbytes = jpg.size()
+        except: nbytes = 0
+        _note_img_stats(policy, _ticks_diff(t1, t0), _ticks_diff(t2, t1), nbytes)
+        _adapt_quality(policy, nbytes)
         return fname
     except Exception as e:
         print("No se pudo guardar imagen:", e)
         return ""
 
 # ====== MANIFEST & AUDITORÍA ======
-def update_manifest():
+def update_manifest(month_tag=None):
     """
-    Recalcula SHA-256 y número de eventos (sin cabecera) del CSV del mes actual.
-    Guarda manifest JSON de forma atómica.
+    Recalcula SHA-256 y número de eventos (sin cabecera) del CSV del mes indicado
+    ('YYYYMM'; por defecto el actual). Guarda manifest JSON de forma atómica.
     """
-    mt = _current_month_tag() if ROTACION_MENSUAL else ""
+    if month_tag:
+        mt = month_tag
+    else:
+        mt = _current_month_tag() if ROTACION_MENSUAL else ""
     csv_path = _events_csv_path(mt)
     manifest_path = _events_manifest_path(mt)
 
@@ -227,7 +490,7 @@ def update_manifest():
     except OSError:
         pass
 
-    sha = _sha256_file(csv_path)
+    sha = _sha256_file(csv_path, append_only=True)   # el CSV del mes solo crece
     manifest = {
         "month": mt,
         "csv": csv_path,
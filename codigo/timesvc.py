@@ -0,0 +1,109 @@
+# timesvc.py — hora local Europe/Madrid (CET/CEST) sobre un RTC en UTC
+# - El RTC guarda UTC (lo pone ntptime.settime); la hora local solo se calcula al formatear
+# - Transiciones DST (último domingo de marzo/octubre a las 01:00 UTC) precalculadas
+#   por año en setup(); el tramo vigente [inicio, fin) + offset queda en caché, así que
+#   offset_s() es una comparación salvo dos veces al año
+# - now_iso() / yyyymm() reutilizan el prefijo de fecha del día y el texto del segundo
+#
+# Formato de siempre: "dd-mm-yyyyThh:mm:ss" (CSV, manifest, nombres de foto).
+
+import utime
+
+STD_OFFSET_MIN = 60     # CET  = UTC+1
+DST_OFFSET_MIN = 120    # CEST = UTC+2
+YEARS_AHEAD    = 20
+
+_gmtime = getattr(utime, "gmtime", utime.localtime)   # en la placa localtime == UTC
+
+_dst = {}               # año -> (inicio_dst_utc, fin_dst_utc) en segundos del puerto
+_seg = (0, 0, STD_OFFSET_MIN * 60)   # tramo en caché: [lo, hi) -> offset (s)
+
+_last_sec = None
+_last_iso = ""
+_day = None
+_prefix = ""            # "dd-mm-yyyy"
+_yyyymm = ""
+
+def _weekday(y, m, d):
+    # Sakamoto: 0=Dom,1=Lun,...,6=Sab
+    t = [0, 3, 2, 5, 0, 3, 5, 1, 4, 6, 2, 4]
+    if m < 3: y -= 1
+    return (y + y // 4 - y // 100 + y // 400 + t[m - 1] + d) % 7
+
+def _last_sunday_31(y, m):
+    # Marzo y octubre tienen 31 días: un solo cálculo de día de la semana
+    return 31 - _weekday(y, m, 31)
+
+def _rules(y):
+    r = _dst.get(y)
+    if r is None:
+        r = (utime.mktime((y, 3, _last_sunday_31(y, 3), 1, 0, 0, 0, 0)),
+             utime.mktime((y, 10, _last_sunday_31(y, 10), 1, 0, 0, 0, 0)))
+        _dst[y] = r
+    return r
+
+def setup(first_year=None, years=YEARS_AHEAD):
+    """Precalcula las transiciones de [first_year, first_year+years) (por defecto desde el año del RTC)."""
+    if first_year is None:
+        first_year = _gmtime()[0] - 1
+    for y in range(first_year, first_year + years):
+        _rules(y)
+    return len(_dst)
+
+def offset_s(t=None):
+    """Offset local respecto a UTC (segundos) en el instante UTC t."""
+    global _seg
+    if t is None:
+        t = utime.time()
+    lo, hi, off = _seg
+    if lo <= t < hi:
+        return off
+    y = _gmtime(t)[0]
+    start, end = _rules(y)
+    if t < start:
+        _seg = (_rules(y - 1)[1], start, STD_OFFSET_MIN * 60)
+    elif t < end:
+        _seg = (start, end, DST_OFFSET_MIN * 60)
+    else:
+        _seg = (end, _rules(y + 1)[0], STD_OFFSET_MIN * 60)
+    return _seg[2]
+
+def local_tuple(t=None):
+    """Como time.localtime() pero en hora local Europe/Madrid (RTC en UTC)."""
+    if t is None:
+        t = utime.time()
+    return _gmtime(t + offset_s(t))
+
+def _set_day(day, lt):
+    global _day, _prefix, _yyyymm
+    y, m, d = _gmtime(lt)[0:3]
+    _prefix = "%02d-%02d-%04d" % (d, m, y)
+    _yyyymm = "%04d%02d" % (y, m)
+    _day = day
+
+def now_iso(t=None):
+    """'dd-mm-yyyyThh:mm:ss' local; el prefijo de fecha se calcula una vez por día."""
+    global _last_sec, _last_iso
+    if t is None:
+        t = utime.time()
+    if t == _last_sec:
+        return _last_iso
+    lt = t + offset_s(t)
+    day, sod = divmod(lt, 86400)
+    if day != _day:
+        _set_day(day, lt)
+    hh, r = divmod(sod, 3600)
+    mm, ss = divmod(r, 60)
+    _last_iso = "%sT%02d:%02d:%02d" % (_prefix, hh, mm, ss)
+    _last_sec = t
+    return _last_iso
+
+def yyyymm(t=None):
+    """Mes local 'YYYYMM' (etiqueta de los CSV/manifest mensuales)."""
+    if t is None:
+        t = utime.time()
+    lt = t + offset_s(t)
+    day = lt // 86400
+    if day != _day:
+        _set_day(day, lt)
+    return _yyyymm
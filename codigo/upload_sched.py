@@ -0,0 +1,140 @@
+# upload_sched.py — planificador de subidas a upload-month
+# Agrupa eventos pendientes y decide cuándo sincronizar según:
+#   - nº de eventos pendientes (lote lleno -> subir)
+#   - tiempo desde la última subida correcta (nunca más de MAX_STALE_MS con pendientes)
+#   - ritmo de pasadas (durante ráfagas, p.ej. cambio de turno, se aplaza)
+#   - backoff exponencial tras fallos
+# Eventos del CSV y unidades de la cola de salida (outbox) se cuentan por separado:
+# el lote lleno se mide solo en eventos; las unidades solo dicen que hay algo que subir.
+# El estado (pendientes + fallos) se guarda en SD para sobrevivir a cortes de luz.
+
+import ujson, utime
+from storage_local import _atomic_write_json
+
+STATE_PATH = "/data/upload_sched.json"
+
+BATCH_MAX_EVENTS   = 20                # lote lleno: subir en cuanto no haya cooldown
+MIN_INTERVAL_MS    = 8000              # mínimo entre intentos (antiguo SYNC_COOLDOWN_MS)
+QUIET_MS           = 4000              # sin pasadas durante este tiempo = rato libre
+MAX_STALE_MS       = 5 * 60 * 1000     # con pendientes, subir aunque haya ráfaga
+BURST_SWIPES       = 4                 # >= pasadas en BURST_WINDOW_MS -> ráfaga
+BURST_WINDOW_MS    = 30000
+BACKOFF_MIN_MS     = 15000
+BACKOFF_MAX_MS     = 10 * 60 * 1000
+
+_ticks_ms   = utime.ticks_ms
+_ticks_diff = utime.ticks_diff
+
+_events = 0            # eventos escritos en el CSV desde la última subida correcta
+_units = 0             # unidades que quedaban en outbox (meses atrasados, vaciado parcial)
+_fails = 0
+_last_ok_ms = None
+_last_try_ms = None
+_next_try_ms = None
+_last_swipe_ms = None
+_swipes = [None] * BURST_SWIPES     # anillo con las últimas pasadas
+_swipe_i = 0
+
+# ---------- persistencia ----------
+
+def _save():
+    try:
+        _atomic_write_json(STATE_PATH, {"events": _events, "units": _units, "fails": _fails})
+    except Exception as e:
+        print("[sched] No se pudo guardar estado:", e)
+
+def load(backlog=0):
+    """
+    Recupera pendientes tras un reinicio: se suben en el primer rato libre.
+    backlog: unidades ya en la cola de salida (outbox).
+    """
+    global _events, _units, _fails, _last_ok_ms
+    try:
+        with open(STATE_PATH) as f:
+            st = ujson.loads(f.read())
+        _events = int(st.get("events", st.get("pending", 0)))
+        _fails = int(st.get("fails", 0))
+    except:
+        _events, _fails = 0, 0
+    _units = backlog
+    if _events or _units:
+        # Desconocemos cuándo fue la última subida correcta: tratarlo como antiguo
+        _last_ok_ms = utime.ticks_add(_ticks_ms(), -MAX_STALE_MS)
+    return _events + _units
+
+# ---------- entradas ----------
+
+def note_swipe():
+    """Cada pasada de tarjeta (también duplicadas): alimenta el detector de ráfagas."""
+    global _swipe_i, _last_swipe_ms
+    now = _ticks_ms()
+    _swipes[_swipe_i] = now
+    _swipe_i = (_swipe_i + 1) % BURST_SWIPES
+    _last_swipe_ms = now
+
+def note_event():
+    """Se ha escrito un evento nuevo en el CSV: queda pendiente de subir."""
+    global _events, _last_ok_ms
+    _events += 1
+    if _events == 1:
+        if _last_ok_ms is None:
+            _last_ok_ms = _ticks_ms()
+        _save()  # solo en la transición 0 -> 1 (evita escrituras por evento)
+
+def on_result(ok, remaining=0):
+    """
+    Resultado del intento de subida: limpia pendientes o aplica backoff.
+    remaining: unidades que quedan en outbox tras un vaciado parcial (se sigue en otro
+    rato libre); los eventos ya están en esas unidades.
+    """
+    global _events, _units, _fails, _last_ok_ms, _next_try_ms
+    now = _ticks_ms()
+    _units = remaining
+    if ok:
+        _events = 0
+        _fails = 0
+        _last_ok_ms = now
+        _next_try_ms = None
+    else:
+        _fails += 1
+        b = min(BACKOFF_MAX_MS, BACKOFF_MIN_MS << min(_fails - 1, 10))
+        _next_try_ms = utime.ticks_add(now, b)
+    _save()
+
+def on_link(ev):
+    """Suscriptor de wifisup: al volver el enlace no tiene sentido esperar el backoff
+    acumulado mientras no había red."""
+    global _fails, _next_try_ms
+    if ev == "up" and _next_try_ms is not None:
+        _fails = 0
+        _next_try_ms = None
+
+# ---------- decisión ----------
+
+def in_burst(now=None):
+    if now is None:
+        now = _ticks_ms()
+    oldest = _swipes[_swipe_i]  # la más antigua del anillo
+    return oldest is not None and _ticks_diff(now, oldest) < BURST_WINDOW_MS
+
+def pending():
+    """(eventos, unidades) pendientes de subir."""
+    return _events, _units
+
+def due(online=True):
+    """True si toca subir ahora (llamar en ratos libres del bucle)."""
+    global _last_try_ms
+    if not online or (_events == 0 and _units == 0):
+        return False
+    now = _ticks_ms()
+    if _next_try_ms is not None and _ticks_diff(now, _next_try_ms) < 0:
+        return False
+    if _last_try_ms is not None and _ticks_diff(now, _last_try_ms) < MIN_INTERVAL_MS:
+        return False
+
+    stale = _last_ok_ms is None or _ticks_diff(now, _last_ok_ms) >= MAX_STALE_MS
+    quiet = _last_swipe_ms is None or _ticks_diff(now, _last_swipe_ms) >= QUIET_MS
+    go = stale or (quiet and (_events >= BATCH_MAX_EVENTS or not in_burst(now)))
+    if go:
+        _last_try_ms = now
+    return go
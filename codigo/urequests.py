@@ -1,8 +1,17 @@
 # urequests.py — MicroPython-friendly requests con HTTPS (SNI) sin dependencia rígida de ussl
 # Fuente: adaptado del urequests oficial con compatibilidad SNI y fallback ssl.
+# Reanudación TLS: la sesión de cada host se guarda en RAM tras la primera conexión y
+# se ofrece en las siguientes (session=); el handshake reanudado se ahorra el intercambio
+# de certificados y la parte cara de clave pública. Solo funciona si el ssl del puerto
+# expone las sesiones (tipo SSLSession, wrap_socket(session=), socket.session), como el
+# ssl de CPython a través del shim ussl del host. El ssl de MicroPython (mbedTLS en la
+# Portenta) no las expone: allí TLS_CAN_RESUME es False desde la importación y todos
+# los handshakes son completos; las cifras de herramientas/tls_bench.py son del host.
+# tls_report(): nº y tiempo de handshakes completos / reanudados.
 
 import usocket as socket
 import sys
+import utime
 
 # ssl / ussl compat
 try:
@@ -10,12 +19,62 @@ try:
 except ImportError:
     import ssl
 
+# Se mira una vez al importar: sin soporte no se intenta nada en cada conexión
+TLS_CAN_RESUME = hasattr(ssl, "SSLSession")
+TLS_RESUME = TLS_CAN_RESUME   # False: siempre handshake completo
+_sessions = {}          # host -> sesión TLS (solo RAM: no es serializable en ningún puerto)
+TLS_STATS = {"full": 0, "resumed": 0, "full_us": 0, "resumed_us": 0,
+             "full_us_max": 0, "resumed_us_max": 0, "failed": 0}
+
 def _wrap_tls(s, host, **kwargs):
-    # Algunos ports aceptan server_hostname (SNI); otros no.
+    global TLS_RESUME
+    t0 = utime.ticks_us()
+    sess = _sessions.get(host) if TLS_RESUME else None
+    ss = None
     try:
-        return ssl.wrap_socket(s, server_hostname=host, **kwargs)
-    except TypeError:
-        return ssl.wrap_socket(s, **kwargs)
+        if sess is not None:
+            try:
+                ss = ssl.wrap_socket(s, server_hostname=host, session=sess, **kwargs)
+            except TypeError:
+                TLS_RESUME = False
+                _sessions.clear()
+        if ss is None:
+            # Algunos ports aceptan server_hostname (SNI); otros no.
+            try:
+                ss = ssl.wrap_socket(s, server_hostname=host, **kwargs)
+            except TypeError:
+                ss = ssl.wrap_socket(s, **kwargs)
+    except Exception:
+        # Sesión caducada o rechazada de mala manera: la próxima vez, handshake completo
+        _sessions.pop(host, None)
+        TLS_STATS["failed"] += 1
+        raise
+    dt = utime.ticks_diff(utime.ticks_us(), t0)
+    kind = "resumed" if getattr(ss, "session_reused", False) else "full"
+    TLS_STATS[kind] += 1
+    TLS_STATS[kind + "_us"] += dt
+    if dt > TLS_STATS[kind + "_us_max"]:
+        TLS_STATS[kind + "_us_max"] = dt
+    return ss
+
+def _keep_session(s, host):
+    # En TLS 1.3 el ticket llega después del handshake: se recoge ya leída la respuesta
+    if TLS_RESUME:
+        try:
+            sess = s.session
+        except AttributeError:
+            return
+        if sess is not None:
+            _sessions[host] = sess
+
+def tls_report():
+    r = dict(TLS_STATS)
+    for k in ("full", "resumed"):
+        r[k + "_ms_avg"] = (TLS_STATS[k + "_us"] / TLS_STATS[k] / 1000) if TLS_STATS[k] else 0
+    r["hosts"] = len(_sessions)
+    r["resume"] = TLS_RESUME
+    r["resume_supported"] = TLS_CAN_RESUME   # False en la placa: todo "full"
+    return r
 
 def request(method, url, data=None, json=None, headers={}, stream=None, timeout=None):
     try:
@@ -80,12 +139,16 @@ def request(method, url, data=None, json=None, headers={}, stream=None, timeout=
         # Send headers
         s.write(req.encode() if isinstance(req, str) else req)
 
-        # Send body (bytes/str)
+        # Send body (bytes/str o iterable de trozos)
         if data:
             if isinstance(data, str):
                 data = data.encode()
-            # Si es bytes o bytearray
-            s.write(data)
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                s.write(data)
+            else:
+                # Cuerpo por trozos (generador): el Content-Length lo pone quien llama
+                for chunk in data:
+                    s.write(chunk)
 
         # Parse response
         # Lee status line
@@ -110,6 +173,8 @@ def request(method, url, data=None, json=None, headers={}, stream=None, timeout=
                 break
             k, v = l.split(b":", 1)
             resp_headers[k.strip().lower()] = v.strip()
+        if proto == "https:":
+            _keep_session(s, host)
 
         # Content
         if stream:
@@ -5,7 +5,11 @@ import ssl as _ssl
 for _name in dir(_ssl):
     globals()[_name] = getattr(_ssl, _name)
 
-def wrap_socket(sock, server_hostname=None, **kwargs):
+def wrap_socket(sock, server_hostname=None, session=None, **kwargs):
+    if session is not None:
+        # Reanudación TLS: solo si el ssl del firmware acepta session= (si no, TypeError
+        # hacia urequests, que deja de intentarlo)
+        return _ssl.wrap_socket(sock, server_hostname=server_hostname, session=session, **kwargs)
     try:
         return _ssl.wrap_socket(sock, server_hostname=server_hostname, **kwargs)
     except TypeError:
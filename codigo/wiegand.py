@@ -0,0 +1,121 @@
+# wiegand.py — decodificador Wiegand multi-formato (tabla de formatos + popcount)
+# Sin dependencias de OpenMV: lo usan main.py (placa) y herramientas/wiegand_bench.py (PC).
+#
+# Cada formato se describe por su nº de bits, sus campos (posición desde el MSB,
+# anchura) y sus paridades (posición, par/impar, bits cubiertos). Las máscaras se
+# precalculan al registrar el formato; la paridad es un popcount por bytes con tabla.
+#
+#   decode(bits, valor) -> (formato, facility, card, key) o None
+#   key = card_key(facility, card): clave única de la ACL (storage_local)
+
+# popcount de 0..255
+_POP = bytes(bin(i).count("1") for i in range(256))
+
+def popcount(v):
+    c = 0
+    while v:
+        c += _POP[v & 0xFF]
+        v >>= 8
+    return c
+
+def card_key(facility, card):
+    """
+    Clave combinada facility/card para la ACL. Cabe en 28 bits con H10301/C1000, pero
+    con facility de 16 bits (H10306/H10304) llega a ~2^36: ahí ya no es un entero
+    pequeño de MicroPython (30 bits). Para hashes, pasarla antes por fold_key().
+    """
+    return (facility << 20) | card
+
+def fold_key(key):
+    """card_key plegada a 30 bits (entero pequeño): los bits altos se mezclan con los bajos."""
+    return (key & 0x3FFFFFFF) ^ (key >> 30)
+
+def _mask(n, idxs):
+    m = 0
+    for i in idxs:
+        m |= 1 << (n - 1 - i)
+    return m
+
+FORMATS = []            # por orden de prioridad
+_BY_BITS = {}           # bits -> [formato]
+
+def register(name, bits, fac, card, parity):
+    """
+    fac / card: (índice desde el MSB, anchura); fac=None si el formato no tiene.
+    parity: [(índice del bit de paridad, impar?, índices cubiertos)].
+    """
+    f = {
+        "name": name, "bits": bits,
+        "fac": None if fac is None else (bits - fac[0] - fac[1], (1 << fac[1]) - 1),
+        "card": (bits - card[0] - card[1], (1 << card[1]) - 1),
+        "parity": [(bits - 1 - p, 1 if odd else 0, _mask(bits, cov)) for p, odd, cov in parity],
+    }
+    FORMATS.append(f)
+    _BY_BITS.setdefault(bits, []).append(f)
+    return f
+
+def enable(names):
+    """Deja activos solo los formatos indicados (el resto no se intenta)."""
+    _BY_BITS.clear()
+    for f in FORMATS:
+        if f["name"] in names:
+            _BY_BITS.setdefault(f["bits"], []).append(f)
+
+def _parity_ok(f, value):
+    for shift, odd, mask in f["parity"]:
+        # bit de paridad + bits cubiertos: total par (paridad par) o impar
+        if (popcount(value & mask) + ((value >> shift) & 1)) & 1 != odd:
+            return False
+    return True
+
+def decode(bits, value):
+    """(formato, facility, card, key) del primer formato de esa longitud con paridad válida."""
+    for f in _BY_BITS.get(bits, ()):
+        if not _parity_ok(f, value):
+            continue
+        sh, m = f["card"]
+        card = (value >> sh) & m
+        if f["fac"] is None:
+            fac = 0
+        else:
+            sh, m = f["fac"]
+            fac = (value >> sh) & m
+        return (f["name"], fac, card, card_key(fac, card))
+    return None
+
+def encode(name, fac, card):
+    """Trama válida (bits, valor) de un formato: para pruebas y el banco del PC."""
+    for f in FORMATS:
+        if f["name"] == name:
+            break
+    else:
+        raise ValueError("formato desconocido: " + name)
+    v = (card & f["card"][1]) << f["card"][0]
+    if f["fac"] is not None:
+        v |= (fac & f["fac"][1]) << f["fac"][0]
+    # Algunas paridades cubren otros bits de paridad (Corporate 1000): se repite
+    # hasta que todas cuadran
+    for _ in range(len(f["parity"])):
+        for shift, odd, mask in f["parity"]:
+            v &= ~(1 << shift)
+            if (popcount(v & mask) & 1) != odd:
+                v |= 1 << shift
+    return f["bits"], v
+
+# ---------- formatos ----------
+# H10301: [P 1..12][FC 8][CN 16][P 13..24]. Paridades como las dan los lectores
+# instalados (y como las comprobaba main.py): la inicial impar y la final par
+register("H10301", 26, (1, 8), (9, 16),
+         [(0, True, range(1, 13)), (25, False, range(13, 25))])
+# H10306: [P par 1..16][FC 16][CN 16][P impar 17..32]
+register("H10306", 34, (1, 16), (17, 16),
+         [(0, False, range(1, 17)), (33, True, range(17, 33))])
+# H10304: [P par 1..18][FC 16][CN 19][P impar 18..35]
+register("H10304", 37, (1, 16), (17, 19),
+         [(0, False, range(1, 19)), (36, True, range(18, 36))])
+# HID Corporate 1000 (35): [P impar total][P par][CC 12][CN 20][P impar]
+# (índices desde 0: la par cubre i%3 != 1 en 2..33, la impar final i%3 != 0 en 1..33)
+register("C1000", 35, (2, 12), (14, 20),
+         [(0, True, range(1, 35)),
+          (1, False, [i for i in range(2, 34) if i % 3 != 1]),
+          (34, True, [i for i in range(1, 34) if i % 3 != 0])])
@@ -0,0 +1,125 @@
+# wifisup.py — supervisor de conectividad Wi-Fi (máquina de estados)
+#   off        -> sin módulo network / sin wifi_setup
+#   connecting -> sta.connect() lanzado; se consulta isconnected() cada POLL_MS
+#   up         -> enlace comprobado cada CHECK_MS (nada más entre medias)
+#   backoff    -> espera exponencial con jitter antes del siguiente intento
+# Un solo WLAN creado al arrancar; tick() cuesta una resta de ticks mientras no toca
+# hacer nada. Los demás módulos se suscriben a los cambios ("up" / "down") con
+# subscribe(fn): los avisos solo deben marcar trabajo, no hacerlo (ni NTP ni HTTPS
+# dentro del aviso), para que una racha de reconexiones no frene las pasadas.
+
+import utime
+try:
+    from urandom import getrandbits
+except:
+    from random import getrandbits
+
+POLL_MS            = 250
+CHECK_MS           = 5000
+CONNECT_TIMEOUT_MS = 15000
+BACKOFF_MIN_MS     = 5000
+BACKOFF_MAX_MS     = 5 * 60 * 1000
+JITTER             = 0.25     # ±25 % sobre cada espera
+
+_ticks_ms   = utime.ticks_ms
+_ticks_diff = utime.ticks_diff
+_ticks_add  = utime.ticks_add
+
+state = "off"
+_begin = None          # fn() -> WLAN con la conexión lanzada (wifi_setup.wifi_begin)
+_sta = None
+_next_ms = 0
+_t_connect = 0
+_fails = 0
+_subs = []
+
+stats = {"connects": 0, "fails": 0, "drops": 0, "checks": 0, "last_up_ms": 0, "backoff_ms": 0}
+
+def subscribe(fn):
+    """fn(evento) con evento "up" o "down"."""
+    _subs.append(fn)
+
+def _emit(ev):
+    for fn in _subs:
+        try:
+            fn(ev)
+        except Exception as e:
+            print("[wifi] Suscriptor falló en %s: %s" % (ev, e))
+
+def _jitter(ms):
+    # getrandbits(8) / 255 en [0, 1] -> factor en [1-JITTER, 1+JITTER]
+    return int(ms * (1 - JITTER + 2 * JITTER * getrandbits(8) / 255))
+
+def _connect(now):
+    global state, _sta, _t_connect, _next_ms
+    try:
+        _sta = _begin()
+    except Exception as e:
+        print("[wifi] No se pudo lanzar la conexión:", e)
+        _backoff(now)
+        return
+    state = "connecting"
+    _t_connect = now
+    _next_ms = _ticks_add(now, POLL_MS)
+
+def _backoff(now):
+    global state, _fails, _next_ms
+    _fails += 1
+    stats["fails"] += 1
+    b = _jitter(min(BACKOFF_MAX_MS, BACKOFF_MIN_MS << min(_fails - 1, 10)))
+    stats["backoff_ms"] = b
+    state = "backoff"
+    _next_ms = _ticks_add(now, b)
+
+def start(begin_fn):
+    """Arranca el supervisor y lanza el primer intento (sin esperar)."""
+    global _begin
+    _begin = begin_fn
+    if begin_fn is None:
+        return
+    _connect(_ticks_ms())
+
+def tick(now=None):
+    """Llamar en cada vuelta del bucle: solo trabaja cuando vence el siguiente paso."""
+    global state, _fails, _next_ms
+    if state == "off":
+        return False
+    if now is None:
+        now = _ticks_ms()
+    if _ticks_diff(now, _next_ms) < 0:
+        return state == "up"
+    if state == "connecting":
+        if _sta.isconnected():
+            state = "up"
+            _fails = 0
+            stats["connects"] += 1
+            stats["last_up_ms"] = now
+            _next_ms = _ticks_add(now, CHECK_MS)
+            print("[wifi] Conectado en %d ms: %s" % (_ticks_diff(now, _t_connect), _sta.ifconfig()))
+            _emit("up")
+        elif _ticks_diff(now, _t_connect) > CONNECT_TIMEOUT_MS:
+            _backoff(now)
+            print("[wifi] Sin conexión; siguiente intento en %d ms" % stats["backoff_ms"])
+        else:
+            _next_ms = _ticks_add(now, POLL_MS)
+    elif state == "up":
+        stats["checks"] += 1
+        if _sta.isconnected():
+            _next_ms = _ticks_add(now, CHECK_MS)
+        else:
+            stats["drops"] += 1
+            print("[wifi] Enlace caído")
+            _emit("down")
+            _connect(now)              # primer reintento inmediato; luego backoff
+    elif state == "backoff":
+        _connect(now)
+    return state == "up"
+
+def is_up():
+    return state == "up"
+
+def report():
+    r = dict(stats)
+    r["state"] = state
+    r["fails_in_row"] = _fails
+    return r
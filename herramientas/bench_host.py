@@ -0,0 +1,216 @@
+# bench_host.py — benchmarks en PC (CPython) de los caminos calientes de la placa
+# Ejecuta el código real de codigo/ con los shims de upy_shims y genera un informe
+# JSON para comparar entre versiones de firmware:
+#   - append_event + update_manifest   vs  tamaño del mes (filas)
+#   - load_cards                       vs  tamaño de la ACL
+#   - query_events                     vs  filtros
+#   - cloud_sync._multipart            pico de memoria vs tamaño del CSV
+#   - urequests                        throughput de parseo contra un socket local
+#
+# Uso:
+#   python3 herramientas/bench_host.py --out bench_fw7.json
+#   python3 herramientas/bench_host.py --quick
+# Comparar: diff <(jq -S . a.json) <(jq -S . b.json)
+
+import argparse, json, os, platform, shutil, socket, subprocess, sys, tempfile, threading, time, tracemalloc
+
+import upy_host
+upy_host.setup()
+
+HEADER = "timestamp,tz,checkpoint,version,raw26,site_code,user_code,nombre,autorizado,casco,score,img_path"
+
+def _timeit(fn, repeat):
+    t = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        t.append(time.perf_counter() - t0)
+    t.sort()
+    return {"min_us": t[0] * 1e6, "median_us": t[len(t) // 2] * 1e6}
+
+def _storage(root):
+    for d in ("config", "data", "media"):
+        os.makedirs(os.path.join(root, d), exist_ok=True)
+    return upy_host.load_isolated(
+        "storage_local", "storage_local_bench",
+        BASE_SD=root + "/", CONFIG_DIR=root + "/config", DATA_DIR=root + "/data",
+        MEDIA_DIR=root + "/media", CARDS_CSV=root + "/config/cards.csv")
+
+def _fill_month(db, rows):
+    path = db._events_csv_path()
+    with open(path, "w") as f:
+        f.write(HEADER + "\n")
+        for i in range(rows):
+            f.write("15-08-2025T17:30:%02d,Europe/Madrid,SALA_MAQUINAS_A,7,%d,%d,%d,Op_%d,1,%d,0.87,"
+                    "/media/20250815T173000_%d.jpg\n" % (i % 60, 52992745 + i, 100 + i % 50,
+                                                          i % 3000, i % 3000, i & 1, i))
+    return path
+
+# ---------- casos ----------
+
+def bench_append_manifest(root, sizes, repeat):
+    db = _storage(root)
+    out = []
+    for n in sizes:
+        _fill_month(db, n)
+        def one():
+            db.append_event(52992745, 148, 19828, "Juan", True, True, 0.91, "/media/x.jpg")
+            db.update_manifest()
+        r = _timeit(one, repeat)
+        r["month_rows"] = n
+        out.append(r)
+    return out
+
+def bench_load_cards(root, sizes, repeat):
+    db = _storage(root)
+    out = []
+    for n in sizes:
+        with open(db.CARDS_CSV, "w") as f:
+            f.write("site_code,user_code,nombre,enabled\n")
+            for i in range(n):
+                f.write("%d,%d,Operario_%d,%d\n" % (i % 256, i, i, 0 if i % 10 == 0 else 1))
+        r = _timeit(db.load_cards, repeat)
+        r["acl_rows"] = n
+        out.append(r)
+    return out
+
+def bench_query(root, rows, repeat):
+    db = _storage(root)
+    _fill_month(db, rows)
+    cases = {
+        "none": {},
+        "user_code": {"user_code": 42},
+        "casco": {"casco": False},
+        "site+user": {"site_code": 142, "user_code": 42},
+    }
+    out = []
+    for name, kw in cases.items():
+        r = _timeit(lambda: db.query_events(**kw), repeat)
+        r["filter"] = name
+        r["month_rows"] = rows
+        r["matches"] = len(db.query_events(**kw))
+        out.append(r)
+    return out
+
+def bench_multipart(sizes):
+    cloud = upy_host.load_isolated("cloud_sync", "cloud_sync_bench")
+    out = []
+    for n in sizes:
+        csv = (b"x" * 99 + b"\n") * (n // 100)
+        man = b'{"sha256": "00", "count": 1}'
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        body, _ct = cloud._multipart({"yyyymm": "202508"},
+                                     {"csv": ("e.csv", csv, "text/csv"),
+                                      "manifest": ("m.json", man, "application/json")})
+        dt = time.perf_counter() - t0
+        _cur, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        out.append({"csv_bytes": len(csv), "body_bytes": len(body), "peak_bytes": peak,
+                    "peak_over_csv": peak / max(1, len(csv)), "us": dt * 1e6})
+        del body, csv
+    return out
+
+class _HttpFixture:
+    """Servidor HTTP mínimo: responde con un cuerpo de tamaño fijo y cierra."""
+    def __init__(self, body_size):
+        self.body = b"a" * body_size
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(64)
+        self.port = self.sock.getsockname()[1]
+        self.stop = False
+        self.th = threading.Thread(target=self._serve, daemon=True)
+        self.th.start()
+
+    def _serve(self):
+        hdr = ("HTTP/1.1 200 OK\r\nContent-Type: application/octet-stream\r\n"
+               "X-Pad-1: aaaaaaaaaaaaaaaa\r\nX-Pad-2: bbbbbbbbbbbbbbbb\r\n"
+               "Content-Length: %d\r\nConnection: close\r\n\r\n" % len(self.body)).encode()
+        while not self.stop:
+            try:
+                c, _ = self.sock.accept()
+            except OSError:
+                return
+            try:
+                c.recv(4096)
+                c.sendall(hdr + self.body)
+            finally:
+                c.close()
+
+    def close(self):
+        self.stop = True
+        self.sock.close()
+
+def bench_urequests(body_sizes, n_req):
+    import urequests
+    out = []
+    for size in body_sizes:
+        fx = _HttpFixture(size)
+        url = "http://127.0.0.1:%d/x" % fx.port
+        try:
+            t0 = time.perf_counter()
+            for _ in range(n_req):
+                r = urequests.get(url, headers={})
+                assert len(r.content) == size
+                r.close()
+            dt = time.perf_counter() - t0
+        finally:
+            fx.close()
+        out.append({"body_bytes": size, "requests": n_req, "req_per_s": n_req / dt,
+                    "MB_per_s": size * n_req / dt / 1e6})
+    return out
+
+# ---------- main ----------
+
+def _git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=upy_host.CODIGO, stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmarks en PC de storage/sync/urequests")
+    ap.add_argument("--quick", action="store_true", help="tamaños reducidos (prueba rápida)")
+    ap.add_argument("--repeat", type=int, default=None)
+    ap.add_argument("--out", default=None)
+    a = ap.parse_args()
+
+    if a.quick:
+        month_sizes, acl_sizes, q_rows = [100, 1000], [100, 1000], 1000
+        mp_sizes, body_sizes, n_req, repeat = [10000, 100000], [256, 16384], 20, a.repeat or 3
+    else:
+        month_sizes, acl_sizes, q_rows = [100, 1000, 5000, 20000], [100, 1000, 10000, 50000], 5000
+        mp_sizes, body_sizes, n_req, repeat = [10000, 100000, 1000000], [256, 16384, 262144], 100, a.repeat or 7
+
+    import storage_local
+    root = tempfile.mkdtemp(prefix="bench_")
+    try:
+        report = {
+            "meta": {
+                "git_rev": _git_rev(),
+                "fw_version": storage_local.FW_VERSION,
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "quick": a.quick,
+                "repeat": repeat,
+            },
+            "append_event+update_manifest": bench_append_manifest(root, month_sizes, repeat),
+            "load_cards": bench_load_cards(root, acl_sizes, repeat),
+            "query_events": bench_query(root, q_rows, repeat),
+            "multipart": bench_multipart(mp_sizes),
+            "urequests": bench_urequests(body_sizes, n_req),
+        }
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    txt = json.dumps(report, indent=2, sort_keys=True)
+    print(txt)
+    if a.out:
+        with open(a.out, "w") as f:
+            f.write(txt)
+
+if __name__ == "__main__":
+    sys.exit(main())
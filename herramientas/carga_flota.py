@@ -0,0 +1,166 @@
+# carga_flota.py — generador de carga: N torniquetes simulados contra ingest_server
+# Cada dispositivo ejecuta el código real de la placa (storage_local, cloud_sync,
+# cards_sync) en CPython, con su propia "SD" en una carpeta temporal:
+#   append_event + update_manifest  ->  cloud_sync.upload_month  (cada --upload-every)
+#   cards_sync.ensure_cards_updated                              (cada --poll-every)
+#
+# Uso:
+#   python3 herramientas/carga_flota.py --devices 200 --events 30
+#   python3 herramientas/carga_flota.py --devices 50 --url http://127.0.0.1:8080 --key XyZ123
+# Sin --url arranca un ingest_server interno en un puerto libre.
+# Informe (JSON): peticiones/s, latencias por endpoint, tamaño de payload y coste de
+# verificación en el servidor.
+
+import argparse, json, os, random, shutil, sys, tempfile, threading, time
+
+import upy_host
+upy_host.setup()
+
+import ingest_server
+
+def _pct(vals, p):
+    if not vals:
+        return 0.0
+    vals = sorted(vals)
+    return vals[min(len(vals) - 1, int(p / 100.0 * len(vals)))]
+
+class Device:
+    def __init__(self, idx, root, base_url, key, cards_src):
+        self.idx = idx
+        self.root = os.path.join(root, "gate%03d" % idx)
+        cfg_dir = os.path.join(self.root, "config")
+        data_dir = os.path.join(self.root, "data")
+        media_dir = os.path.join(self.root, "media")
+        for d in (cfg_dir, data_dir, media_dir):
+            os.makedirs(d, exist_ok=True)
+        server_json = os.path.join(cfg_dir, "server.json")
+        with open(server_json, "w") as f:
+            json.dump({
+                "function_url": base_url + ingest_server.UPLOAD_PATH,
+                "cards_url": base_url + ingest_server.MANIFEST_PATH,
+                "edge_api_key": key,
+            }, f)
+        shutil.copy(cards_src, os.path.join(cfg_dir, "cards.csv"))
+
+        tag = "_dev%03d" % idx
+        self.db = upy_host.load_isolated(
+            "storage_local", "storage_local" + tag,
+            BASE_SD=self.root + "/", CONFIG_DIR=cfg_dir, DATA_DIR=data_dir,
+            MEDIA_DIR=media_dir, CARDS_CSV=os.path.join(cfg_dir, "cards.csv"),
+            SITE_ID_NAME="GATE_%03d" % idx)
+        self.cloud = upy_host.load_isolated(
+            "cloud_sync", "cloud_sync" + tag, CONFIG_PATH=server_json, DATA_DIR=data_dir)
+        self.cards = upy_host.load_isolated(
+            "cards_sync", "cards_sync" + tag, CFG_PATH=server_json,
+            CARDS_PATH=os.path.join(cfg_dir, "cards.csv"),
+            CARDS_TMP=os.path.join(cfg_dir, "cards.csv.tmp"),
+            STATE_PATH=os.path.join(cfg_dir, "cards_state.json"))
+        self.db.init_storage()
+        self.lat = {"upload": [], "manifest": [], "local": []}
+        self.payload = []
+        self.errors = 0
+        self.unverified = 0
+
+    def run(self, events, upload_every, poll_every, think_ms, rnd):
+        yyyymm = self.db._current_month_tag()
+        for i in range(1, events + 1):
+            t0 = time.perf_counter()
+            casco = rnd.random() < 0.8
+            self.db.append_event(rnd.getrandbits(26), 148, 19828, "Juan", True, casco,
+                                 rnd.uniform(0.4, 1.0), "/media/x_%d.jpg" % i)
+            self.db.update_manifest()
+            self.lat["local"].append(time.perf_counter() - t0)
+
+            if i % upload_every == 0 or i == events:
+                csv = os.path.join(self.db.DATA_DIR, "events_%s.csv" % yyyymm)
+                man = os.path.join(self.db.DATA_DIR, "events_%s.manifest.json" % yyyymm)
+                self.payload.append(os.path.getsize(csv) + os.path.getsize(man))
+                t0 = time.perf_counter()
+                resp = self.cloud.upload_month(yyyymm)
+                self.lat["upload"].append(time.perf_counter() - t0)
+                if not resp.get("ok"):
+                    self.errors += 1
+                elif not resp.get("verified"):
+                    self.unverified += 1
+
+            if i % poll_every == 0:
+                t0 = time.perf_counter()
+                try:
+                    self.cards.ensure_cards_updated(verbose=False)
+                except Exception:
+                    self.errors += 1
+                self.lat["manifest"].append(time.perf_counter() - t0)
+
+            if think_ms:
+                time.sleep(rnd.uniform(0, 2 * think_ms) / 1000.0)
+
+def main():
+    here = os.path.dirname(os.path.abspath(__file__))
+    ap = argparse.ArgumentParser(description="Simula N torniquetes contra las Edge Functions")
+    ap.add_argument("--devices", type=int, default=20)
+    ap.add_argument("--events", type=int, default=20, help="eventos por dispositivo")
+    ap.add_argument("--upload-every", type=int, default=5)
+    ap.add_argument("--poll-every", type=int, default=10)
+    ap.add_argument("--think-ms", type=int, default=20, help="pausa media entre eventos")
+    ap.add_argument("--url", default=None, help="servidor existente (p.ej. http://127.0.0.1:8080)")
+    ap.add_argument("--key", default="loadtest")
+    ap.add_argument("--cards", default=os.path.join(here, "..", "codigo", "config", "cards.csv"))
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--no-gzip", action="store_true", help="el servidor local no acepta CSV comprimido")
+    ap.add_argument("--out", default=None, help="guardar el informe JSON aquí")
+    a = ap.parse_args()
+
+    srv = None
+    if a.url is None:
+        srv = ingest_server.make_server("127.0.0.1", 0, key=a.key, cards_path=os.path.abspath(a.cards),
+                                        accept_gzip=not a.no_gzip)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        base_url = "http://127.0.0.1:%d" % srv.server_address[1]
+    else:
+        base_url = a.url.rstrip("/")
+
+    root = tempfile.mkdtemp(prefix="flota_")
+    try:
+        devs = [Device(i, root, base_url, a.key, a.cards) for i in range(a.devices)]
+        threads = [threading.Thread(target=d.run, args=(a.events, a.upload_every, a.poll_every,
+                                                        a.think_ms, random.Random(a.seed + d.idx)))
+                   for d in devs]
+        t0 = time.perf_counter()
+        for t in threads: t.start()
+        for t in threads: t.join()
+        wall = time.perf_counter() - t0
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    up = [x for d in devs for x in d.lat["upload"]]
+    mf = [x for d in devs for x in d.lat["manifest"]]
+    lc = [x for d in devs for x in d.lat["local"]]
+    pl = [x for d in devs for x in d.payload]
+    report = {
+        "devices": a.devices,
+        "events_per_device": a.events,
+        "wall_s": wall,
+        "client": {
+            "uploads": len(up),
+            "uploads_per_s": len(up) / wall,
+            "manifest_polls": len(mf),
+            "upload_ms_p50": _pct(up, 50) * 1000, "upload_ms_p95": _pct(up, 95) * 1000,
+            "poll_ms_p50": _pct(mf, 50) * 1000, "poll_ms_p95": _pct(mf, 95) * 1000,
+            "local_event_ms_p50": _pct(lc, 50) * 1000,
+            "payload_bytes_avg": (sum(pl) / len(pl)) if pl else 0,
+            "payload_bytes_max": max(pl) if pl else 0,
+            "errors": sum(d.errors for d in devs),
+            "unverified": sum(d.unverified for d in devs),
+        },
+    }
+    if srv is not None:
+        report["server"] = srv.stats.snapshot()
+        srv.shutdown()
+    txt = json.dumps(report, indent=2)
+    print(txt)
+    if a.out:
+        with open(a.out, "w") as f:
+            f.write(txt)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,301 @@
+# evaluar_modelo.py — evaluación offline de model/trained.tflite y barrido de umbrales
+# Recorre las fotos de prueba (/media/*.jpg) con su etiqueta del CSV de eventos
+# (columna casco, o un CSV propio revisado a mano con --labels), ejecuta el modelo
+# en lotes y reproduce fomo_post_process + deteccion.decide (la misma lógica que la
+# placa) para cada combinación de MIN_CONFIDENCE, MAX_FRAMES_CHECK y early stop.
+# Salida: frente de Pareto precisión/latencia (+ JSON completo con --out).
+#
+# Requisitos (PC): numpy, Pillow y tflite_runtime (o tensorflow)
+# Uso:
+#   python3 herramientas/evaluar_modelo.py --media /ruta/SD/media --events /ruta/SD/data/events_*.csv
+#   python3 herramientas/evaluar_modelo.py ... --metrics /ruta/SD/data/metrics_202508.json --out pareto.json
+#
+# Notas:
+#   - La etiqueta del CSV es la decisión del propio dispositivo, no una verdad de campo:
+#     para medir precisión real usa --labels (CSV img,casco revisado).
+#   - Cada foto es un único frame; los frames 2..N de una pasada se simulan con
+#     pequeños desplazamientos y cambios de ganancia (--frames, semilla fija).
+#   - Las miniaturas (política "thumb" de storage_local) no son 240x240 y se omiten
+#     salvo --include-thumbs.
+
+import argparse, csv, glob, json, os, random, sys, time
+
+import upy_host
+upy_host.setup()
+import deteccion
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:
+    sys.exit("Faltan dependencias: pip install numpy pillow tflite-runtime")
+
+def _interpreter(model_path, threads):
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tensorflow.lite import Interpreter
+        except ImportError:
+            sys.exit("Falta tflite_runtime o tensorflow")
+    return Interpreter(model_path=model_path, num_threads=threads)
+
+# ---------- dataset ----------
+
+def load_labels(events_csvs, labels_csv=None):
+    """{nombre_jpg: casco(0/1)} desde los CSV de eventos (o un CSV img,casco)."""
+    out = {}
+    for path in events_csvs:
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                img = (row.get("img_path") or "").strip()
+                if img and row.get("autorizado") == "1":
+                    out[os.path.basename(img)] = int(row.get("casco") or 0)
+    if labels_csv:
+        with open(labels_csv, newline="") as f:
+            for row in csv.reader(f):
+                if len(row) >= 2 and row[1].strip() in ("0", "1"):
+                    out[os.path.basename(row[0].strip())] = int(row[1])
+    return out
+
+def load_images(media_dir, labels, include_thumbs):
+    items, skipped = [], 0
+    for path in sorted(glob.glob(os.path.join(media_dir, "*.jpg"))):
+        name = os.path.basename(path)
+        if name not in labels:
+            continue
+        img = Image.open(path).convert("L")
+        if img.size != (240, 240):
+            if not include_thumbs:
+                skipped += 1
+                continue
+            img = img.resize((240, 240), Image.BILINEAR)
+        items.append((name, np.asarray(img, dtype=np.uint8), labels[name]))
+    return items, skipped
+
+def make_frames(gray, n, rng):
+    """Frame 0 = foto original; el resto, variaciones pequeñas (como frames sucesivos)."""
+    frames = [gray]
+    for _ in range(n - 1):
+        dx, dy = rng.randint(-6, 6), rng.randint(-6, 6)
+        g = np.roll(np.roll(gray, dy, axis=0), dx, axis=1).astype(np.float32)
+        g = np.clip(g * rng.uniform(0.9, 1.1) + rng.uniform(-8, 8), 0, 255)
+        frames.append(g.astype(np.uint8))
+    return frames
+
+# ---------- modelo ----------
+
+class Runner:
+    def __init__(self, model_path, batch, threads):
+        self.it = _interpreter(model_path, threads)
+        self.inp = self.it.get_input_details()[0]
+        self.out = self.it.get_output_details()[0]
+        _, self.h, self.w, self.c = self.inp["shape"]
+        self.batch = 1
+        if batch > 1:
+            try:
+                self.it.resize_tensor_input(self.inp["index"], [batch, self.h, self.w, self.c])
+                self.batch = batch
+            except Exception as e:
+                print("Lotes no soportados por el modelo (%s): batch=1" % e)
+        self.it.allocate_tensors()
+        self.inp = self.it.get_input_details()[0]
+        self.out = self.it.get_output_details()[0]
+        self.invoke_s = 0.0
+        self.invokes = 0
+
+    def _prep(self, gray):
+        img = Image.fromarray(gray).resize((self.w, self.h), Image.BILINEAR)
+        x = np.asarray(img, dtype=np.float32) / 255.0      # normalización 0..1 (como ml.Model)
+        if self.c == 3:
+            x = np.stack([x] * 3, axis=-1)
+        else:
+            x = x[..., None]
+        dt = self.inp["dtype"]
+        if dt in (np.int8, np.uint8):
+            scale, zp = self.inp["quantization"]
+            info = np.iinfo(dt)
+            x = np.clip(np.round(x / scale + zp), info.min, info.max)
+        return x.astype(dt)
+
+    def predict(self, grays):
+        """Devuelve heatmaps float (N, oh, ow, oc) en 0..1."""
+        outs = []
+        for i in range(0, len(grays), self.batch):
+            chunk = [self._prep(g) for g in grays[i:i + self.batch]]
+            n = len(chunk)
+            while len(chunk) < self.batch:
+                chunk.append(np.zeros_like(chunk[0]))
+            self.it.set_tensor(self.inp["index"], np.stack(chunk))
+            t0 = time.perf_counter()
+            self.it.invoke()
+            self.invoke_s += time.perf_counter() - t0
+            self.invokes += 1
+            y = self.it.get_tensor(self.out["index"])[:n]
+            if self.out["dtype"] in (np.int8, np.uint8):
+                scale, zp = self.out["quantization"]
+                y = (y.astype(np.float32) - zp) * scale
+            outs.append(y.astype(np.float32))
+        return np.concatenate(outs, axis=0)
+
+# ---------- post-proceso (réplica de main.fomo_post_process) ----------
+
+def _blobs(mask, connectivity):
+    oh, ow = mask.shape
+    seen = np.zeros_like(mask, dtype=bool)
+    nb = ((1, 0), (-1, 0), (0, 1), (0, -1))
+    if connectivity == 8:
+        nb = nb + ((1, 1), (1, -1), (-1, 1), (-1, -1))
+    for y0 in range(oh):
+        for x0 in range(ow):
+            if not mask[y0, x0] or seen[y0, x0]:
+                continue
+            stack = [(y0, x0)]; seen[y0, x0] = True
+            xs, ys = [], []
+            while stack:
+                y, x = stack.pop()
+                xs.append(x); ys.append(y)
+                for dy, dx in nb:
+                    yy, xx = y + dy, x + dx
+                    if 0 <= yy < oh and 0 <= xx < ow and mask[yy, xx] and not seen[yy, xx]:
+                        seen[yy, xx] = True
+                        stack.append((yy, xx))
+            x, y = min(xs), min(ys)
+            yield (x, y, max(xs) - x + 1, max(ys) - y + 1)
+
+def fomo_post_process(heat, thr_u8, roi=(0, 0, 240, 240), connectivity=4):
+    oh, ow, oc = heat.shape
+    scale = min(roi[2] / ow, roi[3] / oh)
+    x_offset = ((roi[2] - (ow * scale)) / 2) + roi[0]
+    y_offset = ((roi[3] - (oh * scale)) / 2) + roi[1]
+    l = [[] for _ in range(oc)]
+    for i in range(oc):
+        img = np.clip(heat[:, :, i] * 255, 0, 255).astype(np.uint8)
+        mask = img >= thr_u8
+        for (x, y, w, h) in _blobs(mask, connectivity):
+            sub = img[y:y + h, x:x + w]
+            score = float(sub[sub >= thr_u8].mean()) / 255.0
+            l[i].append((int(x * scale + x_offset), int(y * scale + y_offset),
+                         int(w * scale), int(h * scale), score))
+    return l
+
+# ---------- barrido ----------
+
+def frame_ms_from_metrics(path):
+    with open(path) as f:
+        st = json.load(f).get("stages", {})
+    ms = 0.0
+    for k in ("snapshot", "predict", "postproc"):
+        v = st.get(k)
+        if v and v.get("n"):
+            ms += v["sum_ms"] / v["n"]
+    return ms or None
+
+def pareto(points):
+    front, best = [], -1.0
+    for p in sorted(points, key=lambda p: (p["latency_ms"], -p["accuracy"])):
+        if p["accuracy"] > best:
+            front.append(p); best = p["accuracy"]
+    return front
+
+def sweep(heats, labels, idx_casco, idx_nocasco, confs, max_frames_list, frame_ms, connectivity):
+    points = []
+    n_img = len(labels)
+    for conf in confs:
+        thr = int(conf * 255 + 0.5)
+        # Conteos por frame (una vez por umbral): counts[img][frame]
+        counts = [[deteccion.count_frame(fomo_post_process(h, thr, connectivity=connectivity),
+                                         idx_casco, idx_nocasco, conf) for h in hs] for hs in heats]
+        for mf in max_frames_list:
+            for es in (True, False):
+                ok = used = tp_no = n_no = tp_si = n_si = 0
+                for k in range(n_img):
+                    it = iter(counts[k])
+                    pred, _score, _rect, frames = deteccion.decide(lambda: next(it), mf, es, conf)
+                    used += frames
+                    lab = labels[k]
+                    ok += int(pred) == lab
+                    if lab == 0:
+                        n_no += 1; tp_no += (not pred)
+                    else:
+                        n_si += 1; tp_si += bool(pred)
+                avg_frames = used / n_img
+                points.append({
+                    "min_confidence": conf, "max_frames": mf, "early_stop": es,
+                    "accuracy": ok / n_img,
+                    "nocasco_recall": (tp_no / n_no) if n_no else None,
+                    "casco_recall": (tp_si / n_si) if n_si else None,
+                    "avg_frames": avg_frames,
+                    "latency_ms": avg_frames * frame_ms,
+                })
+    return points
+
+def main():
+    here = os.path.dirname(os.path.abspath(__file__))
+    model_dir = os.path.join(here, "..", "codigo", "model")
+    ap = argparse.ArgumentParser(description="Evaluación offline y barrido de umbrales del modelo FOMO")
+    ap.add_argument("--model", default=os.path.join(model_dir, "trained.tflite"))
+    ap.add_argument("--labels-txt", default=os.path.join(model_dir, "labels.txt"))
+    ap.add_argument("--media", required=True, help="carpeta con las fotos de prueba (/media)")
+    ap.add_argument("--events", nargs="+", required=True, help="CSV de eventos (events_YYYYMM.csv)")
+    ap.add_argument("--labels", default=None, help="CSV img,casco revisado a mano (prevalece)")
+    ap.add_argument("--include-thumbs", action="store_true")
+    ap.add_argument("--frames", type=int, default=8, help="frames simulados por pasada")
+    ap.add_argument("--confs", default="0.25,0.30,0.35,0.40,0.45,0.50,0.60,0.70")
+    ap.add_argument("--max-frames", default="1,2,3,4,5,6,8")
+    ap.add_argument("--frame-ms", type=float, default=100.0, help="coste por frame en la placa")
+    ap.add_argument("--metrics", default=None, help="metrics_YYYYMM.json: coste por frame medido")
+    ap.add_argument("--connectivity", type=int, choices=(4, 8), default=4)
+    ap.add_argument("--batch", type=int, default=32)
+    ap.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--out", default=None)
+    a = ap.parse_args()
+
+    names = [l.rstrip("\n") for l in open(a.labels_txt)]
+    idx_casco, idx_nocasco = names.index("casco"), names.index("nocasco")
+    frame_ms = a.frame_ms
+    if a.metrics:
+        frame_ms = frame_ms_from_metrics(a.metrics) or frame_ms
+
+    events = [p for pat in a.events for p in glob.glob(pat)]
+    labels = load_labels(events, a.labels)
+    items, skipped = load_images(a.media, labels, a.include_thumbs)
+    if not items:
+        sys.exit("No hay fotos etiquetadas en %s" % a.media)
+    print("Fotos: %d (omitidas %d miniaturas), frames/pasada: %d, coste/frame: %.1f ms"
+          % (len(items), skipped, a.frames, frame_ms))
+
+    rng = random.Random(a.seed)
+    runner = Runner(a.model, a.batch, a.threads)
+    frames = [f for (_n, g, _l) in items for f in make_frames(g, a.frames, rng)]
+    t0 = time.perf_counter()
+    heat = runner.predict(frames)
+    print("Inferencia: %d frames en %.2f s (%d invocaciones, lote %d)"
+          % (len(frames), time.perf_counter() - t0, runner.invokes, runner.batch))
+    heats = [heat[i * a.frames:(i + 1) * a.frames] for i in range(len(items))]
+
+    confs = [float(x) for x in a.confs.split(",")]
+    mfs = [int(x) for x in a.max_frames.split(",") if int(x) <= a.frames]
+    points = sweep(heats, [l for (_n, _g, l) in items], idx_casco, idx_nocasco,
+                   confs, mfs, frame_ms, a.connectivity)
+    front = pareto(points)
+
+    print("\nFrente de Pareto (precisión vs latencia):")
+    print("  conf  frames  early  precisión  recall_nocasco  frames_med  latencia_ms")
+    for p in front:
+        print("  %.2f  %6d  %5s  %9.3f  %14s  %10.2f  %11.1f" % (
+            p["min_confidence"], p["max_frames"], p["early_stop"], p["accuracy"],
+            "%.3f" % p["nocasco_recall"] if p["nocasco_recall"] is not None else "-",
+            p["avg_frames"], p["latency_ms"]))
+    cur = [p for p in points if abs(p["min_confidence"] - 0.40) < 1e-9 and p["max_frames"] == 8 and p["early_stop"]]
+    if cur:
+        print("\nConfiguración actual (0.40, 8, early stop): precisión %.3f, %.1f ms"
+              % (cur[0]["accuracy"], cur[0]["latency_ms"]))
+    if a.out:
+        with open(a.out, "w") as f:
+            json.dump({"images": len(items), "frames_per_pass": a.frames, "frame_ms": frame_ms,
+                       "points": points, "pareto": front}, f, indent=2)
+
+if __name__ == "__main__":
+    sys.exit(main())
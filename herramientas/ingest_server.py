@@ -0,0 +1,286 @@
+# ingest_server.py — implementación local de referencia de las Edge Functions
+#   POST /functions/v1/upload-month    (multipart: yyyymm, csv, manifest; CSV opcionalmente en gzip)
+#   GET  /functions/v1/cards-manifest  ({version, sha256, url, size, updated_at})
+#   GET  /cards.csv                    (ACL servida a cards_sync)
+#   GET  /stats                        (contadores y coste de verificación)
+#
+# Uso (en el PC):
+#   python3 herramientas/ingest_server.py --port 8080 --key XyZ123 --cards codigo/config/cards.csv
+# server.json de la placa:
+#   "function_url": "http://<ip>:8080/functions/v1/upload-month",
+#   "cards_url":    "http://<ip>:8080/functions/v1/cards-manifest"
+#
+# Las respuestas de upload-month anuncian "X-Upload-Encodings: gzip"; a partir de ahí
+# cloud_sync manda el CSV comprimido y aquí se descomprime antes de verificar el sha
+# (el del manifest es siempre el del CSV sin comprimir). Con --no-gzip se anuncia
+# "identity" y un CSV comprimido se rechaza con 415.
+
+import argparse, gzip, hashlib, json, os, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+UPLOAD_PATH   = "/functions/v1/upload-month"
+MANIFEST_PATH = "/functions/v1/cards-manifest"
+CARDS_PATH    = "/cards.csv"
+
+# ---------- multipart ----------
+
+def parse_multipart(body, content_type):
+    """Devuelve {name: (filename|None, bytes)} a partir de un multipart/form-data."""
+    boundary = None
+    for part in content_type.split(";"):
+        part = part.strip()
+        if part.startswith("boundary="):
+            boundary = part[len("boundary="):].strip('"')
+    if not boundary:
+        raise ValueError("multipart sin boundary")
+    delim = b"--" + boundary.encode()
+    out = {}
+    for chunk in body.split(delim)[1:]:
+        if chunk.startswith(b"--"):
+            break
+        chunk = chunk[2:] if chunk.startswith(b"\r\n") else chunk
+        head, sep, data = chunk.partition(b"\r\n\r\n")
+        if not sep:
+            continue
+        if data.endswith(b"\r\n"):
+            data = data[:-2]
+        name = filename = None
+        for line in head.split(b"\r\n"):
+            k, _, v = line.decode("utf-8", "replace").partition(":")
+            if k.strip().lower() != "content-disposition":
+                continue
+            for item in v.split(";"):
+                item = item.strip()
+                if item.startswith("name="):
+                    name = item[5:].strip('"')
+                elif item.startswith("filename="):
+                    filename = item[9:].strip('"')
+        if name is not None:
+            out[name] = (filename, data)
+    return out
+
+# ---------- verificación ----------
+
+class UnsupportedEncoding(Exception):
+    pass
+
+def verify_month(fields, accept_gzip=True):
+    """Comprueba sha256 y nº de filas del CSV contra su manifest (como la Edge Function)."""
+    yyyymm = fields.get("yyyymm", (None, b""))[1].decode()
+    csv = fields.get("csv", (None, b""))[1]
+    enc = fields.get("csv_encoding", (None, b"identity"))[1].decode()
+    if enc == "gzip" and accept_gzip:
+        csv = gzip.decompress(csv)
+    elif enc != "identity":
+        raise UnsupportedEncoding(enc)
+    man = json.loads(fields.get("manifest", (None, b"{}"))[1] or b"{}")
+    sha = hashlib.sha256(csv).hexdigest()
+    rows = max(0, len(csv.splitlines()) - 1)
+    ok_sha = (sha == man.get("sha256"))
+    ok_rows = (rows == man.get("count"))
+    ok_month = (not man.get("month")) or man.get("month") == yyyymm
+    res = {
+        "ok": True,
+        "verified": ok_sha and ok_rows and ok_month,
+        "yyyymm": yyyymm,
+        "rows": rows,
+        "sha256": sha,
+        "checkpoint": man.get("checkpoint"),
+    }
+    if not ok_sha:
+        res["error"] = "sha_mismatch"
+    elif not ok_rows:
+        res["error"] = "count_mismatch"
+    elif not ok_month:
+        res["error"] = "month_mismatch"
+    return res, csv, man
+
+# ---------- servidor ----------
+
+class IngestStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.t0 = time.time()
+        self.req = {}          # ruta -> nº peticiones
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.verified = 0
+        self.rejected = 0
+        self.verify_s = 0.0    # parseo multipart + (gunzip) + sha256 + conteo
+        self.verify_max_s = 0.0
+        self.gzip = 0          # subidas con el CSV comprimido
+        self.csv_raw = 0       # bytes de CSV verificados (sin comprimir)
+        self.csv_wire = 0      # bytes de CSV recibidos (tal cual llegaron)
+
+    def note(self, route, nin, nout):
+        with self.lock:
+            self.req[route] = self.req.get(route, 0) + 1
+            self.bytes_in += nin
+            self.bytes_out += nout
+
+    def note_csv(self, raw, wire, gz):
+        with self.lock:
+            self.csv_raw += raw
+            self.csv_wire += wire
+            if gz: self.gzip += 1
+
+    def note_verify(self, ok, dt):
+        with self.lock:
+            if ok: self.verified += 1
+            else: self.rejected += 1
+            self.verify_s += dt
+            self.verify_max_s = max(self.verify_max_s, dt)
+
+    def snapshot(self):
+        with self.lock:
+            el = max(1e-9, time.time() - self.t0)
+            n = self.verified + self.rejected
+            return {
+                "elapsed_s": el,
+                "requests": dict(self.req),
+                "req_per_s": sum(self.req.values()) / el,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "uploads_verified": self.verified,
+                "uploads_rejected": self.rejected,
+                "verify_ms_avg": (self.verify_s / n * 1000) if n else 0.0,
+                "verify_ms_max": self.verify_max_s * 1000,
+                "verify_cpu_share": self.verify_s / el,
+                "uploads_gzip": self.gzip,
+                "csv_bytes_raw": self.csv_raw,
+                "csv_bytes_wire": self.csv_wire,
+                "csv_ratio": (self.csv_wire / self.csv_raw) if self.csv_raw else 1.0,
+            }
+
+class IngestHandler(BaseHTTPRequestHandler):
+    server_version = "IngestRef/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def _send(self, code, body, ctype="application/json", headers=None):
+        if not isinstance(body, (bytes, bytearray)):
+            body = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+        self.close_connection = True
+        return len(body)
+
+    def _auth(self):
+        key = self.server.key
+        return (not key) or self.headers.get("x-edge-key") == key
+
+    def do_GET(self):
+        srv = self.server
+        route = self.path.split("?", 1)[0]
+        if route == MANIFEST_PATH:
+            if not self._auth():
+                return srv.stats.note(route, 0, self._send(401, {"error": "unauthorized"}))
+            data = srv.cards_bytes()
+            st = os.stat(srv.cards_path)
+            # urequests no incluye el puerto en Host: se añade el del servidor
+            host = (self.headers.get("Host") or srv.server_address[0]).split(":")[0]
+            host = "%s:%d" % (host, srv.server_address[1])
+            body = {
+                "version": str(int(st.st_mtime)),
+                "sha256": hashlib.sha256(data).hexdigest(),
+                "url": "http://%s%s" % (host, CARDS_PATH),
+                "size": len(data),
+                "updated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(st.st_mtime)),
+            }
+            return srv.stats.note(route, 0, self._send(200, body))
+        if route == CARDS_PATH:
+            return srv.stats.note(route, 0, self._send(200, srv.cards_bytes(), "text/csv"))
+        if route == "/stats":
+            return self._send(200, srv.stats.snapshot())
+        return self._send(404, {"error": "not_found"})
+
+    def do_POST(self):
+        srv = self.server
+        route = self.path.split("?", 1)[0]
+        n = int(self.headers.get("Content-Length", "0"))
+        body = self.rfile.read(n)
+        if route != UPLOAD_PATH:
+            return srv.stats.note(route, n, self._send(404, {"error": "not_found"}))
+        enc = {"X-Upload-Encodings": "gzip" if srv.accept_gzip else "identity"}
+        if not self._auth():
+            return srv.stats.note(route, n, self._send(401, {"ok": False, "error": "unauthorized"}, headers=enc))
+        t0 = time.perf_counter()
+        try:
+            fields = parse_multipart(body, self.headers.get("Content-Type", ""))
+            res, csv, man = verify_month(fields, srv.accept_gzip)
+        except UnsupportedEncoding as e:
+            srv.stats.note_verify(False, time.perf_counter() - t0)
+            return srv.stats.note(route, n, self._send(415, {"ok": False, "error": "unsupported_encoding:%s" % e},
+                                                       headers=enc))
+        except Exception as e:
+            srv.stats.note_verify(False, time.perf_counter() - t0)
+            return srv.stats.note(route, n, self._send(400, {"ok": False, "error": "bad_request:%s" % e},
+                                                       headers=enc))
+        srv.stats.note_verify(res["verified"], time.perf_counter() - t0)
+        srv.stats.note_csv(len(csv), len(fields["csv"][1]), "csv_encoding" in fields)
+        if res["verified"] and srv.store_dir:
+            d = os.path.join(srv.store_dir, str(man.get("checkpoint") or "unknown"))
+            os.makedirs(d, exist_ok=True)
+            with open(os.path.join(d, "events_%s.csv" % res["yyyymm"]), "wb") as f:
+                f.write(csv)
+        return srv.stats.note(route, n, self._send(200, res, headers=enc))
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, fmt, *args)
+
+class IngestServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, addr, key="", cards_path=None, store_dir=None, verbose=False, accept_gzip=True):
+        ThreadingHTTPServer.__init__(self, addr, IngestHandler)
+        self.key = key
+        self.accept_gzip = accept_gzip
+        self.cards_path = cards_path
+        self.store_dir = store_dir
+        self.verbose = verbose
+        self.stats = IngestStats()
+        self._cards = (None, None)
+
+    def cards_bytes(self):
+        # Cachea el CSV hasta que cambie su mtime
+        mt = os.stat(self.cards_path).st_mtime
+        if self._cards[0] != mt:
+            with open(self.cards_path, "rb") as f:
+                self._cards = (mt, f.read())
+        return self._cards[1]
+
+def make_server(host="127.0.0.1", port=0, key="", cards_path=None, store_dir=None, verbose=False,
+                accept_gzip=True):
+    """Crea el servidor (port=0 -> puerto libre); arrancar con serve_forever() en un hilo."""
+    return IngestServer((host, port), key=key, cards_path=cards_path, store_dir=store_dir, verbose=verbose,
+                        accept_gzip=accept_gzip)
+
+def main():
+    here = os.path.dirname(os.path.abspath(__file__))
+    ap = argparse.ArgumentParser(description="Edge Functions de referencia (upload-month / cards-manifest)")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=8080)
+    ap.add_argument("--key", default="", help="x-edge-key esperada (vacío = no comprobar)")
+    ap.add_argument("--cards", default=os.path.join(here, "..", "codigo", "config", "cards.csv"))
+    ap.add_argument("--store", default=None, help="carpeta donde guardar los CSV verificados")
+    ap.add_argument("--no-gzip", action="store_true", help="no anunciar ni aceptar CSV comprimido")
+    ap.add_argument("-v", "--verbose", action="store_true")
+    a = ap.parse_args()
+    srv = make_server(a.host, a.port, a.key, os.path.abspath(a.cards), a.store, a.verbose,
+                      accept_gzip=not a.no_gzip)
+    print("Ingest de referencia en http://%s:%d (%s, %s)" % (a.host, a.port, UPLOAD_PATH, MANIFEST_PATH))
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(srv.stats.snapshot(), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# mock_bucket.py — servidor local que imita el bucket de fotos (Supabase Storage)
+# Uso (en el PC):
+#   python3 herramientas/mock_bucket.py --port 8081 --dir /tmp/bucket --key XyZ123
+# y en /config/server.json de la placa:
+#   "images_url": "http://<ip-del-pc>:8081/storage/v1/object/proof-images",
+#   "images_key": "XyZ123"
+#
+# Acepta POST/PUT /storage/v1/object/<bucket>/<ruta>.jpg autenticados como Supabase
+# Storage ("Authorization: Bearer <clave>" y "apikey: <clave>"; x-edge-key no vale),
+# guarda el JPEG en --dir y muestra el caudal recibido (para comprobar el límite bytes/min).
+
+import argparse, os, time, json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = "/storage/v1/object/"
+
+class BucketHandler(BaseHTTPRequestHandler):
+    server_version = "MockBucket/1.0"
+
+    def _reply(self, code, obj):
+        body = json.dumps(obj).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _store(self):
+        srv = self.server
+        if srv.key and (self.headers.get("Authorization") != "Bearer " + srv.key or
+                        self.headers.get("apikey") != srv.key):
+            return self._reply(401, {"error": "unauthorized"})
+        if not self.path.startswith(PREFIX):
+            return self._reply(404, {"error": "not_found"})
+        obj = self.path[len(PREFIX):].lstrip("/")
+        if ".." in obj.split("/"):
+            return self._reply(400, {"error": "bad_path"})
+        n = int(self.headers.get("Content-Length", "0"))
+        data = self.rfile.read(n)
+        if not data.startswith(b"\xff\xd8"):
+            return self._reply(400, {"error": "not_jpeg"})
+        dst = os.path.join(srv.root, obj)
+        exists = os.path.exists(dst)
+        if exists and self.headers.get("x-upsert", "").lower() != "true":
+            return self._reply(409, {"error": "duplicate"})
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        with open(dst, "wb") as f:
+            f.write(data)
+
+        now = time.time()
+        srv.log_rx.append((now, len(data)))
+        srv.log_rx = [(t, b) for (t, b) in srv.log_rx if now - t <= 60]
+        bpm = sum(b for (_t, b) in srv.log_rx)
+        print("[bucket] %s (%d B, %s) último minuto: %d B"
+              % (obj, len(data), "upsert" if exists else "nuevo", bpm))
+        return self._reply(200, {"Key": obj})
+
+    do_POST = _store
+    do_PUT = _store
+
+    def log_message(self, fmt, *args):
+        pass
+
+def main():
+    ap = argparse.ArgumentParser(description="Bucket de fotos simulado")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=8081)
+    ap.add_argument("--dir", default="bucket_data")
+    ap.add_argument("--key", default="", help="clave esperada en Authorization/apikey (vacío = no comprobar)")
+    a = ap.parse_args()
+
+    srv = ThreadingHTTPServer((a.host, a.port), BucketHandler)
+    srv.root = a.dir
+    srv.key = a.key
+    srv.log_rx = []
+    os.makedirs(a.dir, exist_ok=True)
+    print("Bucket simulado en http://%s:%d%s<bucket>/... -> %s" % (a.host, a.port, PREFIX, a.dir))
+    try:
+        srv.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# tls_bench.py — handshake TLS completo vs reanudado con el urequests de la placa
+# Levanta un servidor HTTPS local (certificado autofirmado generado con openssl) y hace
+# N peticiones con codigo/urequests.py: primero sin reanudación y luego con ella.
+# Informa del tiempo de handshake (urequests.tls_report) y del total por petición.
+#
+# Uso:
+#   python3 herramientas/tls_bench.py
+#   python3 herramientas/tls_bench.py --requests 50 --tls12 --out tls.json
+#
+# Las cifras son solo del host: la reanudación funciona aquí porque el shim ussl usa el
+# ssl de CPython. El ssl de MicroPython en la placa no expone sesiones: allí tls_report()
+# (métricas "tls") sale con resume_supported False y todos los handshakes completos.
+# Con --tls12 el total por petición reanudada puede incluir ~40 ms de Nagle + ACK
+# retardado del loopback (Finished y petición en segmentos separados): mirar el handshake.
+
+import argparse, json, os, shutil, ssl, subprocess, sys, tempfile, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import upy_host
+upy_host.setup()
+
+import ussl
+import urequests
+
+def make_cert(d, key_type):
+    cert = os.path.join(d, "cert.pem")
+    key = os.path.join(d, "key.pem")
+    newkey = "rsa:2048" if key_type == "rsa" else "ec"
+    cmd = ["openssl", "req", "-x509", "-nodes", "-days", "1", "-subj", "/CN=localhost",
+           "-keyout", key, "-out", cert, "-newkey", newkey]
+    if key_type != "rsa":
+        cmd += ["-pkeyopt", "ec_paramgen_curve:prime256v1"]
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return cert, key
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *a):
+        pass
+
+def start_server(cert, key, tls12):
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    srv.daemon_threads = True
+    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    ctx.load_cert_chain(cert, key)
+    if tls12:
+        ctx.maximum_version = ssl.TLSVersion.TLSv1_2     # reanudación por session ID / ticket 1.2
+    srv.socket = ctx.wrap_socket(srv.socket, server_side=True)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+def run(url, n, resume):
+    urequests.TLS_RESUME = resume
+    urequests._sessions.clear()
+    for k in urequests.TLS_STATS:
+        urequests.TLS_STATS[k] = 0
+    lat = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        r = urequests.get(url)
+        r.close()
+        if r.status_code != 200:
+            raise RuntimeError("HTTP %d" % r.status_code)
+        lat.append(time.perf_counter() - t0)
+    lat.sort()
+    rep = urequests.tls_report()
+    rep["request_ms_p50"] = lat[len(lat) // 2] * 1000
+    rep["request_ms_avg"] = sum(lat) / len(lat) * 1000
+    return rep
+
+def main():
+    ap = argparse.ArgumentParser(description="Handshake TLS completo vs reanudado (urequests)")
+    ap.add_argument("--requests", type=int, default=30)
+    ap.add_argument("--tls12", action="store_true", help="limitar el servidor a TLS 1.2")
+    ap.add_argument("--key-type", choices=("ec", "rsa"), default="ec")
+    ap.add_argument("--out")
+    a = ap.parse_args()
+    if not shutil.which("openssl"):
+        sys.exit("hace falta openssl para generar el certificado")
+
+    d = tempfile.mkdtemp(prefix="tls_bench_")
+    try:
+        cert, key = make_cert(d, a.key_type)
+        srv = start_server(cert, key, a.tls12)
+        ussl.VERIFY = False
+        url = "https://127.0.0.1:%d/" % srv.server_address[1]
+        report = {"host_only": True, "python": sys.version.split()[0], "openssl": ssl.OPENSSL_VERSION,
+                  "tls": "1.2" if a.tls12 else "1.3", "key": a.key_type, "requests": a.requests,
+                  "full": run(url, a.requests, False), "resume": run(url, a.requests, True)}
+        f = report["full"]["full_ms_avg"]
+        r = report["resume"]["resumed_ms_avg"]
+        report["handshake_speedup"] = (f / r) if r else None
+        srv.shutdown()
+    finally:
+        shutil.rmtree(d, ignore_errors=True)
+
+    txt = json.dumps(report, indent=2, sort_keys=True)
+    if a.out:
+        with open(a.out, "w") as fo:
+            fo.write(txt + "\n")
+    print(txt)
+
+if __name__ == "__main__":
+    main()
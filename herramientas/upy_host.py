@@ -0,0 +1,32 @@
+# upy_host.py — ejecutar los módulos de codigo/ en CPython (PC)
+# - Añade herramientas/upy_shims (ujson, uhashlib, uos, utime, usocket...) y codigo/ al path
+# - load_isolated(): una copia independiente de un módulo (p.ej. un cloud_sync por
+#   dispositivo simulado), con `time` sustituido por el shim de MicroPython.
+
+import os, sys, importlib.util
+
+HERE   = os.path.dirname(os.path.abspath(__file__))
+SHIMS  = os.path.join(HERE, "upy_shims")
+CODIGO = os.path.join(os.path.dirname(HERE), "codigo")
+
+def setup():
+    for p in (CODIGO, SHIMS):
+        if p not in sys.path:
+            sys.path.insert(0, p)
+
+def load_isolated(modname, alias=None, **attrs):
+    """
+    Carga codigo/<modname>.py como módulo nuevo (nombre alias) y asigna attrs
+    (p.ej. DATA_DIR="/tmp/dev3/data"). El `time` del módulo pasa a ser utime.
+    """
+    setup()
+    import utime
+    alias = alias or modname
+    spec = importlib.util.spec_from_file_location(alias, os.path.join(CODIGO, modname + ".py"))
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+    if hasattr(mod, "time"):
+        mod.time = utime
+    for k, v in attrs.items():
+        setattr(mod, k, v)
+    return mod
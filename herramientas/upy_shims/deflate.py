@@ -0,0 +1,48 @@
+# deflate (shim CPython) — DeflateIO de MicroPython >= 1.21 sobre zlib
+import zlib as _zlib
+
+AUTO, RAW, ZLIB, GZIP = 0, 1, 2, 3
+
+def _wbits(fmt, wbits):
+    w = wbits or 15
+    if fmt == RAW:
+        return -w
+    if fmt == GZIP:
+        return 16 + w
+    return w
+
+class DeflateIO:
+    def __init__(self, stream, format=AUTO, wbits=0, close=False):
+        self._s = stream
+        self._fmt = format
+        self._wbits = wbits
+        self._close = close
+        self._c = None
+        self._d = None
+
+    def write(self, data):
+        if self._c is None:
+            if self._fmt == AUTO:
+                raise ValueError("AUTO solo para descomprimir")
+            self._c = _zlib.compressobj(6, _zlib.DEFLATED, _wbits(self._fmt, max(9, self._wbits or 0)))
+        self._s.write(self._c.compress(bytes(data)))
+        return len(data)
+
+    def read(self, n=-1):
+        if self._d is None:
+            self._d = _zlib.decompressobj(47 if self._fmt == AUTO else _wbits(self._fmt, self._wbits))
+        data = self._s.read() if n is None or n < 0 else self._s.read(n)
+        return self._d.decompress(data) if data else self._d.flush()
+
+    def close(self):
+        if self._c is not None:
+            self._s.write(self._c.flush())
+            self._c = None
+        if self._close:
+            self._s.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *a):
+        self.close()
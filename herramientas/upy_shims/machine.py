@@ -0,0 +1,41 @@
+# machine (shim CPython) — Pin con IRQ simulable, disable_irq/enable_irq sin efecto, idle/lightsleep
+# Para reproducir tramas Wiegand en el PC: pin.fire() llama al handler como la ISR.
+
+class Pin:
+    IN = 0
+    OUT = 1
+    PULL_UP = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, name, mode=IN, pull=None):
+        self.name = name
+        self._v = 1
+        self._handler = None
+
+    def irq(self, trigger=IRQ_FALLING, handler=None):
+        self._handler = handler
+
+    def value(self, v=None):
+        if v is None:
+            return self._v
+        self._v = 1 if v else 0
+
+    def fire(self):
+        if self._handler is not None:
+            self._handler(self)
+
+def disable_irq():
+    return 0
+
+def enable_irq(state):
+    pass
+
+# Espera de bajo consumo: en el PC, una pausa corta (la "IRQ" es el siguiente ms)
+def idle():
+    import time
+    time.sleep(0.001)
+
+def lightsleep(ms=None):
+    import time
+    time.sleep((ms or 0) / 1000.0)
@@ -0,0 +1,2 @@
+# ubinascii (shim CPython)
+from binascii import hexlify, unhexlify, a2b_base64, b2a_base64, crc32
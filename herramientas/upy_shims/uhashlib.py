@@ -0,0 +1,2 @@
+# uhashlib (shim CPython)
+from hashlib import sha256, sha1, md5
@@ -0,0 +1,2 @@
+# ujson (shim CPython) — json con la API reducida de MicroPython
+from json import dumps, loads, dump, load
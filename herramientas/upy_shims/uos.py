@@ -0,0 +1,6 @@
+# uos (shim CPython) — os + sync() como en MicroPython
+from os import *
+from os import stat, remove, rename, mkdir, listdir, urandom
+
+def sync():
+    pass
@@ -0,0 +1,50 @@
+# usocket (shim CPython) — sockets con read()/write() de MicroPython
+import socket as _socket
+from socket import AF_INET, AF_INET6, SOCK_STREAM, SOCK_DGRAM, IPPROTO_TCP, getaddrinfo
+
+class socket:
+    def __init__(self, af=AF_INET, type=SOCK_STREAM, proto=0, sock=None):
+        self._s = sock if sock is not None else _socket.socket(af, type, proto)
+
+    def settimeout(self, t):
+        self._s.settimeout(t)
+
+    def connect(self, addr):
+        self._s.connect(addr)
+
+    def write(self, data):
+        self._s.sendall(data)
+        return len(data)
+
+    send = write
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            chunks = []
+            while True:
+                b = self._s.recv(4096)
+                if not b:
+                    return b"".join(chunks)
+                chunks.append(b)
+        return self._s.recv(n)
+
+    recv = read
+
+    def readinto(self, buf, n=None):
+        return self._s.recv_into(buf, n or len(buf))
+
+    def readline(self):
+        l = b""
+        while True:
+            c = self._s.recv(1)
+            if not c:
+                return l
+            l += c
+            if c == b"\n":
+                return l
+
+    def fileno(self):
+        return self._s.fileno()
+
+    def close(self):
+        self._s.close()
@@ -0,0 +1,38 @@
+# ussl (shim CPython) — wrap_socket() sobre SSLContext para los sockets de usocket
+import ssl as _ssl
+import usocket
+
+CERT_NONE = _ssl.CERT_NONE
+CERT_REQUIRED = _ssl.CERT_REQUIRED
+SSLSession = _ssl.SSLSession   # el ssl de CPython expone sesiones (el de MicroPython no)
+
+VERIFY = True   # False para servidores locales con certificado autofirmado
+
+_ctx = {}       # VERIFY -> SSLContext (la reanudación exige el mismo contexto)
+
+def _context():
+    ctx = _ctx.get(VERIFY)
+    if ctx is not None:
+        return ctx
+    if VERIFY:
+        ctx = _ssl.create_default_context()
+    else:
+        ctx = _ssl.SSLContext(_ssl.PROTOCOL_TLS_CLIENT)
+        ctx.check_hostname = False
+        ctx.verify_mode = _ssl.CERT_NONE
+    _ctx[VERIFY] = ctx
+    return ctx
+
+class _TLSSocket(usocket.socket):
+    # Como el SSLSocket de CPython: sesión para reanudar y si esta conexión la reanudó
+    @property
+    def session(self):
+        return self._s.session
+
+    @property
+    def session_reused(self):
+        return self._s.session_reused
+
+def wrap_socket(sock, server_hostname=None, session=None, **kwargs):
+    raw = sock._s if isinstance(sock, usocket.socket) else sock
+    return _TLSSocket(sock=_context().wrap_socket(raw, server_hostname=server_hostname, session=session))
@@ -0,0 +1,43 @@
+# utime (shim CPython) — ticks_* y localtime() de 8 campos como en MicroPython
+import time as _time
+
+_T0 = _time.monotonic_ns()
+_TICKS_PERIOD = 1 << 30
+_TICKS_HALF = _TICKS_PERIOD // 2
+
+def ticks_ms():
+    return ((_time.monotonic_ns() - _T0) // 1000000) % _TICKS_PERIOD
+
+def ticks_us():
+    return ((_time.monotonic_ns() - _T0) // 1000) % _TICKS_PERIOD
+
+def ticks_add(t, delta):
+    return (t + delta) % _TICKS_PERIOD
+
+def ticks_diff(a, b):
+    return ((a - b + _TICKS_HALF) % _TICKS_PERIOD) - _TICKS_HALF
+
+def sleep_ms(ms):
+    _time.sleep(ms / 1000)
+
+def sleep_us(us):
+    _time.sleep(us / 1000000)
+
+def sleep(s):
+    _time.sleep(s)
+
+def time():
+    return int(_time.time())
+
+def localtime(secs=None):
+    # (y, m, d, hh, mm, ss, weekday 0=Lun, yearday) — 8 campos
+    t = _time.localtime(secs)
+    return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec, t.tm_wday, t.tm_yday)
+
+def gmtime(secs=None):
+    t = _time.gmtime(secs)
+    return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec, t.tm_wday, t.tm_yday)
+
+def mktime(tup):
+    import calendar
+    return int(calendar.timegm(tuple(tup[:6]) + (0, 0, 0)))
@@ -0,0 +1,176 @@
+# wiegand_bench.py — banco y arnés en PC del decodificador Wiegand (codigo/wiegand.py)
+# - decode: tramas/s por formato (26/34/35/37) y comparación con la paridad antigua
+#   de main.py (bucle bit a bit) en las de 26 bits
+# - replay: trenes de pulsos D0/D1 (generados o capturados) a través de la ISR real
+#   de carriles.Carril con reloj virtual, y comprobación de cada tarjeta decodificada
+#
+# Formato de captura (una línea por pulso):  t_us,linea   (linea 0 = D0, 1 = D1)
+#
+# Uso:
+#   python3 herramientas/wiegand_bench.py
+#   python3 herramientas/wiegand_bench.py --frames 20000 --dump pulsos.csv
+#   python3 herramientas/wiegand_bench.py --capture pulsos.csv
+
+import argparse, json, random, sys, time
+
+import upy_host
+upy_host.setup()
+
+import wiegand
+import carriles
+
+BIT_US   = 2000        # intervalo típico entre pulsos Wiegand
+GAP_US   = 100000      # separación entre tarjetas
+
+# ---------- referencia: comprobación de main.py antes del decodificador ----------
+
+def _count_ones(val):
+    c = 0
+    while val:
+        c += (val & 1)
+        val >>= 1
+    return c
+
+def _old_decode26(raw26):
+    parity_msb = bool((raw26 >> 25) & 1)
+    parity_lsb = bool(raw26 & 1)
+    p1_ok = ((_count_ones((raw26 >> 13) & 0xFFF) % 2) == 0) == parity_msb
+    p2_ok = ((_count_ones((raw26 >> 1) & 0xFFF) % 2) == 1) == parity_lsb
+    if not (p1_ok and p2_ok):
+        return None
+    return ((raw26 >> 17) & 0xFF, (raw26 >> 1) & 0xFFFF)
+
+# ---------- generación ----------
+
+def gen_cards(n, corrupt, seed):
+    rnd = random.Random(seed)
+    names = [f["name"] for f in wiegand.FORMATS]
+    out = []
+    for _ in range(n):
+        name = rnd.choice(names)
+        bits, v = wiegand.encode(name, rnd.getrandbits(16), rnd.getrandbits(20))
+        exp = wiegand.decode(bits, v)
+        if rnd.random() < corrupt:
+            v ^= 1 << rnd.randrange(bits)        # un bit erróneo: debe rechazarse
+            exp = None
+        out.append((bits, v, exp))
+    return out
+
+def to_pulses(cards):
+    t = 0
+    pulses = []
+    for bits, v, _exp in cards:
+        for i in range(bits - 1, -1, -1):
+            pulses.append((t, (v >> i) & 1))
+            t += BIT_US
+        t += GAP_US
+    return pulses
+
+def load_capture(path):
+    pulses = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            t, l = line.split(",")[:2]
+            pulses.append((int(t), int(l)))
+    return pulses
+
+# ---------- casos ----------
+
+def bench_decode(cards, repeat):
+    res = {}
+    for f in wiegand.FORMATS:
+        sub = [(b, v) for b, v, _ in cards if b == f["bits"]]
+        if not sub:
+            continue
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            for b, v in sub:
+                wiegand.decode(b, v)
+        dt = time.perf_counter() - t0
+        res[f["name"]] = {"frames": len(sub) * repeat, "frames_per_s": len(sub) * repeat / dt}
+    sub = [v for b, v, _ in cards if b == 26]
+    if sub:
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            for v in sub:
+                _old_decode26(v)
+        dt = time.perf_counter() - t0
+        res["H10301_bucle_antiguo"] = {"frames": len(sub) * repeat, "frames_per_s": len(sub) * repeat / dt}
+        # mismo resultado que la comprobación antigua
+        res["H10301_discrepancias"] = sum(
+            1 for v in sub
+            if (_old_decode26(v) is None) != (wiegand.decode(26, v) is None)
+            or (_old_decode26(v) and _old_decode26(v) != wiegand.decode(26, v)[1:3]))
+    return res
+
+def replay(pulses, expected=None):
+    """Pasa los pulsos por la ISR real (carriles.Carril) con reloj virtual."""
+    now = [0]
+    carriles._ticks_ms = lambda: now[0] // 1000
+    lane = carriles.Carril("L1", "D14", "D13")
+    frames = []
+    t0 = time.perf_counter()
+    for t_us, line in pulses:
+        now[0] = t_us
+        lane.poll(t_us // 1000)
+        fr = lane.pop()
+        if fr is not None:
+            frames.append(fr)
+        (lane.pin_d1 if line else lane.pin_d0).fire()
+    now[0] += GAP_US
+    lane.poll(now[0] // 1000)
+    while True:
+        fr = lane.pop()
+        if fr is None:
+            break
+        frames.append(fr)
+    t_isr = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    decoded = [wiegand.decode(b, v) for b, v in frames]
+    t_dec = time.perf_counter() - t0
+    r = {"pulses": len(pulses), "frames": len(frames), "dropped": lane.dropped,
+         "valid": sum(1 for d in decoded if d), "pulses_per_s": len(pulses) / t_isr if t_isr else 0,
+         "decode_frames_per_s": len(frames) / t_dec if t_dec else 0,
+         "formats": {}}
+    for d in decoded:
+        if d:
+            r["formats"][d[0]] = r["formats"].get(d[0], 0) + 1
+    if expected is not None:
+        r["mismatches"] = sum(1 for d, e in zip(decoded, expected) if d != e) + abs(len(decoded) - len(expected))
+    return r
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--frames", type=int, default=5000)
+    ap.add_argument("--corrupt", type=float, default=0.05, help="fracción de tramas con un bit erróneo")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--capture", help="CSV t_us,linea capturado del lector")
+    ap.add_argument("--dump", help="guarda los pulsos generados en este CSV")
+    ap.add_argument("--out")
+    a = ap.parse_args()
+
+    cards = gen_cards(a.frames, a.corrupt, a.seed)
+    report = {"python": sys.version.split()[0], "decode": bench_decode(cards, a.repeat)}
+    if a.capture:
+        report["replay_capture"] = replay(load_capture(a.capture))
+    else:
+        pulses = to_pulses(cards)
+        if a.dump:
+            with open(a.dump, "w") as f:
+                f.write("# t_us,linea\n")
+                for t, l in pulses:
+                    f.write("%d,%d\n" % (t, l))
+        report["replay"] = replay(pulses, [e for _b, _v, e in cards])
+
+    txt = json.dumps(report, indent=2, sort_keys=True)
+    if a.out:
+        with open(a.out, "w") as f:
+            f.write(txt + "\n")
+    print(txt)
+
+if __name__ == "__main__":
+    main()